@@ -7,6 +7,9 @@ from abc import ABCMeta, abstractmethod
 class DbDriverBase:
     __metaclass__ = ABCMeta
 
+    # number of the statements executed through the driver.
+    execute_count = 0
+
     @abstractmethod
     def __init__(self, connstr, dbuser, dbpass):
         raise NotImplementedError
@@ -16,11 +19,67 @@ class DbDriverBase:
         raise NotImplementedError
 
     @abstractmethod
-    def query_to_resultset(self, label, query, max_rows=10000, timeout=None):
+    def query_to_resultset(self, label, query, max_rows=10000, timeout=None,
+                           params=None, query_class=None):
         raise NotImplementedError
 
-    def q2rs(self, query, max_rows=10000, timeout=None):
-        return self.query_to_resultset(query, max_rows, timeout)
+    def q2rs(self, query, max_rows=10000, timeout=None, params=None,
+             query_class=None):
+        return self.query_to_resultset(query, max_rows, timeout,
+                                       params=params, query_class=query_class)
+
+    def cursor(self, query_class=None):
+        """Open a cursor on the connection
+
+        Args:
+            query_class (str): class of the queries executed on the cursor,
+                               to tune the fetch sizes on some drivers.
+
+        Returns:
+            Cursor: a cursor object of the driver.
+        """
+        return self.conn.cursor()
+
+    def prepare(self, query):
+        """Get the statement text of the query for the driver
+
+        Queries are written with the pyformat bind variables,
+        i.e. %(name)s, which are accepted by most drivers as they
+        are. A driver using another form of the bind variables
+        overrides this method.
+
+        Args:
+            query (str): a query string with bind variables.
+
+        Returns:
+            str: a statement string to be executed on the driver.
+        """
+        self.execute_count += 1
+        return query
+
+    def get_statement_stats(self):
+        """Get the statement counters of the driver
+
+        Only the statements executed through the driver are counted on
+        the client. The parses and the statement caches on the server
+        are not measured.
+
+        Returns:
+            dict: {'execute': <int>}, the number of the statements
+                  executed through the driver.
+        """
+        return {'execute': self.execute_count}
+
+    def add_statement_stats(self, dbdriver):
+        """Add the statement counters of another driver to this one
+
+        Used to count the statements executed on the connections
+        opened by copies of this driver.
+
+        Args:
+            dbdriver (DbDriverBase): a copy of this driver.
+        """
+        self.execute_count += dbdriver.execute_count
 
     @abstractmethod
     def disconnect(self):
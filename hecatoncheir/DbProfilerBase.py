@@ -6,6 +6,7 @@ import json
 import sys
 from abc import ABCMeta, abstractmethod
 from datetime import datetime
+from multiprocessing.pool import ThreadPool
 
 import dateutil.parser
 
@@ -64,6 +65,12 @@ class DbProfilerBase(object):
     parallel_degree = 0
     timeout = None
 
+    # max number of expressions in a select list on the backend, which
+    # limits the number of columns profiled by a single query.
+    max_select_expressions = None
+    # number of connections to profile the column groups concurrently.
+    column_group_workers = 1
+
     def __init__(self, host, port, dbname, dbuser, dbpass, debug=False):
         self.host = host
         self.port = port
@@ -114,17 +121,18 @@ class DbProfilerBase(object):
     def get_table_names(self, schema_name):
         raise NotImplementedError
 
-    def _query_table_names(self, query):
+    def _query_table_names(self, query, params=None):
         """Common code shared by PostgreSQL/MySQL/Oracle/MSSQL profilers
         to get table names in the schema.
 
         Args:
           query(str): a query string to be executed on each database.
+          params(dict): values of the bind variables in the query.
 
         Returns:
           list: a list of the table names.
         """
-        rs = self.dbdriver.q2rs(query, timeout=self.timeout)
+        rs = self.dbdriver.q2rs(query, timeout=self.timeout, params=params)
         table_names = []
         for r in rs.resultset:
             table_names.append(_s2u(r[0]))
@@ -135,17 +143,18 @@ class DbProfilerBase(object):
     def get_column_names(self, schema_name, table_name):
         raise NotImplementedError
 
-    def _query_column_names(self, query):
+    def _query_column_names(self, query, params=None):
         """Common code shared by PostgreSQL/MySQL/Oracle/MSSQL profilers
         to get column names of the table.
 
         Args:
           query(str): a query string to be executed on each database.
+          params(dict): values of the bind variables in the query.
 
         Returns:
           list: a list of the column names.
         """
-        rs = self.dbdriver.q2rs(query, timeout=self.timeout)
+        rs = self.dbdriver.q2rs(query, timeout=self.timeout, params=params)
         column_names = []
         for r in rs.resultset:
 #            column_names.append(_s2u(r[0]))
@@ -168,7 +177,8 @@ class DbProfilerBase(object):
           list: a list of the column names and rows:
                 [[column names], [row1], [row2], ...]
         """
-        rs = self.dbdriver.q2rs(query, timeout=self.timeout)
+        rs = self.dbdriver.q2rs(query, timeout=self.timeout,
+                                query_class='sample')
         sample_rows = []
         sample_rows.append(list(rs.column_names))
         for r in rs.resultset:
@@ -188,18 +198,19 @@ class DbProfilerBase(object):
         """
         raise NotImplementedError
 
-    def _query_column_datetypes(self, query):
+    def _query_column_datetypes(self, query, params=None):
         """Common code shared by PostgreSQL/MySQL/Oracle/MSSQL profilers
         to get data types of the columns.
 
         Args:
           query(str): a query string to be executed on each database.
+          params(dict): values of the bind variables in the query.
 
         Returns:
           dict: {column_name, [type, len]}
         """
         data_types = {}
-        rs = self.dbdriver.q2rs(query, timeout=self.timeout)
+        rs = self.dbdriver.q2rs(query, timeout=self.timeout, params=params)
         for r in rs.resultset:
             data_types[r[0].decode('utf-8')] = [r[1], r[2]]
             log.trace("_query_column_datetypes: %s %s %s" % (unicode(r[0]), r[1], r[2]))
@@ -235,39 +246,41 @@ class DbProfilerBase(object):
         """
         raise NotImplementedError
 
-    def _query_column_profile(self, column_names, query):
+    def _query_column_profile(self, column_names, query, dbdriver=None):
         """Common code shared by PostgreSQL/MySQL/Oracle/MSSQL profilers
         to collect column profiles of the table.
 
         Args:
           column_names(list): column names.
           query(str): a query string to be executed on each database.
+          dbdriver(DbDriverBase): a driver to run the query on, instead of
+                                  the driver of the profiler.
 
         Returns:
           tuple: (num_rows, minmax, nulls)
                  minmax and nulls are dictionaries having column names as
                  the keys.
         """
+        if dbdriver is None:
+            dbdriver = self.dbdriver
         _minmax = {}
         _nulls = {}
         num_rows = None
         try:
-            rs = self.dbdriver.q2rs(query, timeout=self.timeout)
+            rs = dbdriver.q2rs(query, timeout=self.timeout,
+                               query_class='profile')
             assert len(rs.resultset) == 1
 
-            a = copy.copy(list(rs.resultset[0]))
-            num_rows = a.pop(0)
+            a = rs.resultset[0]
+            assert len(a) == len(column_names) * 3 + 1
+            num_rows = a[0]
             log.trace("_query_column_profile: rows %d" % num_rows)
-            i = 0
-            while len(a) > 0:
-                nulls = a.pop(0)
-                colmin = a.pop(0)
-                colmax = a.pop(0)
+            for i, col in enumerate(column_names):
+                (nulls, colmin, colmax) = a[i * 3 + 1:i * 3 + 4]
                 log.trace(("_query_column_profile: col %s %d %s %s" %
-                          (column_names[i], nulls, colmin, colmax)))
-                _minmax[column_names[i]] = [colmin, colmax]
-                _nulls[column_names[i]] = nulls
-                i += 1
+                          (col, nulls, colmin, colmax)))
+                _minmax[col] = [colmin, colmax]
+                _nulls[col] = nulls
         except QueryError as ex:
             raise ProfilingError(_("Could not get row count/num of "
                                    "nulls/min/max values."),
@@ -277,6 +290,85 @@ class DbProfilerBase(object):
         log.trace("_query_column_profile: %s" % str(_minmax))
         return (num_rows, _minmax, _nulls)
 
+    def _get_column_groups(self, column_names):
+        """Split the columns into the groups to be profiled by a query
+
+        A query has COUNT(*) and three expressions for each column
+        in the select list, which must fit in max_select_expressions.
+
+        Args:
+          column_names(list): column names.
+
+        Returns:
+          list: lists of the column names.
+        """
+        if not self.max_select_expressions:
+            return [column_names]
+        size = max(1, (self.max_select_expressions - 1) / 3)
+        return [column_names[i:i + size]
+                for i in range(0, len(column_names), size)]
+
+    def _query_column_profile_on_new_connection(self, args):
+        (column_names, query) = args
+        dbdriver = copy.copy(self.dbdriver)
+        dbdriver.conn = None
+        if hasattr(dbdriver, 'stmt_cache'):
+            # not to share the statement cache with the other threads.
+            dbdriver.stmt_cache = None
+        # the counters are added to the profiler's driver afterwards.
+        dbdriver.execute_count = 0
+        if hasattr(dbdriver, 'rewrite_count'):
+            dbdriver.rewrite_count = 0
+        try:
+            dbdriver.connect()
+            r = self._query_column_profile(column_names, query, dbdriver)
+            return (r, dbdriver)
+        finally:
+            dbdriver.disconnect()
+
+    def _query_column_profile_groups(self, queries):
+        """Collect column profiles of the table with the column groups
+
+        The queries run one by one on the connection of the profiler,
+        or concurrently on new connections when column_group_workers
+        is more than one.
+
+        Args:
+          queries(list): pairs of the column names and the query string
+                         for each column group.
+
+        Returns:
+          tuple: (num_rows, minmax, nulls) of all the column groups.
+        """
+        workers = min(self.column_group_workers, len(queries))
+        if workers > 1:
+            log.trace("_query_column_profile_groups: %d groups, %d workers" %
+                      (len(queries), workers))
+            pool = ThreadPool(workers)
+            try:
+                results = pool.map(
+                    self._query_column_profile_on_new_connection, queries)
+            finally:
+                pool.close()
+                pool.join()
+            for r in results:
+                self.dbdriver.add_statement_stats(r[1])
+            results = [r[0] for r in results]
+        else:
+            results = [self._query_column_profile(c, q) for c, q in queries]
+
+        num_rows = results[0][0] if results else None
+        if len(set([r[0] for r in results])) > 1:
+            # the table has been modified between the queries.
+            log.warning(_("Row counts differ between the column groups: %s") %
+                        ', '.join([str(r[0]) for r in results]))
+        _minmax = {}
+        _nulls = {}
+        for r in results:
+            _minmax.update(r[1])
+            _nulls.update(r[2])
+        return (num_rows, _minmax, _nulls)
+
     @abstractmethod
     def get_column_most_freq_values(self, schema_name, table_name):
         """Get most frequent values of the columns in the table.
@@ -314,7 +406,8 @@ class DbProfilerBase(object):
           freqs(dict): a dictionary which holds the frequencies of the columns.
                        This function updates this dictionary as output.
         """
-        rs = self.dbdriver.q2rs(query, timeout=self.timeout)
+        rs = self.dbdriver.q2rs(query, timeout=self.timeout,
+                                query_class='freq')
         for r in rs.resultset:
             log.trace(("_query_value_freqs: col %s val %s freq %d" %
                        (column_name, _s2u(r[0]), _s2u(r[1]))))
@@ -344,7 +437,8 @@ class DbProfilerBase(object):
           cardinality(dict): a dictionary which holds the column cardinality.
                              This function updates this dictionary as output.
         """
-        rs = self.dbdriver.q2rs(query, timeout=self.timeout)
+        rs = self.dbdriver.q2rs(query, timeout=self.timeout,
+                                query_class='profile')
         for r in rs.resultset:
             cardinalities[column_name] = long(r[0])
             log.trace(("_query_column_cardinality: col %s cardinality %d" %
@@ -383,7 +477,7 @@ class DbProfilerBase(object):
         # Use a server-side cursor to avoid running the client memory out.
         if not self.dbconn:
             self.connect()
-        cur = self.dbconn.cursor()
+        cur = self.dbdriver.cursor('validation')
         cur.execute(query)
         assert cur.description
         fnames = [x[0] for x in cur.description]
@@ -485,12 +579,13 @@ class DbProfilerBase(object):
             except QueryTimeout as ex:
                 log.warning(_("Could not obtain most/least freq values due to the query timeout."))
 
+            # keep the values obtained even if the other is not.
             for col in tablemeta.column_names:
-                if most_freqs is None or least_freqs is None:
-                    break
                 cm = tablemeta.get_column_meta(col)
-                cm.most_freq_values = most_freqs[col]
-                cm.least_freq_values = least_freqs[col]
+                if most_freqs is not None:
+                    cm.most_freq_values = most_freqs[col]
+                if least_freqs is not None:
+                    cm.least_freq_values = least_freqs[col]
             log.info(_("Most/Least freq values: end"))
 
         return True
@@ -2,25 +2,27 @@
 # -*- coding: utf-8 -*-
 
 import copy
+import csv
 import getopt
+import glob
+import gzip
+import hashlib
 import json
+from multiprocessing import Pool
 import os
-import re
 import shutil
 import sys
 
-import CSVUtils
 import DbProfilerFormatter
 import DbProfilerRepository
 import DbProfilerVerify
 import logger as log
-from CSVUtils import list2csv
-from msgutil import gettext as _
+from msgutil import DbProfilerJSONEncoder, gettext as _
 from attachment import Attachment
-from businessglossary import GlossaryTerm, get_bg_term
-from datamapping import get_datamap_items
+from businessglossary import GlossaryTerm, bg_term2dict
+from datamapping import DatamappingItem
 from schema import Schema2
-from table import Table2
+from table import Table2, TableNameIndex
 from tag import Tag2
 from validation import get_validation_rules
 
@@ -52,6 +54,34 @@ def parse_table_name(s):
     return (db, schema, table)
 
 
+def get_glossary_terms(table_names=None):
+    """Get the glossary terms with the tables assigned to them
+
+    Args:
+        table_names (TableNameIndex): an index of the table names,
+                                      loaded when not given.
+
+    Returns:
+        list: a list of dictionaries of the glossary terms, having
+              {<asset>: [<db.schema.table>, ...]} in 'assigned_assets2'.
+    """
+    if table_names is None:
+        table_names = TableNameIndex.load()
+
+    terms = []
+    for tmp in GlossaryTerm.find():
+        t = bg_term2dict(tmp)
+        asset_names = {}
+        for a in t['assigned_assets']:
+            n = parse_table_name(a)
+            if not n[0] and not n[1] and not n[2]:
+                continue
+            asset_names[a] = table_names.find(n[0], n[1], n[2])
+        t['assigned_assets2'] = asset_names
+        terms.append(t)
+    return terms
+
+
 # top_schemas: list of schema name string: [u's5']
 # all_schemas: list of Schema2 objects: [Schema2, Schema2, Schema2, ...]
 # schema_index: list of lists (dbname, schemaname, num_of_tables, desc)
@@ -100,8 +130,142 @@ def get_tag_ordered_list(top_tags, all_tags):
     return tag_index
 
 
+# A file in the output directory to keep the digests of the inputs
+# of the exported pages.
+manifest_file = '.manifest.json'
+
+
+def get_digest(*args):
+    """Get a digest of the inputs of a page
+
+    Args:
+        args: objects which can be serialized into JSON.
+
+    Returns:
+        str: a hex digest of the objects.
+    """
+    return hashlib.sha1(json.dumps(args, cls=DbProfilerJSONEncoder,
+                                   sort_keys=True)).hexdigest()
+
+
+def get_template_digest(template_path):
+    """Get a digest of the template files in the template directory"""
+    body = []
+    for f in sorted(glob.glob(template_path + '/*.html')):
+        body.append([os.path.basename(f), open(f).read().decode('utf-8')])
+    return get_digest(body)
+
+
+def load_manifest(output_path):
+    """Load the manifest of the pages exported last time
+
+    Returns:
+        dict: {<file name>: <digest>}, or an empty dict when not found.
+    """
+    try:
+        with open(output_path + '/' + manifest_file) as f:
+            manifest = json.load(f)
+    except (IOError, ValueError) as e:
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+
+def save_manifest(output_path, manifest):
+    try:
+        with open(output_path + '/' + manifest_file, 'w') as f:
+            json.dump(manifest, f, sort_keys=True, indent=0)
+    except IOError as e:
+        log.error(_("Could not generate %s: %s") %
+                  (output_path + '/' + manifest_file, unicode(e)))
+        return False
+    return True
+
+
+def get_index_entry(data):
+    """Get the part of the table data shown on the index pages"""
+    return [data['database_name'], data['schema_name'], data['table_name'],
+            data.get('table_name_nls'), data.get('timestamp'),
+            data.get('row_count'), data.get('tags'), data.get('owner'),
+            data.get('sample_rows'), data.get('comment'),
+            [c.get('validation') for c in data['columns']]]
+
+
+# The glossary terms and the template file of the table pages,
+# set in each process rendering the table pages.
+_table_page_args = {}
+
+
+def _init_table_page_worker(terms, template_file):
+    _table_page_args['terms'] = terms
+    _table_page_args['template_file'] = template_file
+
+
+def _export_table_page(task):
+    """Render and write a table page
+
+    Args:
+        task (tuple): the file name, the table data, the validation rules,
+                      the datamapping entries and the attached files.
+
+    Returns:
+        bool: True when the page has been written.
+    """
+    (filename, data, validation_rules, dmentries, files) = task
+    return export_file(filename, DbProfilerFormatter.to_table_html(
+            data, validation_rules=validation_rules,
+            datamapping=dmentries,
+            files=files,
+            glossary_terms=_table_page_args['terms'],
+            template_file=_table_page_args['template_file']))
+
+
+def get_table_page_tasks(tables, output_path):
+    """Collect the inputs to render the table pages
+
+    The data of all the tables are held in memory, as the index pages
+    are built from them as well. The tasks of the changed pages are
+    pickled and sent to the worker processes when export_html() runs
+    with more than one job.
+
+    Args:
+        tables (list): a list of tuples of database, schema and table names.
+        output_path (str): a path to the output directory.
+
+    Returns:
+        list: a list of the tasks for _export_table_page().
+    """
+    found = {}
+    for t in Table2.find_many(tables):
+        found[(t.database_name, t.schema_name, t.table_name)] = t.data
+
+    rules = {}
+    for r in get_validation_rules():
+        rules.setdefault(tuple(r[1:4]), []).append(r)
+
+    datamap = {}
+    for d in DatamappingItem.find():
+        datamap.setdefault((d.database_name, d.schema_name, d.table_name),
+                           []).append(d.data)
+
+    files = {}
+    for a in Attachment.find_by_type('table'):
+        files.setdefault(a.objid, []).append('%s/%s' % (a.objid, a.filename))
+
+    tasks = []
+    for tab in tables:
+        key = tuple(tab[0:3])
+        filename = output_path + ("/%s.%s.%s.html" % key)
+        tasks.append((filename,
+                      found[key],
+                      rules.get(key, []),
+                      datamap.get(key, []),
+                      files.get('.'.join(key), [])))
+    return tasks
+
+
 def export_html(repo, tables=[], tags=[], schemas=[], template_path=None,
-                output_title='title', output_path='./html'):
+                output_title='title', output_path='./html', jobs=1,
+                force=False, page_size=None):
     """
     Args:
         repo (obj): a DbProfilerRepository object.
@@ -113,6 +277,12 @@ def export_html(repo, tables=[], tags=[], schemas=[], template_path=None,
         template_path (str): a path to the template directory.
         output_title (str): a title of the index page.
         output_path (str): a path to the output directory to export data.
+        jobs (int): number of the processes to render the table pages.
+        force (bool): re-render all the pages even when their inputs
+                      have not been changed since the last export.
+        page_size (int): max number of the tables in a page of the index
+                         pages. DbProfilerFormatter.index_page_size is
+                         used when None, and no page is split when 0.
 
     Returns:
         True if succeed.
@@ -124,46 +294,95 @@ def export_html(repo, tables=[], tags=[], schemas=[], template_path=None,
     template_glossary = template_path + "/templ_glossary.html"
     template_static = template_path + "/static"
 
-    terms = []
-    for tmp in GlossaryTerm.find():
-        t = get_bg_term(tmp.term)
-        asset_names = {}
-        for a in t['assigned_assets']:
-            n = parse_table_name(a)
-            if not n[0] and not n[1] and not n[2]:
-                continue
-            table_list = Table2.find(n[0], n[1], n[2])
-            asset_names[a] = ['%s.%s.%s' % (x.database_name,
-                                            x.schema_name, x.table_name)
-                              for x in table_list]
-        t['assigned_assets2'] = asset_names
-        terms.append(t)
+    terms = get_glossary_terms()
+
+    # The pages whose inputs have the same digests as the last time
+    # are not rendered again.
+    manifest_old = {} if force else load_manifest(output_path)
+    manifest = {}
+    skipped = [0]
+    version = get_digest(get_template_digest(template_path), terms)
+
+    def is_changed(filename, digest):
+        name = os.path.basename(filename)
+        if manifest_old.get(name) == digest and os.path.exists(filename):
+            manifest[name] = digest
+            skipped[0] += 1
+            return False
+        return True
+
+    def export_page(filename, digest, render):
+        if is_changed(filename, digest) and export_file(filename, render()):
+            manifest[os.path.basename(filename)] = digest
+
+    if page_size is None:
+        page_size = DbProfilerFormatter.index_page_size
+
+    # The index pages are split into <name>.html, <name>-2.html, ...,
+    # and the other tables are searched with the search index.
+    search_index = 'search-index.json'
+
+    def export_index(filename, tables, search_scope=None, **kwargs):
+        num_pages = DbProfilerFormatter.get_num_pages(len(tables), page_size)
+        base = os.path.basename(filename)[:-len('.html')]
+        urls = [base + '.html'] + ['%s-%d.html' % (base, n)
+                                   for n in range(2, num_pages + 1)]
+        counts = None
+        if kwargs.get('show_validation', 'none') != 'none':
+            counts = DbProfilerFormatter.count_validation_results(tables)
+
+        for page in range(1, num_pages + 1):
+            page_tables = DbProfilerFormatter.get_page_tables(tables, page,
+                                                              page_size)
+            digest = get_digest(version,
+                                [get_index_entry(x) for x in page_tables],
+                                kwargs, counts, page, urls, search_scope)
+            export_page(os.path.join(os.path.dirname(filename),
+                                     urls[page - 1]),
+                        digest,
+                        lambda: DbProfilerFormatter.to_index_html(
+                            tables, glossary_terms=terms,
+                            template_file=template_index, page=page,
+                            page_size=page_size, page_urls=urls,
+                            search_index=search_index,
+                            search_scope=search_scope,
+                            validation_counts=counts, **kwargs))
 
     tables_all = []
     tables_by_schema = {}
     tables_by_tag = {}
     tables_valid = []
     tables_invalid = []
-    for tab in tables:
+
+    # The table pages are rendered in the worker processes with
+    # the inputs fetched beforehand, and the index pages are built
+    # from the results.
+    tasks = get_table_page_tasks(tables, output_path)
+    digests = [get_digest(version, t[1:]) for t in tasks]
+    changed = [t for t, d in zip(tasks, digests) if is_changed(t[0], d)]
+    if jobs > 1 and len(changed) > 1:
+        pool = Pool(min(jobs, len(changed)), _init_table_page_worker,
+                    (terms, template_table))
+        try:
+            results = pool.map(_export_table_page, changed,
+                               chunksize=max(1, len(changed) / (jobs * 4)))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        _init_table_page_worker(terms, template_table)
+        results = [_export_table_page(t) for t in changed]
+    for task, digest in zip(tasks, digests):
+        manifest.setdefault(os.path.basename(task[0]), digest)
+    for task, result in zip(changed, results):
+        if not result:
+            del manifest[os.path.basename(task[0])]
+
+    for tab, task in zip(tables, tasks):
         database_name = tab[0]
         schema_name = tab[1]
         table_name = tab[2]
-        data = Table2.find(database_name, schema_name, table_name)[0].data
-        dmentries = get_datamap_items(database_name, schema_name,
-                                      table_name)
-        files = Attachment.find('.'.join(tab[0:3]), 'table')
-
-        filename = output_path + ("/%s.%s.%s.html" %
-                                  (database_name, schema_name, table_name))
-
-        validation_rules = get_validation_rules(database_name,
-                                                schema_name, table_name)
-        export_file(filename, DbProfilerFormatter.to_table_html(
-                data, validation_rules=validation_rules,
-                datamapping=dmentries,
-                files=['%s/%s' % ('.'.join(tab[0:3]), x.filename) for x in files],
-                glossary_terms=terms,
-                template_file=template_table))
+        data = task[1]
 
         # append table data to the global index list
         tables_all.append(data)
@@ -198,83 +417,85 @@ def export_html(repo, tables=[], tags=[], schemas=[], template_path=None,
         elif valid > 0:
             tables_valid.append(data)
 
+    # get the schemas and the tags with their descriptions at once.
+    all_schemas = Schema2.findall()
+    all_tags = Tag2.findall()
+    schema_dict = dict([((x.database_name, x.schema_name), x)
+                        for x in all_schemas])
+    tag_dict = dict([(x.label, x) for x in all_tags])
+
     # create index page for each schema from the schema dict
     for schema in tables_by_schema:
         d, s = schema.split('.')
         filename = output_path + "/%s.html" % schema
         files = Attachment.find(schema, 'schema')
-        ss = Schema2.find(d, s)
+        ss = schema_dict.get((d, s)) or Schema2(d, s)
         desc = ss.description
-        export_file(filename, DbProfilerFormatter.to_index_html(
-                tables_by_schema[schema],
-                comment=ss.comment,
-                files=['%s/%s' % (schema, x.filename) for x in files],
-                schemas=[[d, s, len(tables_by_schema[schema]),
-                          ss.description]],
-                reponame=schema, glossary_terms=terms,
-                template_file=template_index))
+        export_index(filename, tables_by_schema[schema],
+                     comment=ss.comment,
+                     files=['%s/%s' % (schema, x.filename) for x in files],
+                     schemas=[[d, s, len(tables_by_schema[schema]),
+                               ss.description]],
+                     reponame=schema, search_scope={'schema': schema})
 
     # create index page for each tag from the tag dict
     for tag in tables_by_tag:
         filename = output_path + "/tag-%s.html" % tag
         files = Attachment.find(tag, 'tag')
-        tmp = Tag2.find(tag)
-        if not tmp:
-            tmp = Tag2(tag)
-        export_file(filename, DbProfilerFormatter.to_index_html(
-                tables_by_tag[tag],
-                comment=tmp.comment,
-                files=['tag-%s/%s' % (tag, x.filename) for x in files],
-                tags=[[tmp.label, tmp.num_of_tables, tmp.description]],
-                reponame=tag, glossary_terms=terms,
-                template_file=template_index))
+        tmp = tag_dict.get(tag) or Tag2(tag)
+        export_index(filename, tables_by_tag[tag],
+                     comment=tmp.comment,
+                     files=['tag-%s/%s' % (tag, x.filename) for x in files],
+                     tags=[[tmp.label, tmp.num_of_tables, tmp.description]],
+                     reponame=tag, search_scope={'tag': tag})
 
     # create index page for validation results (valid/invalid)
     # from the valid/invalid dict
     filename = output_path + "/validation-valid.html"
-    export_file(filename, DbProfilerFormatter.to_index_html(
-            tables_valid, show_validation='valid', reponame='valid',
-            glossary_terms=terms,
-            template_file=template_index))
+    export_index(filename, tables_valid, show_validation='valid',
+                 reponame='valid', search_scope={'validation': 'valid'})
     filename = output_path + "/validation-invalid.html"
-    export_file(filename, DbProfilerFormatter.to_index_html(
-            tables_invalid, show_validation='invalid', reponame='invalid',
-            glossary_terms=terms,
-            template_file=template_index))
+    export_index(filename, tables_invalid, show_validation='invalid',
+                 reponame='invalid', search_scope={'validation': 'invalid'})
 
     # create global index page
     filename = output_path + "/index.html"
 
-    schemas2 = get_schema_ordered_list(schemas, Schema2.findall())
+    schemas2 = get_schema_ordered_list(schemas, all_schemas)
 
-    tags2 = get_tag_ordered_list(tags, Tag2.findall())
+    tags2 = get_tag_ordered_list(tags, all_tags)
 
-    export_file(filename, DbProfilerFormatter.to_index_html(
-            tables_all, schemas=schemas2, tags=tags2,
-            show_validation='both', reponame=output_title,
-            glossary_terms=terms, template_file=template_index,
-            max_panels=6))
+    export_index(filename, tables_all, schemas=schemas2, tags=tags2,
+                 show_validation='both', reponame=output_title,
+                 max_panels=6)
 
     # create index page for tags
     filename = output_path + "/index-tags.html"
 
-    export_file(filename, DbProfilerFormatter.to_index_html(
-            tables_all, tags=tags2, reponame=output_title,
-            glossary_terms=terms, template_file=template_index,
-            max_panels=99))
+    export_index(filename, tables_all, tags=tags2, reponame=output_title,
+                 max_panels=99)
 
     # create index page for schemas
     filename = output_path + "/index-schemas.html"
 
-    export_file(filename, DbProfilerFormatter.to_index_html(
-            tables_all, schemas=schemas2, reponame=output_title,
-            glossary_terms=terms, template_file=template_index,
-            max_panels=99))
+    export_index(filename, tables_all, schemas=schemas2,
+                 reponame=output_title, max_panels=99)
+
+    # create the search index of all the tables
+    filename = output_path + "/" + search_index
+    body = DbProfilerFormatter.to_search_index(tables_all)
+    export_page(filename, get_digest(body), lambda: body)
 
     # create the busines glossary page
     filename = output_path + "/glossary.html"
-    export_file(filename, DbProfilerFormatter.to_glossary_html(
-            glossary_terms=terms, template_file=template_glossary))
+    export_page(filename, version,
+                lambda: DbProfilerFormatter.to_glossary_html(
+                    glossary_terms=terms, template_file=template_glossary))
+
+    save_manifest(output_path, manifest)
+    if skipped[0]:
+        log.info(_("Skipped %d pages not changed since the last export.") %
+                 skipped[0])
 
     # copy static files
     try:
@@ -290,18 +511,42 @@ def export_html(repo, tables=[], tags=[], schemas=[], template_path=None,
     return True
 
 
-def export_json(repo, tables=[], output_path='./json'):
-    json_data = []
+def export_json(repo, tables=[], output_path='./json', ndjson=False,
+                compress=False):
+    """
+    Args:
+        repo (obj): a DbProfilerRepository object.
+        tables (list): a list of tuples of database, schema and table names.
+        output_path (str): a path to the output directory to export data.
+        ndjson (bool): write a table data in each line to EXPORT.NDJSON,
+                       instead of a JSON array to EXPORT.JSON.
+        compress (bool): compress the output file with gzip.
+
+    Returns:
+        True if succeed.
+    """
+    filename = output_path + ("/EXPORT.NDJSON" if ndjson else "/EXPORT.JSON")
+    if compress:
+        filename += '.gz'
+
+    # The table data are written one by one as read from the repository,
+    # so that the whole catalog is not kept in the memory.
     try:
-        f = open(output_path + "/EXPORT.JSON", "a")
-        for tab in tables:
-            database_name = tab[0]
-            schema_name = tab[1]
-            table_name = tab[2]
-            data = Table2.find(database_name, schema_name, table_name)[0].data
-            json_data.append(data)
-        f.write(json.dumps(json_data, indent=2).encode('utf-8'))
-        f.close()
+        f = gzip.open(filename, "wb") if compress else open(filename, "w")
+        try:
+            count = 0
+            for tab in Table2.iter_many(tables):
+                if ndjson:
+                    f.write(json.dumps(tab.data) + "\n")
+                else:
+                    f.write("[\n  " if count == 0 else ", \n  ")
+                    f.write(json.dumps(tab.data,
+                                       indent=2).replace("\n", "\n  "))
+                count += 1
+            if not ndjson:
+                f.write("\n]" if count else "[]")
+        finally:
+            f.close()
         log.info(_("Generated JSON file."))
     except IOError, e:
         log.error(_("Could not generate JSON file."))
@@ -310,77 +555,103 @@ def export_json(repo, tables=[], output_path='./json'):
     return True
 
 
-def export_csv(repo, tables=[], output_path='./csv', encoding=None):
+class _CSVFile:
+    """Write the lines of csv.writer ending with LF
+
+    csv.writer quotes the values having CR only when it is a part of
+    the line terminator, and CRLF is replaced with LF here.
+    """
+
+    def __init__(self, f):
+        self.f = f
+
+    def write(self, line):
+        self.f.write(line[:-2] + "\n")
+
+
+def format_csv_timestamp(ts):
+    """Format a timestamp as `YYYY-MM-DD HH:MM:SS' without the fraction"""
+    ts = ts.replace('T', ' ')
+    pos = ts.rfind('.')
+    if pos >= 0 and ts[pos + 1:].isdigit():
+        ts = ts[:pos]
+    return ts
+
+
+def export_csv(repo, tables=[], output_path='./csv', encoding=None,
+               since=None, until=None):
+    """
+    Args:
+        repo (obj): a DbProfilerRepository object.
+        tables (list): a list of tuples of database, schema and table names.
+        output_path (str): a path to the output directory to export data.
+        encoding (str): character encoding of the csv files.
+        since (str): the oldest timestamp of the records, inclusive.
+        until (str): the newest timestamp of the records, exclusive.
+
+    Returns:
+        True if succeed.
+    """
     if not encoding:
         encoding = 'utf-8'
 
+    def encode(values):
+        return [(v if isinstance(v, unicode) else unicode(v)).encode(encoding)
+                if v is not None else '' for v in values]
+
+    files = []
     try:
-        f = open(output_path + "/TABLE_COLUMN_META.CSV", "w")
-        f2 = open(output_path + "/TABLE_COLUMN_VALIDATION.CSV", "w")
-        f_tab = open(output_path + "/TABLE_META.CSV", "w")
+        for name in ["/TABLE_COLUMN_META.CSV", "/TABLE_COLUMN_VALIDATION.CSV",
+                     "/TABLE_META.CSV"]:
+            files.append(open(output_path + name, "wb", 1024 * 1024))
+        (f, f2, f_tab) = [csv.writer(_CSVFile(x), lineterminator='\r\n')
+                          for x in files]
 
         header = [u'TIMESTAMP', u'DATABASE_NAME', u'SCHEMA_NAME',
                   u'TABLE_NAME', u'COLUMN_NAME', u'DATA_TYPE', u'DATA_LEN',
                   u'MIN', u'MAX', u'NULLS', u'NON_NULLS', u'CARDINARLITY']
-        f.write(list2csv(header).encode(encoding) + "\n")
+        f.writerow(encode(header))
 
         header2 = [u'TIMESTAMP', u'DATABASE_NAME', u'SCHEMA_NAME',
                    u'TABLE_NAME', u'COLUMN_NAME', u'VALIDATION_RULE',
                    u'INVALID_RECORDS']
-        f2.write(list2csv(header2).encode(encoding) + "\n")
+        f2.writerow(encode(header2))
 
         head_tab = [u'TIMESTAMP', u'DATABASE_NAME', u'SCHEMA_NAME',
                     u'TABLE_NAME', u'ROW_COUNT']
-        f_tab.write(list2csv(head_tab).encode(encoding) + "\n")
-
-        for tab in tables:
-            database_name = tab[0]
-            schema_name = tab[1]
-            table_name = tab[2]
-            hist = repo.get_table_history(database_name, schema_name,
-                                          table_name)
-            for data in hist:
-                # table metadata
-                tmp = data['timestamp'].replace('T', ' ')
-                line = list2csv([re.sub(r'\.\d+$', '', tmp),
-                                 database_name, schema_name, table_name,
-                                 data.get('row_count', u'')])
-                log.trace(line)
-                f_tab.write(line.encode(encoding) + "\n")
-
-                for c in data['columns']:
-                    log.trace("export_csv: " + unicode(c))
-
-                    # column metadata
-                    tmp = data['timestamp'].replace('T', ' ')
-                    if (data.get('row_count') is not None and
-                            c.get('nulls') is not None):
-                        non_null_values = data['row_count'] - c['nulls']
-                    else:
-                        non_null_values = None
-                    line = list2csv([re.sub(r'\.\d+$', '', tmp),
-                                     database_name, schema_name,
-                                     table_name,
-                                     c['column_name'], c['data_type'][0],
-                                     c['data_type'][1],
-                                     c['min'], c['max'], c['nulls'],
-                                     non_null_values,
-                                     c['cardinality']])
-                    log.trace(line)
-                    f.write(line.encode(encoding) + "\n")
-
-                    # validation result
-                    for k in c.get('validation', []):
-                        tmp = data['timestamp'].replace('T', ' ')
-                        # timestamp,db,schema,table,column,desc,result
-                        line = list2csv([re.sub(r'\.\d+$', '', tmp),
-                                         database_name, schema_name,
-                                         table_name, c['column_name'],
-                                         k['description'], k['invalid_count']])
-                        f2.write(line.encode(encoding) + "\n")
-        f.close()
-        f2.close()
-        f_tab.close()
+        f_tab.writerow(encode(head_tab))
+
+        # the records of all the tables are read in a single scan,
+        # and decoded one by one.
+        hist = repo.iter_tables_history(tables, since=since, until=until)
+        for (database_name, schema_name, table_name), data in hist:
+            # table metadata
+            # timestamp,db,schema,table
+            key = encode([format_csv_timestamp(data['timestamp']),
+                          database_name, schema_name, table_name])
+            f_tab.writerow(key + encode([data.get('row_count', u'')]))
+
+            for c in data['columns']:
+                # column metadata
+                if (data.get('row_count') is not None and
+                        c.get('nulls') is not None):
+                    non_null_values = data['row_count'] - c['nulls']
+                else:
+                    non_null_values = None
+                column_name = encode([c['column_name']])
+                f.writerow(key + column_name +
+                           encode([c['data_type'][0], c['data_type'][1],
+                                   c['min'], c['max'], c['nulls'],
+                                   non_null_values, c['cardinality']]))
+
+                # validation result
+                for k in c.get('validation', []):
+                    # timestamp,db,schema,table,column,desc,result
+                    f2.writerow(key + column_name +
+                                encode([k['description'],
+                                        k['invalid_count']]))
+        for x in files:
+            x.close()
         log.info(_("Generated CSV file."))
     except IOError, e:
         log.error(_("Could not generate CSV file."), detail=unicode(e))
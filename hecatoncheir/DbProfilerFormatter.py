@@ -1,13 +1,16 @@
 #!/usr/bin/env python2.7
 # -*- coding: utf-8 -*-
 
+from collections import OrderedDict
 import copy
 import json
 import os
 import re
+import threading
 
 import markdown
-from jinja2 import Template, Environment, FileSystemLoader
+from jinja2 import (Template, Environment, FileSystemBytecodeCache,
+                    FileSystemLoader, TemplateNotFound)
 
 import CSVUtils
 import DbProfilerVerify
@@ -16,6 +19,29 @@ from exception import DbProfilerException, InternalError
 from msgutil import DbProfilerJSONEncoder
 from msgutil import gettext as _
 
+# Jinja environments shared by the templates in the same directory.
+# Each environment keeps the compiled templates, and compiles them
+# again only when the mtimes of the files are changed.
+template_envs = {}
+
+# A directory to keep the bytecode of the compiled templates, so that
+# the other processes can skip the compilation. Not used when None.
+template_bytecode_dir = None
+
+# The rendered HTML and the plain texts of the Markdown texts, with
+# the least recently used ones dropped first.
+markdown_cache = OrderedDict()
+markdown_cache_size = 10000
+
+# A Markdown converter reused for all the texts, used by a thread
+# at a time with the cache above.
+_markdown = markdown.Markdown()
+_markdown_lock = threading.Lock()
+
+# Max number of the tables listed in a page of the index pages.
+# All the tables are listed in a single page when 0.
+index_page_size = 500
+
 
 def format_non_null_ratio(rows, nulls):
     """Format percentage of non-null value of the column
@@ -95,20 +121,43 @@ def get_validation_rule(column_name, rule, invalid):
     return vali
 
 
+def render_markdown(text):
+    """Render a Markdown text, or get the result rendered before
+
+    Args:
+        text (str): a Markdown text.
+
+    Returns:
+        tuple: the HTML and the plain text without the tags.
+    """
+    with _markdown_lock:
+        if text in markdown_cache:
+            rendered = markdown_cache.pop(text)
+        else:
+            html = _markdown.reset().convert(text)
+            rendered = (html, re.sub('<[^>]+>', ' ', html))
+            if len(markdown_cache) >= markdown_cache_size:
+                markdown_cache.popitem(last=False)
+        markdown_cache[text] = rendered
+    return rendered
+
+
 def filter_markdown2html(text):
     if text is None:
         return ''
-    md = markdown.Markdown()
-    return md.convert(text)
+    return render_markdown(text)[0]
+
+
+def format_term_popover(term, content, orig=None):
+    title = orig if orig else term
+    return (u'<a tabindex="0" data-toggle="popover" data-trigger="focus" '
+            u'data-html="true" title="{1}" data-content="{2}" '
+            u'class="glossary-term">{0}</a>'.format(term, title, content))
 
 
 def filter_term2popover(html, pos, term, content, orig=None):
     log.trace("filter_term2popover: %s" % term)
-    title = orig if orig else term
-    popover = (u'<a tabindex="0" data-toggle="popover" data-trigger="focus" '
-               u'data-html="true" title="{1}" data-content="{2}" '
-               u'class="glossary-term">{0}</a>'.format(
-                term, title, content))
+    popover = format_term_popover(term, content, orig)
     html_new = html[0:pos] + popover + html[pos+len(term):]
     pos += len(popover)
     return (html_new, pos)
@@ -132,35 +181,128 @@ def create_popover_content(term):
     return content
 
 
+class GlossaryTermMatcher:
+    """Matcher of the glossary terms and their synonyms in a text
+
+    An Aho-Corasick automaton over all the terms and the synonyms is
+    built once, and a text is scanned in a single pass. The leftmost
+    and then the longest word is replaced with the popover, and the
+    first one in the list wins when the same word appears twice.
+    """
+
+    def __init__(self, glossary_terms):
+        # word -> (glossary term, original term for a synonym)
+        self.words = {}
+        for t in glossary_terms:
+            if t['term']:
+                self.words.setdefault(t['term'], (t, None))
+            for synonym in t.get('synonyms') or []:
+                if synonym:
+                    self.words.setdefault(synonym, (t, t['term']))
+        self.popovers = {}
+
+        # goto transitions, the word ending at each node, the failure
+        # links and the links to the next node having a word.
+        self.goto = [{}]
+        self.word = [None]
+        for w in self.words:
+            node = 0
+            for ch in w:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.word.append(None)
+                node = nxt
+            self.word[node] = w
+
+        self.fail = [0] * len(self.goto)
+        self.out = [0] * len(self.goto)
+        queue = self.goto[0].values()
+        for node in queue:
+            for ch, child in self.goto[node].iteritems():
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                f = self.goto[f].get(ch, 0)
+                self.fail[child] = f
+                self.out[child] = f if self.word[f] else self.out[f]
+                queue.append(child)
+
+    def find(self, text):
+        """Find the words in the text
+
+        Returns:
+            list: a list of tuples of the position and the word,
+                  not overlapping each other.
+        """
+        goto, fail, word, out = self.goto, self.fail, self.word, self.out
+
+        # the longest word starting at each position.
+        longest = {}
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            m = node if word[node] else out[node]
+            while m:
+                start = i - len(word[m]) + 1
+                if len(word[m]) > len(longest.get(start, '')):
+                    longest[start] = word[m]
+                m = out[m]
+
+        found = []
+        pos = 0
+        for start in sorted(longest):
+            if start >= pos:
+                found.append((start, longest[start]))
+                pos = start + len(longest[start])
+        return found
+
+    def replace(self, html):
+        """Replace the words in the html with the popovers"""
+        chunks = []
+        pos = 0
+        for start, w in self.find(html):
+            if w not in self.popovers:
+                (t, orig) = self.words[w]
+                self.popovers[w] = format_term_popover(
+                    w, create_popover_content(t), orig)
+            chunks.append(html[pos:start])
+            chunks.append(self.popovers[w])
+            pos = start + len(w)
+        if not chunks:
+            return html
+        chunks.append(html[pos:])
+        return u''.join(chunks)
+
+
+# The list of the glossary terms given last time and its matcher.
+_term_matcher = (None, None)
+
+
+def get_term_matcher(glossary_terms):
+    """Get the matcher of the glossary terms, built once for the list"""
+    global _term_matcher
+    if _term_matcher[0] is not glossary_terms:
+        _term_matcher = (glossary_terms, GlossaryTermMatcher(glossary_terms))
+    return _term_matcher[1]
+
+
 def filter_glossaryterms(html, glossary_terms):
     if not html:
         return ''
     if glossary_terms is None:
         return html
-
-    pos = 0
-    while pos < len(html):
-        for t in glossary_terms:
-            term = t['term']
-            desc = t['description_short']
-            if html[pos:].startswith(term):
-                content = create_popover_content(t)
-                (html, pos) = filter_term2popover(html, pos, term, content)
-            for synonym in t.get('synonyms', []):
-                if not synonym:
-                    continue
-                if html[pos:].startswith(synonym):
-                    content = create_popover_content(t)
-                    (html, pos) = filter_term2popover(html, pos, synonym,
-                                                      content, orig=term)
-        pos += 1
-    return html
+    return get_term_matcher(glossary_terms).replace(html)
 
 
 def format_comment_tooltip(msg, maxlen=20):
     if not msg:
         return None
-    tmp = re.sub('<[^>]+>', ' ', filter_markdown2html(msg))
+    tmp = render_markdown(msg)[1]
     msg_short = tmp[0:maxlen] + '...' if len(tmp) > maxlen else tmp
     return msg_short
 
@@ -336,6 +478,8 @@ def format_column_metadata(colmeta, tabmeta, row_count, glossary_terms,
     col['cardinality'] = format_cardinality(row_count,
                                             colmeta['cardinality'],
                                             colmeta.get('nulls'))
+    if colmeta.get('cardinality_approx'):
+        col['cardinality'] = u'\u2248 ' + col['cardinality']
 
     # null/dist attributes
     col['uniq'] = is_column_unique(colmeta.get('most_freq_vals'))
@@ -434,21 +578,175 @@ def format_timestamp(ts):
     return t
 
 
+def get_template_env(dirname, encoding='utf-8'):
+    key = (os.path.abspath(dirname), encoding)
+    if key not in template_envs:
+        bcc = None
+        if template_bytecode_dir:
+            bcc = FileSystemBytecodeCache(template_bytecode_dir)
+        template_envs[key] = Environment(
+            loader=FileSystemLoader(key[0], encoding=encoding),
+            bytecode_cache=bcc, auto_reload=True)
+    return template_envs[key]
+
+
 def get_template_from_file(filename, encoding='utf-8'):
-    html_templ = u""
+    """Get a compiled template from the cache, or compile it
+
+    Args:
+        filename (str): a path to the template file.
+        encoding (str): encoding of the template file.
+
+    Returns:
+        Template: a compiled template.
+    """
+    env = get_template_env(os.path.dirname(filename) or '.', encoding)
     try:
-        for l in open(filename):
-            html_templ = html_templ + l.decode(encoding)
-    except Exception as e:
+        return env.get_template(os.path.basename(filename))
+    except (TemplateNotFound, IOError) as e:
         raise DbProfilerException("Template file `%s' not found." % (filename))
-    fsl = FileSystemLoader(os.path.join(os.path.dirname(filename), ''))
-    return Environment(loader=fsl).from_string(html_templ)
+
+
+def count_validation_results(data):
+    """Count the tables having the validation results
+
+    Args:
+        data (list): a list of the table data.
+
+    Returns:
+        tuple: numbers of the valid tables and the invalid tables.
+    """
+    valid_tables = 0
+    invalid_tables = 0
+    for t in data:
+        if not [c for c in t['columns'] if c.get('validation')]:
+            continue
+        v, i = DbProfilerVerify.verify_table(t)
+        if i > 0:
+            invalid_tables += 1
+        else:
+            valid_tables += 1
+    return (valid_tables, invalid_tables)
+
+
+def get_num_pages(num_tables, page_size):
+    if not page_size:
+        return 1
+    return max(1, (num_tables + page_size - 1) / page_size)
+
+
+def get_page_tables(data, page, page_size):
+    """Get the tables listed in a page of the index page
+
+    Args:
+        data (list): a list of the table data.
+        page (int): a page number starting from 1.
+        page_size (int): max number of the tables in a page.
+
+    Returns:
+        list: a list of the table data in the page.
+    """
+    if not page_size:
+        return data
+    return data[(page - 1) * page_size:page * page_size]
+
+
+def format_pagination(page, page_urls, window=3):
+    """Build the links to the pages around the current page
+
+    Args:
+        page (int): the current page number starting from 1.
+        page_urls (list): a list of the urls of all the pages.
+        window (int): number of the pages linked before and after
+                      the current page.
+
+    Returns:
+        list: a list of dicts with 'label', 'url' and 'active'.
+    """
+    num_pages = len(page_urls)
+    links = [{'label': u'\u00ab',
+              'url': page_urls[page - 2] if page > 1 else None}]
+    last = 0
+    for n in range(1, num_pages + 1):
+        if n != 1 and n != num_pages and abs(n - page) > window:
+            continue
+        if n > last + 1:
+            links.append({'label': u'\u2026', 'url': None})
+        links.append({'label': n, 'url': page_urls[n - 1],
+                      'active': n == page})
+        last = n
+    links.append({'label': u'\u00bb',
+                  'url': page_urls[page] if page < num_pages else None})
+    return links
+
+
+def to_search_index(data):
+    """Build a JSON index of the tables to be searched on the index pages
+
+    The index is fetched by the index pages only when searching, so that
+    the pages do not need to list all the tables.
+
+    Args:
+        data (list): a list of the table data.
+
+    Returns:
+        str: a JSON text with the field names and the tables.
+    """
+    fields = ['database_name', 'schema_name', 'table_name', 'table_name_nls',
+              'tags', 'row_count', 'num_columns', 'timestamp', 'validation',
+              'comment']
+    tables = []
+    for t in data:
+        v, i = DbProfilerVerify.verify_table(t)
+        comment = format_comment_tooltip(t.get('comment'), 140)
+        tables.append([t['database_name'], t['schema_name'], t['table_name'],
+                       t.get('table_name_nls'),
+                       [x for x in t.get('tags') or [] if len(x) > 0],
+                       format_number(t.get('row_count')), len(t['columns']),
+                       format_timestamp(t['timestamp']),
+                       'invalid' if i > 0 else ('valid' if v > 0 else None),
+                       comment.strip() if comment else None])
+    return json.dumps({'fields': fields, 'tables': tables},
+                      separators=(',', ':'))
 
 
 def to_index_html(data, reponame, schemas=None, tags=None,
                   show_validation='none', comment=None,
                   files=None, glossary_terms=None,
-                  template_file=None, editable=False, max_panels=99):
+                  template_file=None, editable=False, max_panels=99,
+                  page=1, page_size=None, page_urls=None,
+                  search_index=None, search_scope=None,
+                  validation_counts=None):
+    """Render an index page listing the tables
+
+    When page_size is given, only the tables in the page are listed,
+    and the other tables are searched with the search index.
+
+    Args:
+        data (list): a list of the table data to be listed.
+        reponame (str): a title of the page.
+        schemas (list): a list of [dbname, schema, num_of_tables, desc].
+        tags (list): a list of [tag, num_of_tables, desc].
+        show_validation (str): 'none', 'both', 'valid' or 'invalid'.
+        comment (str): a comment on the page in the Markdown format.
+        files (list): a list of the paths of the attached files.
+        glossary_terms (list): a list of the glossary terms to be linked.
+        template_file (str): a path to the template file.
+        editable (bool): show the controls to edit the tables.
+        max_panels (int): max number of the tag and schema panels.
+        page (int): a page number to be rendered, starting from 1.
+        page_size (int): max number of the tables in a page.
+                         All the tables are listed when None or 0.
+        page_urls (list): a list of the urls of all the pages.
+        search_index (str): a url of the search index of the tables.
+        search_scope (dict): a condition to search the tables listed,
+                             with 'schema', 'tag' or 'validation'.
+        validation_counts (tuple): numbers of the valid tables and the
+                                   invalid tables in the data, counted
+                                   by count_validation_results() once
+                                   for all the pages. Counted here when
+                                   None.
+    """
     if not template_file:
         template_file = get_default_template_path() + "/templ_index.html"
 
@@ -456,10 +754,26 @@ def to_index_html(data, reponame, schemas=None, tags=None,
         comment = filter_markdown2html(comment)
         comment = filter_glossaryterms(comment, glossary_terms)
 
+    # The validation results are counted in all the tables,
+    # and only the tables in the page are formatted.
+    num_pages = get_num_pages(len(data), page_size)
+    page = min(max(page, 1), num_pages)
+    pagination = None
+    if num_pages > 1:
+        assert page_urls and len(page_urls) == num_pages
+        pagination = {'page': page,
+                      'pages': num_pages,
+                      'tables': len(data),
+                      'links': format_pagination(page, page_urls)}
+    if show_validation == 'none':
+        (valid_tables, invalid_tables) = (0, 0)
+    elif validation_counts is not None:
+        (valid_tables, invalid_tables) = validation_counts
+    else:
+        (valid_tables, invalid_tables) = count_validation_results(data)
+
     tables = []
-    valid_tables = 0
-    invalid_tables = 0
-    for t in data:
+    for t in get_page_tables(data, page, page_size):
         tab = format_table_metadata(t, glossary_terms)
 
         # check every column to look for validation results
@@ -475,10 +789,6 @@ def to_index_html(data, reponame, schemas=None, tags=None,
             v, i = DbProfilerVerify.verify_table(t)
             tab['validation'] = data_validation
             tab['invalid'] = i
-            if i > 0:
-                invalid_tables += 1
-            else:
-                valid_tables += 1
         else:
             assert 'validation' not in tab
 
@@ -528,6 +838,10 @@ def to_index_html(data, reponame, schemas=None, tags=None,
                         tags_index=(len(templ_tags) > max_panels),
                         schemas_index=(len(templ_schemas) > max_panels),
                         validation=templ_validation,
+                        pagination=pagination,
+                        search_index=(search_index if pagination else None),
+                        search_scope=json.dumps(search_scope or {}).replace(
+                            '</', '<\\/'),
                         editable=editable)
 
     return html
@@ -552,7 +866,7 @@ def to_glossary_html(glossary_terms=None, template_file=None, editable=False):
         t['related_terms'] = ', '.join(t.get('related_terms', []))
         t['related_terms'] = filter_glossaryterms(t['related_terms'],
                                                   glossary_terms)
-        aa2 = t.get('assigned_assets2')
+        aa2 = t.get('assigned_assets2') or {}
         s = []
         for aa in t.get('assigned_assets', []):
             if aa2.get(aa) and len(aa2[aa]) >= 1:
@@ -5,6 +5,7 @@ import json
 import os
 import unittest
 from datetime import datetime
+from itertools import groupby
 
 import sqlalchemy as sa
 
@@ -13,7 +14,9 @@ import logger as log
 from exception import DbProfilerException, InternalError
 from logger import str2unicode as _s2u
 from msgutil import gettext as _, jsonize
-from repository import Repository
+from repository import (DATA_FORMAT_DELTA, Repository, decode_data, is_delta,
+                        repo_columns_table, repo_table, table_key_clause,
+                        table_key_params)
 from table import Table2
 from validation import ValidationRule
 
@@ -52,13 +55,16 @@ class DbProfilerRepository():
 
     def init(self):
         repo = Repository()
+        if db.engine.has_table('repo'):
+            log.info(_("The repository has already been initialized."))
+            return repo.upgrade()
         try:
             repo.create()
         except sa.exc.OperationalError as ex:
             err_msg = '(sqlite3.OperationalError) table repo already exists'
             if str(ex).startswith(err_msg):
                 log.info(_("The repository has already been initialized."))
-                return True
+                return repo.upgrade()
             log.error(_("Could not initialize the repository."))
             return False
         log.info(_("The repository has been initialized."))
@@ -77,8 +83,15 @@ class DbProfilerRepository():
         try:
             data_all = []
 
-            for r in db.engine.execute("SELECT * FROM repo"):
-                data_all.append(json.loads(unicode(r[4])))
+            # the deltas are decoded with their successors.
+            q = ("SELECT * FROM repo ORDER BY database_name, schema_name, "
+                 "table_name, created_at DESC")
+            prev = (None, None)
+            for r in db.conn.execute(q):
+                successor = prev[1] if prev[0] == tuple(r[0:3]) else None
+                data = decode_data(r[4], successor)
+                data_all.append(data)
+                prev = (tuple(r[0:3]), data)
 
             log.info(_("Retrieved all data from the repository `%s'.") %
                      self.filename)
@@ -93,7 +106,157 @@ class DbProfilerRepository():
             return "'%s'" % ts
         return "datetime('%s')" % ts
 
-    def get_table_history(self, database_name, schema_name, table_name):
+    @staticmethod
+    def _build_history(columns, since, until, limit, offset):
+        r = repo_table
+        q = sa.select(columns).where(table_key_clause(r))
+        if since:
+            q = q.where(r.c.timestamp >= sa.bindparam('since'))
+        if until:
+            q = q.where(r.c.timestamp < sa.bindparam('until'))
+        q = q.order_by(r.c.timestamp.desc(), r.c.created_at.desc())
+        if limit is not None:
+            q = q.limit(sa.bindparam('limit'))
+        if offset:
+            q = q.offset(sa.bindparam('offset'))
+        return q
+
+    @staticmethod
+    def _build_tables_history(since, until, table_names):
+        r = repo_table
+        q = sa.select([r.c.database_name, r.c.schema_name, r.c.table_name,
+                       r.c.created_at, r.c.timestamp, r.c.data])
+
+        def where_names(q, t):
+            if table_names is None:
+                return q
+            return q.where(sa.and_(
+                t.c.database_name == sa.bindparam('database_name'),
+                t.c.schema_name == sa.bindparam('schema_name'),
+                t.c.table_name.in_(table_names)))
+
+        q = where_names(q, r)
+        if since or until:
+            # The records in the range, and the ones created after them
+            # up to the first full record, which are required to decode
+            # the deltas in the range.
+            b = sa.select([r.c.database_name, r.c.schema_name,
+                           r.c.table_name,
+                           sa.func.min(r.c.created_at).label('first_created'),
+                           sa.func.max(r.c.created_at).label('last_created')])
+            if since:
+                b = b.where(r.c.timestamp >= sa.bindparam('since'))
+            if until:
+                b = b.where(r.c.timestamp < sa.bindparam('until'))
+            b = where_names(b, r).group_by(
+                r.c.database_name, r.c.schema_name, r.c.table_name).alias()
+            f = repo_table.alias()
+            full = sa.select([sa.func.min(f.c.created_at)]).where(sa.and_(
+                f.c.database_name == b.c.database_name,
+                f.c.schema_name == b.c.schema_name,
+                f.c.table_name == b.c.table_name,
+                f.c.created_at >= b.c.last_created,
+                ~f.c.data.startswith(DATA_FORMAT_DELTA))).as_scalar()
+            q = q.select_from(r.join(b, sa.and_(
+                r.c.database_name == b.c.database_name,
+                r.c.schema_name == b.c.schema_name,
+                r.c.table_name == b.c.table_name))).where(sa.and_(
+                    r.c.created_at >= b.c.first_created,
+                    r.c.created_at <= sa.func.coalesce(full,
+                                                       r.c.created_at)))
+        q = q.order_by(r.c.database_name, r.c.schema_name, r.c.table_name,
+                       r.c.created_at.desc())
+        return q.execution_options(stream_results=True)
+
+    @staticmethod
+    def _history_params(since, until, limit, offset):
+        params = {}
+        if since:
+            params['since'] = (since.isoformat()
+                               if isinstance(since, datetime) else since)
+        if until:
+            params['until'] = (until.isoformat()
+                               if isinstance(until, datetime) else until)
+        if limit is not None:
+            params['limit'] = limit
+        if offset:
+            params['offset'] = offset
+        return params
+
+    def _decode_snapshot(self, keys, created_at, s, prev):
+        if not is_delta(s):
+            return decode_data(s)
+
+        # A delta is decoded with the snapshot created next, which is
+        # not always the previous one in the order of the timestamps.
+        r = repo_table
+        q = db.statement(
+            ('DbProfilerRepository._decode_snapshot',),
+            lambda: sa.select([r.c.created_at, r.c.data]).where(sa.and_(
+                table_key_clause(r),
+                r.c.created_at > sa.bindparam('created_at'))).order_by(
+                    r.c.created_at))
+        chain = [s]
+        successor = None
+        rs = db.conn.execute(q, dict(keys, created_at=created_at))
+        for x in rs:
+            if prev and x[0] == prev[0]:
+                successor = prev[1]
+                break
+            chain.append(x[1])
+            if not is_delta(x[1]):
+                break
+        rs.close()
+
+        for x in reversed(chain):
+            successor = decode_data(x, successor)
+        return successor
+
+    def iter_table_history(self, database_name, schema_name, table_name,
+                           since=None, until=None, limit=None, offset=None):
+        """
+        Iterate table records of an object in the repository, newest one
+        coming first. The records are ordered and bounded by their
+        timestamps in the query, and decoded one by one.
+
+        Args:
+            database_name(str): database name
+            schema_name(str):   schema name
+            table_name(str):    table name
+            since(str):         the oldest timestamp, inclusive
+            until(str):         the newest timestamp, exclusive
+            limit(int):         max number of records
+            offset(int):        number of the newest records to skip
+
+        Yields:
+            a dictionary of a table record.
+        """
+        assert database_name and schema_name and table_name
+
+        r = repo_table
+        q = db.statement(
+            ('DbProfilerRepository.iter_table_history', bool(since),
+             bool(until), limit is not None, bool(offset)),
+            lambda: self._build_history([r.c.created_at, r.c.data], since,
+                                        until, limit, offset))
+        keys = table_key_params(database_name, schema_name, table_name)
+        params = self._history_params(since, until, limit, offset)
+
+        log.trace("iter_table_history: query = %s" % q)
+
+        try:
+            prev = None
+            for x in db.conn.execute(q, dict(keys, **params)):
+                data = self._decode_snapshot(keys, x[0], x[1], prev)
+                prev = (x[0], data)
+                yield data
+        except Exception as ex:
+            raise InternalError(
+                "Could not get table data with its history: " + str(ex),
+                query=str(q), source=ex)
+
+    def get_table_history(self, database_name, schema_name, table_name,
+                          since=None, until=None, limit=None, offset=None):
         """
         Get a table record history from the repository by object name,
         newest one coming first.
@@ -102,45 +265,188 @@ class DbProfilerRepository():
             database_name(str): database name
             schema_name(str):   schema name
             table_name(str):    table name
+            since(str):         the oldest timestamp, inclusive
+            until(str):         the newest timestamp, exclusive
+            limit(int):         max number of records
+            offset(int):        number of the newest records to skip
 
         Returns:
             a list of dictionaries of table records. [{table record}, ...]
         """
-        assert database_name and schema_name and table_name
+        return list(self.iter_table_history(database_name, schema_name,
+                                            table_name, since, until, limit,
+                                            offset))
 
-        table_history = []
+    def iter_column_history(self, database_name, schema_name, table_name,
+                            column_names=None, since=None, until=None,
+                            limit=None, offset=None):
+        """
+        Iterate column statistics of an object in the repository, newest
+        one coming first. The statistics are read from the repo_columns
+        table, without decoding the table records.
 
-        query = """
-SELECT data
-  FROM repo
- WHERE database_name = '{0}'
-   AND schema_name = '{1}'
-   AND table_name = '{2}'
-""".format(database_name, schema_name, table_name)
+        Args:
+            database_name(str): database name
+            schema_name(str):   schema name
+            table_name(str):    table name
+            column_names(list): column names, or None for all columns
+            since(str):         the oldest timestamp, inclusive
+            until(str):         the newest timestamp, exclusive
+            limit(int):         max number of records
+            offset(int):        number of the newest records to skip
+
+        Yields:
+            a dictionary of the statistics of a snapshot.
+            {'timestamp': <str>, 'row_count': <int>,
+             'columns': {<column name>: {column statistics}, ...}}
+        """
+        assert database_name and schema_name and table_name
 
-        log.trace("get_table_history: query = %s" % query)
+        def build():
+            r = repo_table
+            c = repo_columns_table
+            s = self._build_history([r.c.created_at, r.c.timestamp], since,
+                                    until, limit, offset).alias('snapshots')
+            cond = sa.and_(table_key_clause(c),
+                           c.c.created_at == s.c.created_at)
+            if column_names:
+                cond = sa.and_(cond, c.c.column_name.in_(column_names))
+            q = sa.select([s.c.created_at, s.c.timestamp, c.c.row_count,
+                           c.c.column_name, c.c.data_type, c.c.nulls,
+                           c.c.min, c.c.max, c.c.cardinality,
+                           c.c.validation_count, c.c.invalid_count])
+            q = q.select_from(s.outerjoin(c, cond))
+            return q.order_by(s.c.timestamp.desc(), s.c.created_at.desc())
+
+        if column_names:
+            # the column names are embedded in the IN clause.
+            q = build()
+        else:
+            q = db.statement(
+                ('DbProfilerRepository.iter_column_history', bool(since),
+                 bool(until), limit is not None, bool(offset)), build)
+        keys = table_key_params(database_name, schema_name, table_name)
+        params = self._history_params(since, until, limit, offset)
 
         try:
-            for r in db.engine.execute(query):
-                data = json.loads(unicode(r[0]))
-
-                # let's sort by the timestamp field in the table data,
-                # not the created_at field of the repo table.
-                done = False
-                for i, t in enumerate(table_history):
-                    if data['timestamp'] > t['timestamp']:
-                        table_history.insert(i+1, data)
-                        done = True
+            rs = db.conn.execute(q, dict(keys, **params))
+            for _created_at, rows in groupby(rs, lambda x: x[0]):
+                snapshot = {'timestamp': None, 'row_count': None,
+                            'columns': {}}
+                for x in rows:
+                    snapshot['timestamp'] = x[1]
+                    if x[3] is None:
                         continue
-                if not done:
-                    table_history.insert(0, data)
+                    snapshot['row_count'] = x[2]
+                    snapshot['columns'][x[3]] = {
+                        'data_type': x[4],
+                        'nulls': x[5],
+                        'min': x[6],
+                        'max': x[7],
+                        'cardinality': x[8],
+                        'validation_count': x[9],
+                        'invalid_count': x[10]}
+                yield snapshot
         except Exception as ex:
             raise InternalError(
-                "Could not get table data with its history: " + str(ex),
-                query=query, source=ex)
+                "Could not get column statistics with its history: " +
+                str(ex), query=str(q), source=ex)
+
+    def iter_tables_history(self, tables=None, since=None, until=None):
+        """
+        Iterate table records of the objects in the repository with a
+        single query, or a query for each chunk of the tables given,
+        ordered by the object names and then newest one coming first
+        as iter_table_history() does.
 
-        # newest first.
-        return [x for x in reversed(table_history)]
+        The records of each object are read in the order of creation to
+        decode the deltas with their successors. The records out of the
+        range are read only up to the first full record created after
+        the range, and decoded only when required by the deltas.
+
+        Args:
+            tables(list):       tuples of database, schema and table
+                                names, or None for all objects
+            since(str):         the oldest timestamp, inclusive
+            until(str):         the newest timestamp, exclusive
+
+        Yields:
+            a tuple of database, schema and table names, and a dictionary
+            of a table record.
+        """
+        params = self._history_params(since, until, None, None)
+        since = params.get('since')
+        until = params.get('until')
+
+        def in_range(ts):
+            return ((not since or (ts is not None and ts >= since)) and
+                    (not until or (ts is not None and ts < until)))
+
+        def iter_rs():
+            if tables is None:
+                q = db.statement(
+                    ('DbProfilerRepository.iter_tables_history',
+                     bool(since), bool(until)),
+                    lambda: self._build_tables_history(since, until, None))
+                yield (q, db.conn.execute(q, params))
+                return
+
+            # The table names in each schema are looked up by IN clauses.
+            schemas = {}
+            for x in tables:
+                schemas.setdefault((x[0], x[1]), set()).add(x[2])
+            for (database_name, schema_name) in sorted(schemas):
+                for chunk in db.chunks(sorted(schemas[(database_name,
+                                                       schema_name)])):
+                    q = self._build_tables_history(since, until, chunk)
+                    yield (q, db.conn.execute(
+                        q, dict(params, database_name=database_name,
+                                schema_name=schema_name)))
+
+        q = None
+        try:
+            for (q, rs) in iter_rs():
+                for x in self._iter_tables_history_rs(rs, in_range):
+                    yield x
+        except Exception as ex:
+            raise InternalError(
+                "Could not get table data with its history: " + str(ex),
+                query=str(q), source=ex)
+
+    @staticmethod
+    def _iter_tables_history_rs(rs, in_range):
+        for key, rows in groupby(rs, lambda x: tuple(x[0:3])):
+            rows = [(x[3], x[4], x[5]) for x in rows]
+            found = [(x[1], x[0]) for x in rows if in_range(x[1])]
+            if not found:
+                continue
+            # The records are created in the order of the timestamps
+            # in most cases, and yielded as decoded. Otherwise, they
+            # are sorted after decoding all of them.
+            ordered = found == sorted(found, reverse=True)
+            remaining = len(found)
+
+            decoded = []
+            successor = None
+            for i, (created_at, ts, s) in enumerate(rows):
+                if not in_range(ts):
+                    if i + 1 < len(rows) and is_delta(rows[i + 1][2]):
+                        successor = decode_data(s, successor)
+                    else:
+                        successor = None
+                    continue
+                successor = decode_data(s, successor)
+                if ordered:
+                    yield (key, successor)
+                else:
+                    decoded.append((ts, created_at, successor))
+                remaining -= 1
+                if remaining == 0:
+                    break
+
+            for x in sorted(decoded, key=lambda x: (x[0], x[1]),
+                            reverse=True):
+                yield (key, x[2])
 
     def put_table_fk(self, database_name1, schema_name1, table_name1,
                      column_name1,
@@ -279,8 +585,17 @@ SELECT data
         return ret
 
     def open(self):
+        """Check the repository before reading and writing it
+
+        Returns:
+            bool: False when the repository needs to be upgraded.
+        """
         assert db.engine
-        return
+        if not Repository().is_upgraded():
+            log.error(_("The repository needs to be upgraded. "
+                        "Run `dm-repo-cmd upgrade' first."))
+            return False
+        return True
 
     def close(self):
         pass
@@ -56,18 +56,21 @@ class DbProfilerVerify():
 
         log.info(_("Verifying the validation results."))
 
-        if not table_list:
-            table_list = [(x.database_name, x.schema_name, x.table_name)
-                          for x in Table2.find()]
+        if table_list:
+            # look up the tables at once.
+            tables = Table2.find_many(table_list)
+            found = set([(x.database_name, x.schema_name, x.table_name)
+                         for x in tables])
+            for t in table_list:
+                if tuple(t[0:3]) not in found:
+                    log.error(_("%s.%s not found.") % (t[1], t[2]))
+        else:
+            tables = Table2.find()
         valid = 0
         invalid = 0
-        for t in table_list:
-            tmp = Table2.find(t[0], t[1], t[2])
-            if len(tmp) == 0:
-                log.error(_("%s.%s not found.") % (t[1], t[2]))
-                continue
-            table = tmp[0].data
-            v, i = verify_table(table)
+        for tab in tables:
+            t = (tab.database_name, tab.schema_name, tab.table_name)
+            v, i = verify_table(tab.data)
             if self.verbose:
                 log.info(self.verify_msg(t, v, i))
             valid += v
@@ -5,7 +5,7 @@ import unittest
 
 import sqlalchemy as sa
 
-from repository import Repository
+from repository import Repository, attachments_table
 import db
 
 
@@ -21,51 +21,75 @@ class Attachment:
         assert objtype
         assert isinstance(filename, unicode)
 
-        q = u"""
-INSERT INTO attachments VALUES ('{0}','{1}','{2}')
-""".format(objid, objtype, filename)
-
-        db.conn.execute(q)
+        db.conn.execute(db.statement(('Attachment.create',),
+                                     attachments_table.insert),
+                        objid=objid, objtype=objtype, filename=filename)
 
         return Attachment(objid, objtype, filename)
 
+    @staticmethod
+    def _build_find(filename):
+        a = attachments_table
+        q = sa.select([a.c.filename]).where(sa.and_(
+            a.c.objid == sa.bindparam('b_objid'),
+            a.c.objtype == sa.bindparam('b_objtype')))
+        if filename:
+            q = q.where(a.c.filename == sa.bindparam('b_filename'))
+        return q.order_by(a.c.filename)
+
     @staticmethod
     def find(objid, objtype, filename=None):
         assert isinstance(objid, unicode)
         assert objtype
         assert isinstance(filename, unicode) or filename is None
 
-        if filename:
-            filename_cond = u"AND filename = '%s'" % filename
-        else:
-            filename_cond = u''
-        q = u"""
-SELECT filename
-  FROM attachments
- WHERE objid = '{0}'
-   AND objtype = '{1}'
-   {2}
- ORDER BY filename
-""".format(objid, objtype, filename_cond)
-
-        rs = db.conn.execute(q)
+        q = db.statement(('Attachment.find', bool(filename)),
+                         lambda: Attachment._build_find(filename))
+
+        rs = db.conn.execute(q, b_objid=objid, b_objtype=objtype,
+                             b_filename=filename)
         a = []
         for r in rs:
             a.append(Attachment(objid, objtype, r[0]))
         return a
 
+    @staticmethod
+    def find_by_type(objtype):
+        """Find the attachments of all the objects of the type at once
+
+        Args:
+            objtype (str): an object type, such as 'table'.
+
+        Returns:
+            list: Attachment objects sorted by the object ids and
+                  the file names.
+        """
+        assert objtype
+
+        a = attachments_table
+        q = db.statement(('Attachment.find_by_type',),
+                         lambda: sa.select([a.c.objid, a.c.filename]).where(
+                             a.c.objtype == sa.bindparam('b_objtype')
+                         ).order_by(a.c.objid, a.c.filename))
+
+        rs = db.conn.execute(q, b_objtype=objtype)
+        return [Attachment(r[0], objtype, r[1]) for r in rs]
+
     def update(self):
         pass
 
     def destroy(self):
-        q = u"""
-DELETE FROM attachments
- WHERE objid = '{0}'
-   AND objtype = '{1}'
-   AND filename = '{2}'
-""".format(self.objid, self.objtype, self.filename)
-
-        db.conn.execute(q)
+        q = db.statement(('Attachment.destroy',),
+                         lambda: attachments_table.delete().where(sa.and_(
+                             attachments_table.c.objid ==
+                             sa.bindparam('b_objid'),
+                             attachments_table.c.objtype ==
+                             sa.bindparam('b_objtype'),
+                             attachments_table.c.filename ==
+                             sa.bindparam('b_filename'))))
+
+        db.conn.execute(q, b_objid=self.objid, b_objtype=self.objtype,
+                        b_filename=self.filename)
 
         return True
 
@@ -137,6 +161,21 @@ class TestAttachment(unittest.TestCase):
         self.assertEquals(1, len(a))
         self.assertEqual('filename.ppt', a[0].filename)
 
+    def test_find_by_type_001(self):
+        Attachment.create(u'bbb', 'table', u'filename.xls')
+        Attachment.create(u'aaa', 'table', u'filename.xls')
+        Attachment.create(u'aaa', 'table', u'filename.ppt')
+        Attachment.create(u'aaa', 'tag', u'filename.doc')
+
+        a = Attachment.find_by_type('table')
+        self.assertEquals([(u'aaa', u'filename.ppt'),
+                           (u'aaa', u'filename.xls'),
+                           (u'bbb', u'filename.xls')],
+                          [(x.objid, x.filename) for x in a])
+        self.assertEqual('table', a[0].objtype)
+
+        self.assertEquals([], Attachment.find_by_type('schema'))
+
     def test_destroy_001(self):
         Attachment.create(u'aaa', 'table', u'filename.xls')
 
@@ -2,7 +2,9 @@
 # -*- coding: utf-8 -*-
 
 from copy import deepcopy
+import re
 import sys
+import time
 
 from hecatoncheir import DbDriverBase, logger as log
 from hecatoncheir.QueryResult import QueryResult
@@ -15,6 +17,14 @@ class BigQueryDriver(DbDriverBase.DbDriverBase):
     conn = None
     driver = None
 
+    # number of the query jobs running at the same time, and
+    # the interval (in seconds) to poll the jobs.
+    max_concurrent_jobs = 16
+    poll_interval = 0.1
+
+    # total bytes processed by the query jobs run on this driver.
+    bytes_processed = 0
+
     def __init__(self, project):
         self.project = project
 
@@ -35,12 +45,15 @@ class BigQueryDriver(DbDriverBase.DbDriverBase):
 
         return True
 
-    def query_to_resultset(self, query, max_rows=10000, timeout=None):
+    def query_to_resultset(self, query, max_rows=10000, timeout=None,
+                           params=None, query_class=None):
         """Build a QueryResult object from the query
 
         Args:
             query (str): a query string to be executed.
             max_rows (int): max rows which can be kept in a QueryResult object.
+            params (dict): values of the named query parameters.
+            query_class (str): not used on BigQuery.
 
         Returns:
             QueryResult: an object holding query, column names and result set.
@@ -51,44 +64,168 @@ class BigQueryDriver(DbDriverBase.DbDriverBase):
 
         res = QueryResult(query)
         try:
-            if not self.conn:
-                self.connect()
-
-            query_job = self.conn.query(res.query)
-            assert query_job
-            res_iter = query_job.result(timeout=timeout)
-            assert query_job.state == 'DONE'
-
-            desc = []
-            for f in query_job.query_results().schema:
-                desc.append(f.name)
-            res.column_names = deepcopy(tuple(desc))
-
-            for row in res_iter:
-                # let's consider the memory size.
-                if len(res.resultset) > max_rows:
-                    raise InternalError(
-                        u'Exceeded the record limit (%d) for QueryResult.' %
-                        max_rows, query=query)
-                res.resultset.append(deepcopy(list(row)))
+            job = self._submit(res.query, params)
+            self._fetch(res, job, max_rows, timeout)
         except InternalError as ex:
             raise ex
         except DriverError as ex:
             raise ex
         except Exception as ex:
-            msg = unicode(ex)
-            if msg == ('Operation did not complete within '
-                       'the designated timeout.'):
-                raise QueryTimeout(
-                    "Query timeout: %s" % query,
-                    query=query, source=ex)
-            raise QueryError(
-                "Could not execute a query: %s" % msg,
-                query=query, source=ex)
+            self._raise_query_error(query, ex)
 
         log.trace('query_to_resultset: end')
         return res
 
+    def queries_to_resultsets(self, queries, max_rows=10000, timeout=None):
+        """Run the queries as concurrent query jobs
+
+        The jobs are submitted up to max_concurrent_jobs at once,
+        and the results are collected in the order the jobs finish.
+
+        Args:
+            queries (dict): query strings keyed by labels.
+            max_rows (int): max rows which can be kept in a QueryResult object.
+            timeout (int): timeout in seconds for all the queries.
+
+        Returns:
+            dict: QueryResult objects keyed by the labels of the queries.
+        """
+        log.trace('queries_to_resultsets: start %d queries' % len(queries))
+
+        waiting = list(queries.items())
+        running = []
+        results = {}
+        started = time.time()
+        while waiting or running:
+            while waiting and len(running) < self.max_concurrent_jobs:
+                label, query = waiting.pop()
+                assert isinstance(query, unicode)
+                try:
+                    job = self._submit(query)
+                except DriverError as ex:
+                    raise ex
+                except Exception as ex:
+                    self._raise_query_error(query, ex)
+                running.append((label, QueryResult(query), job))
+
+            pending = []
+            for label, res, job in running:
+                if not job.done():
+                    pending.append((label, res, job))
+                    continue
+                try:
+                    self._fetch(res, job, max_rows, timeout)
+                except InternalError as ex:
+                    raise ex
+                except Exception as ex:
+                    self._raise_query_error(res.query, ex)
+                results[label] = res
+
+            if pending and timeout and time.time() - started > timeout:
+                raise QueryTimeout("Query timeout: %s" % pending[0][1].query,
+                                   query=pending[0][1].query)
+            if pending and len(pending) == len(running):
+                time.sleep(self.poll_interval)
+            running = pending
+
+        log.trace('queries_to_resultsets: end')
+        return results
+
+    def dry_run(self, query):
+        """Get the number of bytes the query would process
+
+        Args:
+            query (str): a query string to be estimated.
+
+        Returns:
+            long: total bytes processed, estimated by a dry-run job.
+        """
+        assert isinstance(query, unicode)
+        log.trace('dry_run: start query=%s' % query)
+
+        if not self.conn:
+            self.connect()
+
+        config = self.driver.QueryJobConfig()
+        config.dry_run = True
+        config.use_query_cache = False
+        try:
+            query_job = self.conn.query(query, job_config=config)
+        except Exception as ex:
+            self._raise_query_error(query, ex)
+
+        log.trace('dry_run: end bytes=%s' % query_job.total_bytes_processed)
+        return long(query_job.total_bytes_processed or 0)
+
+    def _query_parameters(self, params):
+        """Build the named query parameters from the bind variables
+
+        Args:
+            params (dict): values of the bind variables.
+
+        Returns:
+            list: ScalarQueryParameter objects sorted by the names.
+        """
+        parameters = []
+        for name in sorted(params.keys()):
+            value = params[name]
+            if isinstance(value, bool):
+                type_ = 'BOOL'
+            elif isinstance(value, (int, long)):
+                type_ = 'INT64'
+            elif isinstance(value, float):
+                type_ = 'FLOAT64'
+            else:
+                type_ = 'STRING'
+            parameters.append(
+                self.driver.ScalarQueryParameter(name, type_, value))
+        return parameters
+
+    def _submit(self, query, params=None):
+        if not self.conn:
+            self.connect()
+
+        config = None
+        if params:
+            # %(name)s -> @name
+            query = re.sub(r'%\((\w+)\)s', r'@\1', query)
+            config = self.driver.QueryJobConfig()
+            config.query_parameters = self._query_parameters(params)
+        query_job = self.conn.query(query, job_config=config)
+        assert query_job
+        return query_job
+
+    def _fetch(self, res, query_job, max_rows, timeout):
+        res_iter = query_job.result(timeout=timeout)
+        assert query_job.state == 'DONE'
+
+        desc = []
+        for f in query_job.query_results().schema:
+            desc.append(f.name)
+        res.column_names = deepcopy(tuple(desc))
+
+        for row in res_iter:
+            # let's consider the memory size.
+            if len(res.resultset) > max_rows:
+                raise InternalError(
+                    u'Exceeded the record limit (%d) for QueryResult.' %
+                    max_rows, query=res.query)
+            res.resultset.append(deepcopy(list(row)))
+
+        self.bytes_processed += long(query_job.total_bytes_processed or 0)
+        return res
+
+    def _raise_query_error(self, query, ex):
+        msg = unicode(ex)
+        if msg == ('Operation did not complete within '
+                   'the designated timeout.'):
+            raise QueryTimeout(
+                "Query timeout: %s" % query,
+                query=query, source=ex)
+        raise QueryError(
+            "Could not execute a query: %s" % msg,
+            query=query, source=ex)
+
     def disconnect(self):
         if self.conn is None:
             return False
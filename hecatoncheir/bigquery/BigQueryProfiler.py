@@ -18,6 +18,14 @@ class BigQueryProfiler(DbProfilerBase.DbProfilerBase):
     dbdriver = None
     dbconn = None
     column_cache = None
+    table_cache = None
+
+    # byte budgets for a run and for a table. None means unlimited.
+    max_bytes = None
+    max_table_bytes = None
+    sample_percent = 10
+    run_bytes_projected = 0L
+    scan_bytes = None
 
     def __init__(self, credential, debug=False):
         os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = credential
@@ -49,9 +57,24 @@ class BigQueryProfiler(DbProfilerBase.DbProfilerBase):
         return tables
 
     def _get_table(self, schema_name, table_name):
-        ds = self.dbdriver.conn.dataset(schema_name)
-        tab_ref = self.dbdriver.driver.table.TableReference(ds, table_name)
-        return self.dbdriver.conn.get_table(tab_ref)
+        """Get the table resource, fetched only once for each table
+
+        Args:
+            schema_name (str): dataset name
+            table_name (str): table name
+
+        Returns:
+            Table: a table resource object
+        """
+        if self.table_cache is None:
+            self.table_cache = {}
+        key = (schema_name, table_name)
+        if key not in self.table_cache:
+            ds = self.dbdriver.conn.dataset(schema_name)
+            tab_ref = self.dbdriver.driver.table.TableReference(ds,
+                                                                table_name)
+            self.table_cache[key] = self.dbdriver.conn.get_table(tab_ref)
+        return self.table_cache[key]
 
     def get_column_names(self, schema_name, table_name):
         tab = self._get_table(schema_name, table_name)
@@ -63,7 +86,7 @@ class BigQueryProfiler(DbProfilerBase.DbProfilerBase):
     def get_sample_rows(self, schema_name, table_name, rows_limit=10):
         tab = self._get_table(schema_name, table_name)
         rows = []
-        rows.append(self.get_column_names(schema_name, table_name))
+        rows.append([f.name for f in tab.schema])
         for r in self.dbdriver.conn.list_rows(tab, max_results=rows_limit):
             rows.append(list(r))
         return rows
@@ -87,6 +110,70 @@ class BigQueryProfiler(DbProfilerBase.DbProfilerBase):
         if table_name not in self.column_cache[schema_name]:
             self.column_cache[schema_name][table_name] = {}
 
+    def _init_scan_bytes(self):
+        self.scan_bytes = {'projected': 0L,
+                           'processed': 0L,
+                           'sample_percent': self.sample_percent,
+                           'sampled': [],
+                           'skipped': []}
+
+    def _get_remaining_bytes(self):
+        remaining = []
+        if self.max_bytes is not None:
+            remaining.append(self.max_bytes - self.run_bytes_projected)
+        if self.max_table_bytes is not None:
+            remaining.append(self.max_table_bytes -
+                             self.scan_bytes['projected'])
+        return min(remaining) if remaining else None
+
+    def _plan_query(self, label, query, sampled_query=None):
+        """Decide how to run the query within the byte budget
+
+        The query is dry-run first. When the projected bytes exceed
+        the remaining budget, the sampled query is chosen instead if
+        given, otherwise the query is skipped.
+
+        Args:
+            label (str): a label of the query recorded in the snapshot.
+            query (str): a query string scanning the whole table.
+            sampled_query (str): a query string using TABLESAMPLE.
+
+        Returns:
+            str: a query string to be executed, or None to skip.
+        """
+        if self.scan_bytes is None:
+            self._init_scan_bytes()
+
+        projected = self.dbdriver.dry_run(query)
+        remaining = self._get_remaining_bytes()
+        if remaining is None or projected <= remaining:
+            chosen = query
+        else:
+            # The estimate of a sampled query is derived from the full
+            # one, since the blocks are sampled at the execution.
+            projected = long(projected * self.sample_percent / 100)
+            if sampled_query and projected <= remaining:
+                chosen = sampled_query
+                self.scan_bytes['sampled'].append(label)
+            else:
+                log.warning(_("Skipping %s due to the byte budget.") % label)
+                self.scan_bytes['skipped'].append(label)
+                return None
+
+        self.scan_bytes['projected'] += projected
+        self.run_bytes_projected += projected
+        return chosen
+
+    def _scale_sampled(self, count):
+        """Scale a count found in the sample to the whole table"""
+        return long(round(count * 100.0 / self.sample_percent))
+
+    def _from_clause(self, schema_name, table_name, sampled=False):
+        if sampled:
+            return u'{0}.{1} TABLESAMPLE SYSTEM ({2} PERCENT)'.format(
+                schema_name, table_name, self.sample_percent)
+        return u'{0}.{1}'.format(schema_name, table_name)
+
     def _get_column(self, schema_name, table_name):
         column_names = self.get_column_names(schema_name, table_name)
         columns = []
@@ -95,83 +182,130 @@ class BigQueryProfiler(DbProfilerBase.DbProfilerBase):
                             'ELSE NULL END) %s_nulls') % (col, col))
             columns.append('MIN(%s) %s_min' % (col, col))
             columns.append('MAX(%s) %s_max' % (col, col))
-        q = u'SELECT {0} FROM {1}.{2}'.format(','.join(columns),
-                                              schema_name, table_name)
-        # print(q)
+        q = u'SELECT {0} FROM {1}'
+        full = q.format(','.join(columns),
+                        self._from_clause(schema_name, table_name))
+        sampled = q.format(','.join(columns),
+                           self._from_clause(schema_name, table_name, True))
+        q = self._plan_query(u'nulls/min/max', full, sampled)
+        if q is None:
+            self.column_cache[schema_name][table_name] = None
+            return
+
         r = self.dbdriver.q2rs(q).resultset[0]
-        for c in column_names:
+        for i, c in enumerate(column_names):
+            (nulls, colmin, colmax) = r[i * 3:i * 3 + 3]
+            if q == sampled:
+                # scale the number of nulls found in the sample.
+                nulls = self._scale_sampled(nulls)
             self.column_cache[schema_name][table_name][c] = (
-                r.pop(0), r.pop(0), r.pop(0))
-            # print('column %s cache %s' % (
-            # c, self.column_cache[schema_name][table_name][c]))
+                nulls, colmin, colmax)
 
-    def get_column_nulls(self, schema_name, table_name):
-        column_names = self.get_column_names(schema_name, table_name)
+    def _get_column_cache(self, schema_name, table_name):
         self._init_column_cache(schema_name, table_name)
 
-        if not self.column_cache[schema_name][table_name]:
+        if self.column_cache[schema_name][table_name] == {}:
             self._get_column(schema_name, table_name)
+        return self.column_cache[schema_name][table_name]
+
+    def get_column_nulls(self, schema_name, table_name, use_statistics=False):
+        column_names = self.get_column_names(schema_name, table_name)
+        cache = self._get_column_cache(schema_name, table_name)
+        if cache is None:
+            return None
 
         nulls = {}
         for c in column_names:
-            nulls[c] = self.column_cache[schema_name][table_name][c][0]
+            nulls[c] = cache[c][0]
         return nulls
 
     def get_column_min_max(self, schema_name, table_name):
         column_names = self.get_column_names(schema_name, table_name)
-        self._init_column_cache(schema_name, table_name)
-
-        if not self.column_cache[schema_name][table_name]:
-            self._get_column(schema_name, table_name)
+        cache = self._get_column_cache(schema_name, table_name)
+        if cache is None:
+            return None
 
         minmax = {}
         for c in column_names:
-            minmax[c] = [self.column_cache[schema_name][table_name][c][1],
-                         self.column_cache[schema_name][table_name][c][2]]
+            minmax[c] = [cache[c][1], cache[c][2]]
         return minmax
 
-    def _get_column_freq_values(self, schema_name, table_name,
-                                column_name, ascending):
+    def _run_planned_queries(self, queries):
+        """Run the queries within the byte budget as concurrent jobs
+
+        Args:
+            queries (dict): pairs of full and sampled query strings
+                            keyed by the labels.
+
+        Returns:
+            dict: QueryResult objects keyed by the labels, or None
+                  if all the queries are skipped.
+        """
+        planned = {}
+        for label in sorted(queries.keys()):
+            q = self._plan_query(label, queries[label][0], queries[label][1])
+            if q is not None:
+                planned[label] = q
+        if queries and not planned:
+            return None
+        return self.dbdriver.queries_to_resultsets(planned)
+
+    def _build_column_freq_query(self, schema_name, table_name,
+                                 column_name, ascending, sampled=False):
         limit = 10
 
-        q = u"""
+        return u"""
 WITH TEMP AS (
 SELECT
-  {2},
+  {1},
   COUNT(*) AS COUNT
 FROM
-  {0}.{1}
+  {0}
 WHERE
-  {2} IS NOT NULL
+  {1} IS NOT NULL
 GROUP BY
-  {2}
+  {1}
 )
 SELECT * FROM TEMP
 ORDER BY
-  2 {3}, 1
-LIMIT {4}
-""".format(schema_name, table_name, column_name,
+  2 {2}, 1
+LIMIT {3}
+""".format(self._from_clause(schema_name, table_name, sampled), column_name,
            'ASC' if ascending else 'DESC',
            limit)
 
-        rs = self.dbdriver.q2rs(q)
-        return rs.resultset
+    def _get_column_freq_values(self, schema_name, table_name, ascending):
+        queries = {}
+        for col in self.get_column_names(schema_name, table_name):
+            label = u'%s(%s)' % ('least_freq' if ascending else 'most_freq',
+                                 col)
+            queries[label] = (
+                self._build_column_freq_query(schema_name, table_name,
+                                              col, ascending),
+                self._build_column_freq_query(schema_name, table_name,
+                                              col, ascending, True))
+
+        results = self._run_planned_queries(queries)
+        if results is None:
+            return None
 
-    def get_column_most_freq_values(self, schema_name, table_name):
         freqs = {}
-        column_names = self.get_column_names(schema_name, table_name)
-        for col in column_names:
-            freqs[col] = self._get_column_freq_values(schema_name, table_name,
-                                                      col, False)
+        for col in self.get_column_names(schema_name, table_name):
+            label = u'%s(%s)' % ('least_freq' if ascending else 'most_freq',
+                                 col)
+            # a column skipped in the budget has no frequent values.
+            freqs[col] = results[label].resultset if label in results else []
+            if label in self.scan_bytes['sampled']:
+                # scale the frequencies found in the sample.
+                freqs[col] = [[r[0], self._scale_sampled(r[1])]
+                              for r in freqs[col]]
         return freqs
 
+    def get_column_most_freq_values(self, schema_name, table_name):
+        return self._get_column_freq_values(schema_name, table_name, False)
+
     def get_column_least_freq_values(self, schema_name, table_name):
-        freqs = {}
-        column_names = self.get_column_names(schema_name, table_name)
-        for col in column_names:
-            freqs[col] = self._get_column_freq_values(schema_name, table_name,
-                                                      col, True)
-        return freqs
+        return self._get_column_freq_values(schema_name, table_name, True)
 
     def get_column_cardinalities(self, schema_name, table_name,
                                  use_statistics=False):
@@ -179,28 +313,63 @@ LIMIT {4}
         if use_statistics:
             raise NotImplementedError('use_statistics=True is not supported yet.')
 
-        column_names = self.get_column_names(schema_name, table_name)
-        column_cardinalities = {}
-        for col in column_names:
-            q = u"""
+        queries = {}
+        for col in self.get_column_names(schema_name, table_name):
+            full = u"""
 WITH TEMP AS (
 SELECT
-  DISTINCT {2}
+  DISTINCT {1}
 FROM
-  {0}.{1}
+  {0}
 WHERE
-  {2} IS NOT NULL
+  {1} IS NOT NULL
 )
 SELECT
   COUNT(*)
 FROM
   TEMP
-""".format(schema_name, table_name, col)
+""".format(self._from_clause(schema_name, table_name), col)
+            sampled = u'SELECT APPROX_COUNT_DISTINCT({1}) FROM {0}'.format(
+                self._from_clause(schema_name, table_name, True), col)
+            queries[u'cardinality(%s)' % col] = (full, sampled)
+
+        results = self._run_planned_queries(queries)
+        if results is None:
+            return None
 
-            rs = self.dbdriver.q2rs(q)
-            column_cardinalities[col] = rs.resultset[0][0]
+        column_cardinalities = {}
+        for col in self.get_column_names(schema_name, table_name):
+            label = u'cardinality(%s)' % col
+            if label in results:
+                column_cardinalities[col] = long(
+                    results[label].resultset[0][0])
         return column_cardinalities
 
+    def run(self, schema_name=None, table_name=None,
+            skip_record_validation=False, validation_rules=None,
+            timeout=None):
+        self._init_scan_bytes()
+        processed = self.dbdriver.bytes_processed
+
+        table_data = DbProfilerBase.DbProfilerBase.run(
+            self, schema_name, table_name,
+            skip_record_validation=skip_record_validation,
+            validation_rules=validation_rules, timeout=timeout)
+
+        self.scan_bytes['processed'] = (self.dbdriver.bytes_processed -
+                                        processed)
+        # APPROX_COUNT_DISTINCT over the sample cannot be scaled to the
+        # whole table, so the cardinality is marked as an approximation.
+        for c in table_data['columns']:
+            label = u'cardinality(%s)' % c['column_name']
+            if label in self.scan_bytes['sampled']:
+                c['cardinality_approx'] = True
+        table_data['scan_bytes'] = self.scan_bytes
+        log.info(_("Bytes processed: %s (projected: %s)") %
+                 ("{:,d}".format(self.scan_bytes['processed']),
+                  "{:,d}".format(self.scan_bytes['projected'])))
+        return table_data
+
     def run_record_validation(self, schema_name, table_name, validation_rules):
         timeout = 600
         log.trace('run_record_validation: start. %s.%s' %
@@ -218,6 +387,8 @@ FROM
                 'No column found on the table `%s\'.')
         query = u'SELECT %s FROM %s.%s' % (','.join(column_names),
                                            schema_name, table_name)
+        if self._plan_query(u'record_validation', query) is None:
+            return {}
 
         failed = 0
         count = 0
@@ -238,6 +409,8 @@ FROM
                 if not validator.validate_record(fnames, list(row)):
                     failed += 1
                 count += 1
+            self.dbdriver.bytes_processed += long(
+                query_job.total_bytes_processed or 0)
         except Exception as ex:
             raise ex
 
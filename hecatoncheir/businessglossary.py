@@ -7,7 +7,8 @@ import unittest
 
 import sqlalchemy as sa
 
-from repository import Repository
+from repository import (Repository, bump_change_count,
+                        business_glossary_table, update_glossary_search_docs)
 import db
 
 
@@ -22,18 +23,26 @@ def get_bg_term(term):
     Returns:
       dict: a dictionary of key-value pairs.
     """
-    data = {}
+    return bg_term2dict(GlossaryTerm.find(term)[0])
+
+
+def bg_term2dict(t):
+    """
+    Get a GlossaryTerm object in the dictionary format of get_bg_term().
 
-    t = GlossaryTerm.find(term)
+    Returns:
+      dict: a dictionary of key-value pairs.
+    """
+    data = {}
 
-    data['term'] = t[0].term
-    data['description_short'] = t[0].desc_short
-    data['description_long'] = t[0].desc_long
-    data['owned_by'] = t[0].owner
-    data['categories'] = t[0].categories
-    data['synonyms'] = t[0].synonyms
-    data['related_terms'] = t[0].related_terms
-    data['assigned_assets'] = t[0].assigned_assets
+    data['term'] = t.term
+    data['description_short'] = t.desc_short
+    data['description_long'] = t.desc_long
+    data['owned_by'] = t.owner
+    data['categories'] = t.categories
+    data['synonyms'] = t.synonyms
+    data['related_terms'] = t.related_terms
+    data['assigned_assets'] = t.assigned_assets
 
     return data
 
@@ -53,73 +62,44 @@ class GlossaryTerm:
     @staticmethod
     def create(term, desc_short, desc_long, owner,
                categories, synonyms, related_terms, assigned_assets):
-        query = u"""
-INSERT INTO business_glossary (
-  id,
-  term,
-  description_short,
-  description_long,
-  owned_by,
-  categories,
-  synonyms,
-  related_terms,
-  assigned_assets,
-  created_at,
-  updated_at
-) VALUES (
-  {0},
-  '{1}',
-  '{2}',
-  '{3}',
-  '{4}',
-  '{5}',
-  '{6}',
-  '{7}',
-  '{8}',
-  {9},
-  {10}
-)
-""".format(0,
-           term, desc_short, desc_long, owner,
-           json.dumps(categories),
-           json.dumps(synonyms),
-           json.dumps(related_terms),
-           json.dumps(assigned_assets),
-           db.fmt_datetime(datetime.now().isoformat()),
-           db.fmt_datetime(datetime.now().isoformat()))
-
-        db.engine.execute(query)
+        now = datetime.now().isoformat()
+        with db.session():
+            db.conn.execute(db.statement(('GlossaryTerm.create',),
+                                         business_glossary_table.insert),
+                            id=0,
+                            term=term,
+                            description_short=desc_short,
+                            description_long=desc_long,
+                            owned_by=owner,
+                            categories=json.dumps(categories),
+                            synonyms=json.dumps(synonyms),
+                            related_terms=json.dumps(related_terms),
+                            assigned_assets=json.dumps(assigned_assets),
+                            created_at=now,
+                            updated_at=now)
+            update_glossary_search_docs(term, desc_short, synonyms)
+            bump_change_count()
 
         return GlossaryTerm(term, desc_short, desc_long, owner,
                             categories, synonyms, related_terms,
                             assigned_assets)
 
     @staticmethod
-    def find(term=None):
-        cond = ['1=1']
+    def _build_find(term):
+        b = business_glossary_table
+        q = sa.select([b.c.term, b.c.description_short, b.c.description_long,
+                       b.c.owned_by, b.c.categories, b.c.synonyms,
+                       b.c.related_terms, b.c.assigned_assets]).distinct()
         if term:
-            cond.append("term = '%s'" % term)
-
-        query = u"""
-SELECT
-  DISTINCT
-  term,
-  description_short,
-  description_long,
-  owned_by,
-  categories,
-  synonyms,
-  related_terms,
-  assigned_assets
-FROM
-  business_glossary
-WHERE
-  {0}
-ORDER BY
-  term
-""".format(' AND '.join(cond))
-
-        rs = db.engine.execute(query)
+            q = q.where(b.c.term == sa.bindparam('term'))
+        return q.order_by(b.c.term)
+
+    @staticmethod
+    def find(term=None):
+        q = db.statement(('GlossaryTerm.find', bool(term)),
+                         lambda: GlossaryTerm._build_find(term))
+
+        rs = db.conn.execute(q, term=term)
         terms = []
         for r in rs:
             t = GlossaryTerm(r[0], r[1], r[2], r[3],
@@ -130,38 +110,35 @@ ORDER BY
         return terms
 
     def update(self):
-        query = u"""
-UPDATE
-  business_glossary
-SET
-  description_short = {1},
-  description_long = {2},
-  owned_by = {3},
-  categories = '{4}',
-  synonyms = '{5}',
-  related_terms = '{6}',
-  assigned_assets = '{7}',
-  updated_at = {8}
-WHERE
-  term = '{0}'
-""".format(self.term,
-           db.fmt_nullable(self.desc_short),
-           db.fmt_nullable(self.desc_long),
-           db.fmt_nullable(self.owner),
-           json.dumps(self.categories),
-           json.dumps(self.synonyms),
-           json.dumps(self.related_terms),
-           json.dumps(self.assigned_assets),
-           db.fmt_datetime(datetime.now().isoformat()))
-
-        db.engine.execute(query)
+        b = business_glossary_table
+        q = db.statement(('GlossaryTerm.update',),
+                         lambda: b.update().where(
+                             b.c.term == sa.bindparam('b_term')))
+        with db.session():
+            db.conn.execute(q, b_term=self.term,
+                            description_short=self.desc_short,
+                            description_long=self.desc_long,
+                            owned_by=self.owner,
+                            categories=json.dumps(self.categories),
+                            synonyms=json.dumps(self.synonyms),
+                            related_terms=json.dumps(self.related_terms),
+                            assigned_assets=json.dumps(self.assigned_assets),
+                            updated_at=datetime.now().isoformat())
+            update_glossary_search_docs(self.term, self.desc_short,
+                                        self.synonyms)
+            bump_change_count()
 
         return True
 
     def destroy(self):
-        query = u"DELETE FROM business_glossary WHERE term = '%s'" % self.term
-
-        db.engine.execute(query)
+        b = business_glossary_table
+        q = db.statement(('GlossaryTerm.destroy',),
+                         lambda: b.delete().where(
+                             b.c.term == sa.bindparam('b_term')))
+        with db.session():
+            db.conn.execute(q, b_term=self.term)
+            update_glossary_search_docs(self.term, delete=True)
+            bump_change_count()
 
         return True
 
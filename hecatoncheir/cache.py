@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+import os
+import threading
+import unittest
+
+from repository import Repository, bump_change_count, get_change_count
+import db
+
+
+class RepositoryCache:
+    """LRU cache of the objects loaded from the repository
+
+    All the entries are dropped when the change count of the repository,
+    which is bumped by the writes, differs from the one seen last time.
+    When the repository does not record the change count, nothing is
+    kept in the cache. It can be shared by the threads, and the objects
+    are loaded outside the lock.
+
+    Example:
+        cache = RepositoryCache()
+
+        cache.validate()
+        terms = cache.get(('glossary',), load_glossary_terms)
+    """
+
+    def __init__(self, size=1000):
+        self.size = size
+        self.entries = OrderedDict()
+        self.change_count = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def validate(self):
+        """Drop the entries when the repository has been changed
+
+        Returns:
+            bool: True when the entries are still valid.
+        """
+        count = get_change_count()
+        with self.lock:
+            if count is not None and count == self.change_count:
+                return True
+
+            if self.entries:
+                self.invalidations += 1
+            self.entries.clear()
+            self.change_count = count
+            return False
+
+    def get(self, key, load):
+        """Get an object from the cache, or load it on a miss
+
+        Args:
+            key (tuple): a key identifying the object.
+            load (function): a function to load the object.
+
+        Returns:
+            the cached or the loaded object.
+        """
+        with self.lock:
+            if key in self.entries:
+                value = self.entries.pop(key)
+                self.entries[key] = value
+                self.hits += 1
+                return value
+            self.misses += 1
+            change_count = self.change_count
+
+        value = load()
+        with self.lock:
+            # not kept when the repository has been changed meanwhile.
+            if (change_count is not None and
+                    change_count == self.change_count and self.size > 0):
+                if key in self.entries:
+                    del self.entries[key]
+                elif len(self.entries) >= self.size:
+                    self.entries.popitem(last=False)
+                self.entries[key] = value
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get_stats(self):
+        """Get the counters of the cache
+
+        Returns:
+            dict: {'size': <int>, 'entries': <int>, 'hits': <int>,
+                   'misses': <int>, 'invalidations': <int>,
+                   'change_count': <int>}
+        """
+        return {'size': self.size,
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'change_count': self.change_count}
+
+
+class TestRepositoryCache(unittest.TestCase):
+    def setUp(self):
+        db.creds = {}
+        db.creds['host'] = os.environ.get('PGHOST', 'localhost')
+        db.creds['port'] = os.environ.get('PGPORT', 5432)
+        db.creds['dbname'] = os.environ.get('PGDATABASE', 'datacatalog')
+        db.creds['username'] = os.environ.get('PGUSER', 'postgres')
+        db.creds['password'] = os.environ.get('PGPASSWORD', 'postgres')
+
+        self.repo = Repository()
+        self.repo.destroy()
+        self.repo.create()
+
+    def tearDown(self):
+        db.conn.close()
+
+    def test_get_001(self):
+        cache = RepositoryCache(size=2)
+        self.assertFalse(cache.validate())
+        self.assertTrue(cache.validate())
+
+        self.assertEqual(1, cache.get(('a',), lambda: 1))
+        self.assertEqual(1, cache.get(('a',), lambda: 2))
+        self.assertEqual(3, cache.get(('b',), lambda: 3))
+        self.assertEqual(4, cache.get(('c',), lambda: 4))
+
+        # the least recently used one is evicted.
+        self.assertEqual(5, cache.get(('a',), lambda: 5))
+        self.assertEqual({'size': 2, 'entries': 2, 'hits': 1, 'misses': 4,
+                          'invalidations': 0, 'change_count': 0},
+                         cache.get_stats())
+
+    def test_validate_001(self):
+        cache = RepositoryCache()
+        cache.validate()
+        cache.get(('a',), lambda: 1)
+
+        bump_change_count()
+        self.assertFalse(cache.validate())
+        self.assertEqual(2, cache.get(('a',), lambda: 2))
+        self.assertEqual(1, cache.get_stats()['invalidations'])
+        self.assertEqual(1, cache.get_stats()['change_count'])
+
+        # not cached without the change count.
+        self.repo.drop_table('repo_changes')
+        self.assertFalse(cache.validate())
+        self.assertEqual(3, cache.get(('a',), lambda: 3))
+        self.assertEqual(4, cache.get(('a',), lambda: 4))
+        self.assertEqual(0, cache.get_stats()['entries'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,7 +7,7 @@ import unittest
 
 import sqlalchemy as sa
 
-from repository import Repository
+from repository import Repository, datamapping_table
 import db
 
 
@@ -30,12 +30,11 @@ def get_datamap_items(database_name, schema_name, table_name,
     """
     assert database_name and schema_name and table_name
 
-    items = DatamappingItem.find(database_name, schema_name,
-                                 table_name, column_name)
-    datamap = []
-    for item in items:
-        datamap.append(json.loads(item[0]))
-    return datamap
+    items = DatamappingItem.find(database_name=database_name,
+                                 schema_name=schema_name,
+                                 table_name=table_name,
+                                 column_name=column_name)
+    return [item.data for item in items]
 
 
 class DatamappingItem():
@@ -64,32 +63,20 @@ class DatamappingItem():
         assert database_name and schema_name and table_name
         assert isinstance(data, dict)
 
-        query = u"""
-INSERT INTO datamapping (
-  lineno,
-  record_id,
-  database_name,schema_name,table_name,column_name,
-  source_database_name,source_schema_name,source_table_name,source_column_name,
-  created_at,
-  data)
- VALUES (
-  {0},
-  '{1}',
-  '{2}', '{3}', '{4}', {5},
-  {6}, {7}, {8}, {9},
-  {10}, '{11}')
-""".format(0,
-           record_id,
-           database_name, schema_name, table_name,
-           db.fmt_nullable(column_name),
-           db.fmt_nullable(source_database_name),
-           db.fmt_nullable(source_schema_name),
-           db.fmt_nullable(source_table_name),
-           db.fmt_nullable(source_column_name),
-           db.fmt_datetime(datetime.now().isoformat()),
-           db.quote_string(json.dumps(data)))
-
-        db.engine.execute(query)
+        db.conn.execute(db.statement(('DatamappingItem.create',),
+                                     datamapping_table.insert),
+                        lineno=0,
+                        record_id=record_id,
+                        database_name=database_name,
+                        schema_name=schema_name,
+                        table_name=table_name,
+                        column_name=column_name,
+                        source_database_name=source_database_name,
+                        source_schema_name=source_schema_name,
+                        source_table_name=source_table_name,
+                        source_column_name=source_column_name,
+                        created_at=datetime.now().isoformat(),
+                        data=json.dumps(data))
 
         return DatamappingItem(record_id,
                                database_name, schema_name,
@@ -98,44 +85,40 @@ INSERT INTO datamapping (
                                source_table_name, source_column_name,
                                data)
 
+    @staticmethod
+    def _build_find(conds):
+        d = datamapping_table
+        q = sa.select([d.c.record_id,
+                       d.c.database_name, d.c.schema_name, d.c.table_name,
+                       d.c.column_name,
+                       d.c.source_database_name, d.c.source_schema_name,
+                       d.c.source_table_name, d.c.source_column_name,
+                       d.c.created_at, d.c.data])
+        for c in conds:
+            q = q.where(d.c[c] == sa.bindparam(c))
+        return q.order_by(d.c.record_id)
+
     @staticmethod
     def find(record_id=None,
              database_name=None, schema_name=None,
              table_name=None, column_name=None):
-        cond = ["1=1"]
+        params = {}
         if record_id:
-            cond.append("record_id = '%s'" % record_id)
+            params['record_id'] = record_id
         if database_name:
-            cond.append("database_name = '%s'" % database_name)
+            params['database_name'] = database_name
         if schema_name:
-            cond.append("schema_name = '%s'" % schema_name)
+            params['schema_name'] = schema_name
         if table_name:
-            cond.append("table_name = '%s'" % table_name)
+            params['table_name'] = table_name
         if column_name:
-            cond.append("column_name = '%s'" % column_name)
-
-        query = u"""
-SELECT
-  record_id,
-  database_name,
-  schema_name,
-  table_name,
-  column_name,
-  source_database_name,
-  source_schema_name,
-  source_table_name,
-  source_column_name,
-  created_at,
-  data
-FROM
-  datamapping
-WHERE
-  ({0})
-ORDER BY
-  record_id
-""".format(' AND '.join(cond))
-
-        rs = db.engine.execute(query)
+            params['column_name'] = column_name
+
+        conds = tuple(sorted(params.keys()))
+        q = db.statement(('DatamappingItem.find',) + conds,
+                         lambda: DatamappingItem._build_find(conds))
+
+        rs = db.conn.execute(q, params)
         items = []
         for r in rs:
             items.append(DatamappingItem(r[0],
@@ -145,55 +128,44 @@ ORDER BY
 
         return items
 
-    def update(self):
-        cond = []
-        cond.append("record_id = '%s'" % self.record_id)
-        cond.append("database_name = '%s'" % self.database_name)
-        cond.append("schema_name = '%s'" % self.schema_name)
-        cond.append("table_name = '%s'" % self.table_name)
+    def _key_params(self):
+        return {'b_record_id': self.record_id,
+                'b_database_name': self.database_name,
+                'b_schema_name': self.schema_name,
+                'b_table_name': self.table_name,
+                'b_column_name': self.column_name}
+
+    def _build_key_clause(self):
+        d = datamapping_table
+        cond = sa.and_(d.c.record_id == sa.bindparam('b_record_id'),
+                       d.c.database_name == sa.bindparam('b_database_name'),
+                       d.c.schema_name == sa.bindparam('b_schema_name'),
+                       d.c.table_name == sa.bindparam('b_table_name'))
         if self.column_name:
-            cond.append("column_name = '%s'" % self.column_name)
-        else:
-            cond.append("column_name is null")
-
-        query = u"""
-UPDATE datamapping
-SET
-  source_database_name = {0},
-  source_schema_name = {1},
-  source_table_name = {2},
-  source_column_name = {3},
-  created_at = {4},
-  data = '{5}'
-WHERE
-  ({6})
-""".format(db.fmt_nullable(self.source_database_name),
-           db.fmt_nullable(self.source_schema_name),
-           db.fmt_nullable(self.source_table_name),
-           db.fmt_nullable(self.source_column_name),
-           db.fmt_datetime(datetime.now().isoformat()),
-           db.quote_string(json.dumps(self.data)),
-           ' AND '.join(cond))
-
-        db.engine.execute(query)
+            return sa.and_(cond,
+                           d.c.column_name == sa.bindparam('b_column_name'))
+        return sa.and_(cond, d.c.column_name.is_(None))
+
+    def update(self):
+        q = db.statement(('DatamappingItem.update', bool(self.column_name)),
+                         lambda: datamapping_table.update().where(
+                             self._build_key_clause()))
+        params = self._key_params()
+        params.update({'source_database_name': self.source_database_name,
+                       'source_schema_name': self.source_schema_name,
+                       'source_table_name': self.source_table_name,
+                       'source_column_name': self.source_column_name,
+                       'created_at': datetime.now().isoformat(),
+                       'data': json.dumps(self.data)})
+        db.conn.execute(q, params)
 
         return True
 
     def destroy(self):
-        cond = []
-        cond.append("record_id = '%s'" % self.record_id)
-        cond.append("database_name = '%s'" % self.database_name)
-        cond.append("schema_name = '%s'" % self.schema_name)
-        cond.append("table_name = '%s'" % self.table_name)
-        if self.column_name:
-            cond.append("column_name = '%s'" % self.column_name)
-        else:
-            cond.append("column_name is null")
-
-        query = (u"DELETE FROM datamapping "
-                 "WHERE ({0})".format(' AND '.join(cond)))
-
-        db.engine.execute(query)
+        q = db.statement(('DatamappingItem.destroy', bool(self.column_name)),
+                         lambda: datamapping_table.delete().where(
+                             self._build_key_clause()))
+        db.conn.execute(q, self._key_params())
 
         return True
 
@@ -1,4 +1,7 @@
+from collections import OrderedDict
+from contextlib import contextmanager
 import os
+import threading
 import unittest
 
 import sqlalchemy as sa
@@ -7,6 +10,33 @@ conn = None
 creds = None
 engine = None
 
+# PRAGMAs set on every connection to a SQLite repository.
+sqlite_pragmas = [('cache_size', -65536)]
+
+# Put a SQLite repository in the WAL mode, which lets the readers run
+# while a write is in progress. The repository file stays in the WAL
+# mode with the -wal and -shm files beside it, so it is enabled only
+# when requested.
+sqlite_wal = False
+sqlite_wal_pragmas = [('journal_mode', 'WAL'),
+                      ('synchronous', 'NORMAL')]
+
+# Compiled forms of the statements, shared by the engines.
+compiled_cache = sa.util.LRUCache(1000)
+
+# Statements built once for each shape of the queries, so that
+# their compiled forms are found in the compiled cache.
+statements = {}
+
+# Max number of the values bound in an IN clause at once.
+in_clause_size = 500
+
+# Number of the connections kept in the pool of the engine, and
+# max number of the connections opened beyond it, when the threads
+# get their own connections.
+pool_size = 5
+max_overflow = 10
+
 
 def parse_connection_string(connstr):
     creds = {}
@@ -66,7 +96,17 @@ def parse_connection_string(connstr):
     return creds
 
 
-def connect():
+def connect(threadlocal=False):
+    """Create an engine and connect to the repository
+
+    Args:
+        threadlocal (bool): give each thread its own connection checked
+                            out from the pool of the engine, instead of
+                            a single connection.
+
+    Returns:
+        Connection: a connection, or a ThreadLocalConnection.
+    """
     global creds
     global conn
     global engine
@@ -85,11 +125,137 @@ def connect():
         connstr = 'postgresql://{3}:{4}@{0}:{1}/{2}'.format(host, port, dbname,
                                                             user, password)
 
-    engine = sa.create_engine(connstr)
-    conn = engine.connect()
+    kwargs = {}
+    if threadlocal:
+        kwargs['pool_size'] = pool_size
+        kwargs['max_overflow'] = max_overflow
+        if use_sqlite:
+            # The connections are handed over between the threads
+            # through the pool.
+            kwargs['poolclass'] = sa.pool.QueuePool
+            kwargs['connect_args'] = {'check_same_thread': False}
+
+    engine = sa.create_engine(
+        connstr, execution_options={'compiled_cache': compiled_cache},
+        **kwargs)
+    if use_sqlite:
+        sa.event.listen(engine, 'connect', _set_sqlite_pragmas)
+    if threadlocal:
+        engine.connect().close()
+        conn = ThreadLocalConnection(engine)
+    else:
+        conn = engine.connect()
     return conn
 
 
+class ThreadLocalConnection(object):
+    """A connection checked out from the pool for each thread
+
+    It can be used as db.conn in any thread. A thread gets its own
+    connection on the first use, and returns it to the pool with
+    release().
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.local = threading.local()
+
+    def get(self):
+        c = getattr(self.local, 'conn', None)
+        if c is None or c.closed:
+            c = self.engine.connect()
+            self.local.conn = c
+        return c
+
+    def release(self):
+        c = getattr(self.local, 'conn', None)
+        if c is not None:
+            c.close()
+            self.local.conn = None
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+def _set_sqlite_pragmas(dbapi_conn, connection_record):
+    cur = dbapi_conn.cursor()
+    pragmas = sqlite_pragmas
+    if sqlite_wal:
+        pragmas = sqlite_wal_pragmas + pragmas
+    for name, value in pragmas:
+        cur.execute('PRAGMA %s = %s' % (name, value))
+    cur.close()
+
+
+def statement(key, build):
+    """Get a statement built once for the shape of the query
+
+    Args:
+        key (tuple): a key identifying the shape of the query.
+        build (function): a function to build the statement.
+
+    Returns:
+        Executable: a statement with the bind parameters.
+    """
+    stmt = statements.get(key)
+    if stmt is None:
+        stmt = build()
+        statements[key] = stmt
+    return stmt
+
+
+def chunks(values, size=None):
+    """Split the values to be bound in the IN clauses of the queries"""
+    values = list(values)
+    size = size or in_clause_size
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def on_commit(key, func):
+    """Call the function once at the end of the session
+
+    The function is called just before the outermost session commits,
+    only once for the key however many times it is registered, or
+    called at once when no session is open.
+
+    Args:
+        key (str): a key identifying the function.
+        func (function): a function to run in the transaction.
+    """
+    if not conn.in_transaction():
+        func()
+        return
+    conn.info.setdefault('on_commit', OrderedDict())[key] = func
+
+
+@contextmanager
+def session():
+    """Group the writes to the repository into a single transaction
+
+    Sessions can be nested, and the writes are committed when
+    the outermost one ends, or rolled back on an exception.
+
+    Example:
+        with db.session():
+            for t in tables:
+                Table2.create(...)
+    """
+    outermost = not conn.in_transaction()
+    trans = conn.begin()
+    try:
+        yield conn
+        if outermost:
+            for func in conn.info.pop('on_commit', {}).values():
+                func()
+        trans.commit()
+    except Exception:
+        if outermost:
+            conn.info.pop('on_commit', None)
+        trans.rollback()
+        raise
+
+
 def version():
     global conn
     rs = conn.execute("SELECT version()")
@@ -128,6 +294,119 @@ class TestDb(unittest.TestCase):
     def setUp(self):
         self.default_user = os.environ['USER']
 
+    def test_session_001(self):
+        global creds
+        creds = {'use_sqlite': True, 'dbname': 'test_session.db'}
+        connect()
+        conn.execute('CREATE TABLE t (a integer)')
+
+        self.assertEquals('delete',
+                          conn.execute('PRAGMA journal_mode').fetchone()[0])
+
+        with session():
+            conn.execute('INSERT INTO t VALUES (1)')
+            with session():
+                conn.execute('INSERT INTO t VALUES (2)')
+
+        with self.assertRaises(ValueError) as cm:
+            with session():
+                conn.execute('INSERT INTO t VALUES (3)')
+                with session():
+                    conn.execute('INSERT INTO t VALUES (4)')
+                raise ValueError('abort')
+
+        self.assertEquals([(1,), (2,)],
+                          [tuple(x) for x in conn.execute('SELECT * FROM t')])
+        conn.close()
+        engine.dispose()
+        os.unlink('test_session.db')
+
+    def test_sqlite_wal_001(self):
+        global creds
+        global sqlite_wal
+        creds = {'use_sqlite': True, 'dbname': 'test_sqlite_wal.db'}
+        sqlite_wal = True
+        try:
+            connect()
+            self.assertEquals(
+                'wal', conn.execute('PRAGMA journal_mode').fetchone()[0])
+            self.assertEquals(
+                1, conn.execute('PRAGMA synchronous').fetchone()[0])
+            conn.close()
+            engine.dispose()
+        finally:
+            sqlite_wal = False
+        os.unlink('test_sqlite_wal.db')
+
+    def test_on_commit_001(self):
+        global creds
+        creds = {'use_sqlite': True, 'dbname': 'test_on_commit.db'}
+        connect()
+        called = []
+
+        # called at once without a session.
+        on_commit('a', lambda: called.append('a'))
+        self.assertEquals(['a'], called)
+
+        with session():
+            on_commit('b', lambda: called.append('b'))
+            with session():
+                on_commit('b', lambda: called.append('b'))
+                on_commit('c', lambda: called.append('c'))
+            self.assertEquals(['a'], called)
+        self.assertEquals(['a', 'b', 'c'], called)
+
+        # not called on a rollback.
+        with self.assertRaises(ValueError):
+            with session():
+                on_commit('d', lambda: called.append('d'))
+                raise ValueError('abort')
+        with session():
+            pass
+        self.assertEquals(['a', 'b', 'c'], called)
+        conn.close()
+        engine.dispose()
+        os.unlink('test_on_commit.db')
+
+    def test_connect_threadlocal_001(self):
+        global creds
+        creds = {'use_sqlite': True, 'dbname': 'test_threadlocal.db'}
+        connect(threadlocal=True)
+        conn.execute('CREATE TABLE t (a integer)')
+
+        # each thread has its own connection.
+        conns = []
+
+        def run(i):
+            conn.execute('INSERT INTO t VALUES (%d)' % i)
+            conns.append(conn.get())
+            conn.release()
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEquals(3, len(set([id(c) for c in conns])))
+        self.assertTrue(all([c.closed for c in conns]))
+        self.assertEquals([(0,), (1,), (2,)],
+                          [tuple(x) for x in
+                           conn.execute('SELECT * FROM t ORDER BY a')])
+        self.assertFalse(conn.get().closed)
+        conn.release()
+        engine.dispose()
+        os.unlink('test_threadlocal.db')
+
+    def test_statement_001(self):
+        s = statement(('test',), lambda: sa.select([sa.bindparam('a')]))
+        self.assertIs(s, statement(('test',), lambda: None))
+
+    def test_chunks_001(self):
+        self.assertEquals([[1, 2], [3, 4], [5]],
+                          list(chunks([1, 2, 3, 4, 5], 2)))
+        self.assertEquals([], list(chunks([], 2)))
+
     def test_parse_connection_string_001(self):
         self.assertEquals({'use_sqlite': True,
                            'dbname': 'foo.db'},
@@ -71,12 +71,15 @@ class MSSQLDriver(DbDriverBase.DbDriverBase):
             raise e
         log.info("cancel_callback end")
 
-    def query_to_resultset(self, query, max_rows=10000, timeout=None):
+    def query_to_resultset(self, query, max_rows=10000, timeout=None,
+                           params=None, query_class=None):
         """Build a QueryResult object from the query
 
         Args:
             query (str): a query string to be executed.
             max_rows (int): max rows which can be kept in a QueryResult object.
+            params (dict): values of the bind variables in the query.
+            query_class (str): class of the query to tune the fetch sizes.
 
         Returns:
             QueryResult: an object holding query, column names and result set.
@@ -105,8 +108,11 @@ class MSSQLDriver(DbDriverBase.DbDriverBase):
                 monitor = threading.Timer(timeout, self.cancel_callback)
                 monitor.start()
 
-            cur = self.conn.cursor()
-            cur.execute(res.query)
+            cur = self.cursor(query_class)
+            if params:
+                cur.execute(self.prepare(res.query), params)
+            else:
+                cur.execute(self.prepare(res.query))
 
             desc = []
             if cur.description:
@@ -38,22 +38,23 @@ class MyProfiler(DbProfilerBase.DbProfilerBase):
         q = u'''
 SELECT table_name
   FROM information_schema.tables
- WHERE table_schema = '%s'
+ WHERE table_schema = %(schema_name)s
  ORDER BY table_name
-''' % schema_name
+'''
 
-        return self._query_table_names(q)
+        return self._query_table_names(q, {'schema_name': schema_name})
 
     def get_column_names(self, schema_name, table_name):
         q = u'''
 SELECT column_name
   FROM information_schema.columns
- WHERE table_schema = '%s'
-   AND table_name = '%s'
+ WHERE table_schema = %(schema_name)s
+   AND table_name = %(table_name)s
  ORDER BY ordinal_position
-''' % (schema_name, table_name)
+'''
 
-        return self._query_column_names(q)
+        return self._query_column_names(q, {'schema_name': schema_name,
+                                            'table_name': table_name})
 
     def get_sample_rows(self, schema_name, table_name, rows_limit=10):
         column_name = self.get_column_names(schema_name, table_name)
@@ -75,12 +76,13 @@ SELECT column_name,
        data_type,
        character_maximum_length
   FROM information_schema.columns
- WHERE table_schema = '%s'
-   AND table_name = '%s'
+ WHERE table_schema = %(schema_name)s
+   AND table_name = %(table_name)s
  ORDER BY ordinal_position
-''' % (schema_name, table_name)
+'''
 
-        return self._query_column_datetypes(q)
+        return self._query_column_datetypes(q, {'schema_name': schema_name,
+                                                'table_name': table_name})
 
     def get_row_count(self, schema_name, table_name, use_statistics=False):
         if use_statistics:
@@ -116,28 +118,31 @@ SELECT column_name,
     def __get_column_profile_phase1(self, schema_name, table_name):
         column_names = self.get_column_names(schema_name, table_name)
         data_types = self.get_column_datatypes(schema_name, table_name)
-        select_list = []
-        # num of rows
-        select_list.append('COUNT(*)')
-
-        for n, c in enumerate(column_names):
-            log.trace("__get_column_profile_phase1: %s" % c)
-            # nulls
-            select_list.append(
-                'COUNT(CASE WHEN "%s" IS NULL THEN 1 ELSE NULL END)' % c)
-            # min,max
-            if MyProfiler.has_minmax(data_types[c]):
-                select_list.append(u'MIN(`%s`)' % c)
-                select_list.append(u'MAX(`%s`)' % c)
-            else:
-                select_list.append('NULL')
-                select_list.append('NULL')
-        q = u'SELECT %s FROM %s.%s' % (','.join(select_list),
-                                       schema_name, table_name)
-        log.trace(q)
-
-        (num_rows, _minmax, _nulls) = self._query_column_profile(column_names,
-                                                                 q)
+        queries = []
+        for group in self._get_column_groups(column_names):
+            select_list = []
+            # num of rows
+            select_list.append('COUNT(*)')
+
+            for c in group:
+                log.trace("__get_column_profile_phase1: %s" % c)
+                # nulls
+                select_list.append(
+                    'COUNT(CASE WHEN "%s" IS NULL THEN 1 ELSE NULL END)' % c)
+                # min,max
+                if MyProfiler.has_minmax(data_types[c]):
+                    select_list.append(u'MIN(`%s`)' % c)
+                    select_list.append(u'MAX(`%s`)' % c)
+                else:
+                    select_list.append('NULL')
+                    select_list.append('NULL')
+            q = u'SELECT %s FROM %s.%s' % (','.join(select_list),
+                                           schema_name, table_name)
+            log.trace(q)
+            queries.append((group, q))
+
+        (num_rows, _minmax, _nulls) = self._query_column_profile_groups(
+            queries)
 
         # cache the results
         self.column_cache[(schema_name, table_name)] = (num_rows, _minmax,
@@ -1,7 +1,9 @@
 #!/usr/bin/env python2.7
 # -*- coding: utf-8 -*-
 
+from collections import OrderedDict
 from copy import deepcopy
+import re
 import threading
 
 from hecatoncheir import DbDriverBase, logger as log
@@ -19,6 +21,32 @@ class OraDriver(DbDriverBase.DbDriverBase):
     conn = None
     driver = None
 
+    # number of statements kept in the OCI statement cache.
+    stmtcachesize = 50
+
+    # statement texts rewritten into the :name bind variables, kept
+    # so that the same text hits the OCI statement cache every time,
+    # and the number of the texts rewritten (misses of this cache).
+    stmt_cache = None
+    stmt_cache_size = 256
+    rewrite_count = 0
+
+    # arraysize and prefetchrows of the cursors for each query class.
+    # The query class is given by the profiler for each query.
+    # The profile queries return a row. The sizes of the sample and
+    # freq queries are set by the profiler with set_fetch_rows() from
+    # its own settings, and the values here are used only as defaults.
+    # prefetchrows one more than the rows fetches the rows and the end
+    # of the fetch in a round trip.
+    fetch_sizes = {'catalog': (100, 100),
+                   'sample': (10, 11),
+                   'profile': (1, 2),
+                   'freq': (10, 11),
+                   'validation': (10000, 10000)}
+
+    # parallel degree forced on the session, or 0 to disable.
+    force_parallel = 0
+
     def __init__(self, host, port, dbname, dbuser, dbpass):
         self.host = host
         self.port = port
@@ -44,6 +72,12 @@ class OraDriver(DbDriverBase.DbDriverBase):
                 dsn_tns = self.dbname
             log.trace("dsn_tns: %s" % dsn_tns)
             self.conn = self.driver.connect(self.dbuser, self.dbpass, dsn_tns)
+            self.conn.stmtcachesize = self.stmtcachesize
+            if self.force_parallel > 1:
+                cur = self.conn.cursor()
+                cur.execute('ALTER SESSION FORCE PARALLEL QUERY PARALLEL %d' %
+                            self.force_parallel)
+                cur.close()
         except Exception as e:
             msg = (u"Could not connect to the server: %s" %
                    unicode(e).split('\n')[0])
@@ -60,12 +94,94 @@ class OraDriver(DbDriverBase.DbDriverBase):
             raise e
         log.trace("cancel_callback end")
 
-    def query_to_resultset(self, query, max_rows=10000, timeout=None):
+    def cursor(self, query_class=None):
+        """Open a cursor with the fetch sizes of the query class
+
+        Args:
+            query_class (str): one of the keys in fetch_sizes.
+                               'catalog' is used if None.
+
+        Returns:
+            Cursor: a cursor object of cx_Oracle.
+        """
+        cur = self.conn.cursor()
+        sizes = self.fetch_sizes.get(query_class or 'catalog')
+        if sizes:
+            cur.arraysize = sizes[0]
+            # prefetchrows is available on cx_Oracle 8 or later.
+            if hasattr(cur, 'prefetchrows'):
+                cur.prefetchrows = sizes[1]
+        return cur
+
+    def set_fetch_rows(self, query_class, rows):
+        """Set the fetch sizes of a query class from its row count
+
+        Args:
+            query_class (str): a key in fetch_sizes.
+            rows (int): the max number of rows the queries return.
+        """
+        if 'fetch_sizes' not in self.__dict__:
+            self.fetch_sizes = dict(OraDriver.fetch_sizes)
+        rows = max(int(rows), 1)
+        self.fetch_sizes[query_class] = (rows, rows + 1)
+
+    def prepare(self, query):
+        """Get the statement text with the Oracle bind variables
+
+        The pyformat bind variables, i.e. %(name)s, are rewritten
+        into :name only once for each query, and the rewritten
+        texts are kept in an LRU cache.
+
+        Args:
+            query (str): a query string with bind variables.
+
+        Returns:
+            str: a statement string to be executed on cx_Oracle.
+        """
+        if self.stmt_cache is None:
+            self.stmt_cache = OrderedDict()
+
+        stmt = self.stmt_cache.pop(query, None)
+        if stmt is None:
+            # %(name)s -> :name
+            stmt = re.sub(r'%\((\w+)\)s', r':\1', query)
+            self.rewrite_count += 1
+            if len(self.stmt_cache) >= self.stmt_cache_size:
+                self.stmt_cache.popitem(last=False)
+        self.stmt_cache[query] = stmt
+        self.execute_count += 1
+        return stmt
+
+    def get_statement_stats(self):
+        """Get the statement counters of the driver
+
+        Only the statement texts handled by the driver are counted on
+        the client. The parses on the server and the hits of the OCI
+        statement cache are not measured, which are found in
+        V$SESSTAT instead.
+
+        Returns:
+            dict: {'execute': <int>, 'rewrite': <int>, 'cached': <int>},
+                  the numbers of the statements executed, the texts
+                  rewritten into :name, and the texts kept in stmt_cache.
+        """
+        return {'execute': self.execute_count,
+                'rewrite': self.rewrite_count,
+                'cached': len(self.stmt_cache) if self.stmt_cache else 0}
+
+    def add_statement_stats(self, dbdriver):
+        DbDriverBase.DbDriverBase.add_statement_stats(self, dbdriver)
+        self.rewrite_count += dbdriver.rewrite_count
+
+    def query_to_resultset(self, query, max_rows=10000, timeout=None,
+                           params=None, query_class=None):
         """Build a QueryResult object from the query
 
         Args:
             query (str): a query string to be executed.
             max_rows (int): max rows which can be kept in a QueryResult object.
+            params (dict): values of the bind variables in the query.
+            query_class (str): class of the query to tune the fetch sizes.
 
         Returns:
             QueryResult: an object holding query, column names and result set.
@@ -84,8 +200,11 @@ class OraDriver(DbDriverBase.DbDriverBase):
                 monitor = threading.Timer(timeout, self.cancel_callback)
                 monitor.start()
 
-            cur = self.conn.cursor()
-            cur.execute(res.query)
+            cur = self.cursor(query_class)
+            if params:
+                cur.execute(self.prepare(res.query), params)
+            else:
+                cur.execute(self.prepare(res.query))
 
             desc = []
             if cur.description:
@@ -14,6 +14,12 @@ class OraProfiler(DbProfilerBase.DbProfilerBase):
     dbconn = None
     column_cache = None
 
+    # use ALTER SESSION FORCE PARALLEL QUERY instead of the hints.
+    force_parallel_query = False
+
+    # max expressions in a select list (ORA-01792).
+    max_select_expressions = 1000
+
     def __init__(self, host, port, dbname, dbuser, dbpass, debug=False):
         DbProfilerBase.DbProfilerBase.__init__(self, host, port, dbname,
                                                dbuser, dbpass, debug)
@@ -21,6 +27,13 @@ class OraProfiler(DbProfilerBase.DbProfilerBase):
         self.dbdriver = OraDriver.OraDriver(host, port, dbname, dbuser, dbpass)
         self.column_cache = {}
 
+    def connect(self):
+        if self.force_parallel_query and self.parallel_degree > 1:
+            self.dbdriver.force_parallel = self.parallel_degree
+        self.dbdriver.set_fetch_rows('freq',
+                                     self.profile_most_freq_values_enabled)
+        return DbProfilerBase.DbProfilerBase.connect(self)
+
     def get_schema_names(self):
         ignores = [u'ANONYMOUS', u'APEX_030200', u'APEX_PUBLIC_USER',
                    u'APPQOSSYS', u'BI', u'CTXSYS', u'DBSNMP', u'DIP',
@@ -39,22 +52,23 @@ class OraProfiler(DbProfilerBase.DbProfilerBase):
         q = u'''
 SELECT TABLE_NAME
   FROM ALL_TABLES
- WHERE OWNER = '%s'
+ WHERE OWNER = %(schema_name)s
  ORDER BY TABLE_NAME
-''' % schema_name
+'''
 
-        return self._query_table_names(q)
+        return self._query_table_names(q, {'schema_name': schema_name})
 
     def get_column_names(self, schema_name, table_name):
         q = u'''
 SELECT COLUMN_NAME
   FROM ALL_TAB_COLUMNS
- WHERE OWNER = '%s'
-   AND TABLE_NAME = '%s'
+ WHERE OWNER = %(schema_name)s
+   AND TABLE_NAME = %(table_name)s
  ORDER BY COLUMN_ID
-''' % (schema_name, table_name)
+'''
+        params = {'schema_name': schema_name, 'table_name': table_name}
 
-        column_names = self._query_column_names(q)
+        column_names = self._query_column_names(q, params)
 
         if len(column_names) > 0:
             return column_names
@@ -67,12 +81,12 @@ SELECT COLUMN_NAME
        ALL_SYNONYMS S
  WHERE TC.OWNER = S.OWNER
    AND TC.TABLE_NAME = S.TABLE_NAME
-   AND S.OWNER = '%s'
-   AND S.SYNONYM_NAME = '%s'
+   AND S.OWNER = %(schema_name)s
+   AND S.SYNONYM_NAME = %(table_name)s
  ORDER BY COLUMN_ID
-''' % (schema_name, table_name)
+'''
 
-        return self._query_column_names(q)
+        return self._query_column_names(q, params)
 
     def get_sample_rows(self, schema_name, table_name, rows_limit=10):
         column_name = self.get_column_names(schema_name, table_name)
@@ -81,6 +95,7 @@ SELECT COLUMN_NAME
         q = (u'SELECT {0} FROM "{1}"."{2}" WHERE '
              'ROWNUM <= {3}'.format(select_list, schema_name, table_name,
                                     rows_limit))
+        self.dbdriver.set_fetch_rows('sample', rows_limit)
         return self._query_sample_rows(q)
 
     def get_column_datatypes(self, schema_name, table_name):
@@ -89,12 +104,13 @@ SELECT COLUMN_NAME,
        DATA_TYPE,
        DATA_LENGTH
   FROM ALL_TAB_COLUMNS
- WHERE OWNER = '%s'
-   AND TABLE_NAME = '%s'
+ WHERE OWNER = %(schema_name)s
+   AND TABLE_NAME = %(table_name)s
  ORDER BY COLUMN_ID
-''' % (schema_name, table_name)
+'''
+        params = {'schema_name': schema_name, 'table_name': table_name}
 
-        data_types = self._query_column_datetypes(q)
+        data_types = self._query_column_datetypes(q, params)
 
         if len(data_types) > 0:
             return data_types
@@ -107,15 +123,18 @@ SELECT COLUMN_NAME,
        ALL_SYNONYMS S
  WHERE TC.OWNER = S.OWNER
    AND TC.TABLE_NAME = S.TABLE_NAME
-   AND S.OWNER = '%s'
-   AND S.SYNONYM_NAME = '%s'
+   AND S.OWNER = %(schema_name)s
+   AND S.SYNONYM_NAME = %(table_name)s
  ORDER BY COLUMN_ID
-''' % (schema_name, table_name)
+'''
 
-        return self._query_column_datetypes(q)
+        return self._query_column_datetypes(q, params)
 
     @property
     def parallel_hint(self):
+        if self.force_parallel_query:
+            # the session is running in parallel.
+            return ''
         if self.parallel_degree > 1:
             return '/*+ PARALLEL(%d) */' % self.parallel_degree
         return ''
@@ -136,12 +155,13 @@ SELECT
 FROM
   ALL_TABLES
 WHERE
-  OWNER = '{0}'
+  OWNER = %(schema_name)s
 AND
-  TABLE_NAME = '{1}'
-""".format(schema_name, table_name)
+  TABLE_NAME = %(table_name)s
+"""
+        params = {'schema_name': schema_name, 'table_name': table_name}
 
-        for r in self.dbdriver.q2rs(query).resultset:
+        for r in self.dbdriver.q2rs(query, params=params).resultset:
             return long(r[0]) if r[0] is not None else None
 
     def get_column_nulls(self, schema_name, table_name, use_statistics=False):
@@ -163,13 +183,14 @@ SELECT
 FROM
   ALL_TAB_COL_STATISTICS
 WHERE
-  OWNER = '{0}'
+  OWNER = %(schema_name)s
 AND
-  TABLE_NAME = '{1}'
-""".format(schema_name, table_name)
+  TABLE_NAME = %(table_name)s
+"""
+        params = {'schema_name': schema_name, 'table_name': table_name}
 
         nulls = {}
-        for r in self.dbdriver.q2rs(query).resultset:
+        for r in self.dbdriver.q2rs(query, params=params).resultset:
             nulls[r[0]] = long(r[3]) if r[3] is not None else None
         return nulls
 
@@ -192,29 +213,32 @@ AND
             return None
         data_types = self.get_column_datatypes(schema_name, table_name)
 
-        select_list = []
-        # num of rows
-        select_list.append('COUNT(*)')
-
-        for n, c in enumerate(column_names):
-            log.trace("__get_column_profile_phase1: %s" % c)
-            # nulls
-            tmp = 'COUNT(CASE WHEN "%s" IS NULL THEN 1 ELSE NULL END)' % c
-            select_list.append(tmp)
-            # min,max
-            if OraProfiler.has_minmax(data_types[c]):
-                select_list.append(u'MIN("%s")' % c)
-                select_list.append(u'MAX("%s")' % c)
-            else:
-                select_list.append('NULL')
-                select_list.append('NULL')
-        q = u'SELECT %s %s FROM "%s"."%s"' % (self.parallel_hint,
-                                              ','.join(select_list),
-                                              schema_name, table_name)
-        log.trace(q)
-
-        (num_rows, _minmax, _nulls) = self._query_column_profile(column_names,
-                                                                 q)
+        queries = []
+        for group in self._get_column_groups(column_names):
+            select_list = []
+            # num of rows
+            select_list.append('COUNT(*)')
+
+            for c in group:
+                log.trace("__get_column_profile_phase1: %s" % c)
+                # nulls
+                tmp = 'COUNT(CASE WHEN "%s" IS NULL THEN 1 ELSE NULL END)' % c
+                select_list.append(tmp)
+                # min,max
+                if OraProfiler.has_minmax(data_types[c]):
+                    select_list.append(u'MIN("%s")' % c)
+                    select_list.append(u'MAX("%s")' % c)
+                else:
+                    select_list.append('NULL')
+                    select_list.append('NULL')
+            q = u'SELECT %s %s FROM "%s"."%s"' % (self.parallel_hint,
+                                                  ','.join(select_list),
+                                                  schema_name, table_name)
+            log.trace(q)
+            queries.append((group, q))
+
+        (num_rows, _minmax, _nulls) = self._query_column_profile_groups(
+            queries)
 
         # cache the results
         self.column_cache[(schema_name, table_name)] = (num_rows, _minmax,
@@ -280,12 +304,13 @@ SELECT
 FROM
   ALL_TAB_COL_STATISTICS
 WHERE
-  OWNER = '{0}'
+  OWNER = %(schema_name)s
 AND
-  TABLE_NAME = '{1}'
-""".format(schema_name, table_name)
+  TABLE_NAME = %(table_name)s
+"""
+            params = {'schema_name': schema_name, 'table_name': table_name}
 
-            for r in self.dbdriver.q2rs(query).resultset:
+            for r in self.dbdriver.q2rs(query, params=params).resultset:
                 column_cardinalities[r[0]] = long(r[1]) if r[1] is not None else None
         else:
             # Scan a whole table to collect column cardinalities.
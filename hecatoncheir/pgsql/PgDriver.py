@@ -39,12 +39,15 @@ class PgDriver(DbDriverBase.DbDriverBase):
 
         return True
 
-    def query_to_resultset(self, query, max_rows=10000, timeout=None):
+    def query_to_resultset(self, query, max_rows=10000, timeout=None,
+                           params=None, query_class=None):
         """Build a QueryResult object from the query
 
         Args:
             query (str): a query string to be executed.
             max_rows (int): max rows which can be kept in a QueryResult object.
+            params (dict): values of the bind variables in the query.
+            query_class (str): class of the query to tune the fetch sizes.
 
         Returns:
             QueryResult: an object holding query, column names and result set.
@@ -58,11 +61,14 @@ class PgDriver(DbDriverBase.DbDriverBase):
             if self.conn is None:
                 self.connect()
 
-            cur = self.conn.cursor()
+            cur = self.cursor(query_class)
             if timeout and int(timeout) > 0:
                 cur.execute('set statement_timeout to %d' % (timeout*1000))
 
-            cur.execute(res.query)
+            if params:
+                cur.execute(self.prepare(res.query), params)
+            else:
+                cur.execute(self.prepare(res.query))
 
             desc = []
             for d in cur.description:
@@ -16,6 +16,9 @@ class PgProfiler(DbProfilerBase.DbProfilerBase):
     dbconn = None
     column_cache = None
 
+    # max entries in a target list.
+    max_select_expressions = 1664
+
     def __init__(self, host, port, dbname, dbuser, dbpass, debug=False):
         DbProfilerBase.DbProfilerBase.__init__(self, host, port, dbname,
                                                dbuser, dbpass, debug)
@@ -38,22 +41,23 @@ class PgProfiler(DbProfilerBase.DbProfilerBase):
         q = u'''
 SELECT table_name
   FROM information_schema.tables
- WHERE table_schema = '%s'
+ WHERE table_schema = %(schema_name)s
  ORDER BY table_name
-''' % schema_name
+'''
 
-        return self._query_table_names(q)
+        return self._query_table_names(q, {'schema_name': schema_name})
 
     def get_column_names(self, schema_name, table_name):
         q = u'''
 SELECT column_name
   FROM information_schema.columns
- WHERE table_schema = '%s'
-   AND table_name = '%s'
+ WHERE table_schema = %(schema_name)s
+   AND table_name = %(table_name)s
  ORDER BY ordinal_position
-''' % (schema_name, table_name)
+'''
 
-        return self._query_column_names(q)
+        return self._query_column_names(q, {'schema_name': schema_name,
+                                            'table_name': table_name})
 
     def get_sample_rows(self, schema_name, table_name, rows_limit=10):
         column_name = self.get_column_names(schema_name, table_name)
@@ -69,12 +73,13 @@ SELECT column_name,
        data_type,
        character_maximum_length
   FROM information_schema.columns
- WHERE table_schema = '%s'
-   AND table_name = '%s'
+ WHERE table_schema = %(schema_name)s
+   AND table_name = %(table_name)s
  ORDER BY ordinal_position
-''' % (schema_name, table_name)
+'''
 
-        return self._query_column_datetypes(q)
+        return self._query_column_datetypes(q, {'schema_name': schema_name,
+                                                'table_name': table_name})
 
     def get_row_count(self, schema_name, table_name, use_statistics=False):
         if use_statistics:
@@ -91,11 +96,12 @@ SELECT c.reltuples
        pg_class c
  WHERE t.relid = c.oid
    AND c.relkind = 'r'
-   AND t.schemaname = '{0}'
-   AND t.relname = '{1}'
-""".format(schema_name, table_name)
+   AND t.schemaname = %(schema_name)s
+   AND t.relname = %(table_name)s
+"""
+        params = {'schema_name': schema_name, 'table_name': table_name}
 
-        for r in self.dbdriver.q2rs(query).resultset:
+        for r in self.dbdriver.q2rs(query, params=params).resultset:
             return long(r[0]) if r[0] is not None else None
 
     def get_column_nulls(self, schema_name, table_name, use_statistics=False):
@@ -115,15 +121,16 @@ SELECT s.attname,
   FROM pg_stats s,
        pg_stat_all_tables t,
        pg_class c
- WHERE s.schemaname = '{0}'
-   AND s.tablename = '{1}'
+ WHERE s.schemaname = %(schema_name)s
+   AND s.tablename = %(table_name)s
    AND s.schemaname = t.schemaname
    AND s.tablename = t.relname
    AND t.relid = c.oid
-""".format(schema_name, table_name)
+"""
+        params = {'schema_name': schema_name, 'table_name': table_name}
 
         nulls = {}
-        for r in self.dbdriver.q2rs(query).resultset:
+        for r in self.dbdriver.q2rs(query, params=params).resultset:
             nulls[r[0]] = long(r[1]) if r[1] is not None else None
         return nulls
 
@@ -143,29 +150,33 @@ SELECT s.attname,
 
     def __get_column_profile_phase1(self, schema_name, table_name):
         column_names = self.get_column_names(schema_name, table_name)
-        select_list = []
-        # num of rows
-        select_list.append('COUNT(*)')
-
-        for n, c in enumerate(column_names):
-            log.trace("__get_column_profile_phase1: %s" % c)
-            # nulls
-            select_list.append(
-                'COUNT(CASE WHEN "%s" IS NULL THEN 1 ELSE NULL END)' % c)
-            # min,max
-            if PgProfiler.has_minmax(self.get_column_datatypes(schema_name,
-                                                               table_name)[c]):
-                select_list.append(u'MIN("%s")' % c)
-                select_list.append(u'MAX("%s")' % c)
-            else:
-                select_list.append('NULL')
-                select_list.append('NULL')
-        q = u'SELECT %s FROM "%s"."%s"' % (','.join(select_list),
-                                           schema_name, table_name)
-        log.trace(q)
-
-        (num_rows, _minmax, _nulls) = self._query_column_profile(column_names,
-                                                                 q)
+        data_types = self.get_column_datatypes(schema_name, table_name)
+
+        queries = []
+        for group in self._get_column_groups(column_names):
+            select_list = []
+            # num of rows
+            select_list.append('COUNT(*)')
+
+            for c in group:
+                log.trace("__get_column_profile_phase1: %s" % c)
+                # nulls
+                select_list.append(
+                    'COUNT(CASE WHEN "%s" IS NULL THEN 1 ELSE NULL END)' % c)
+                # min,max
+                if PgProfiler.has_minmax(data_types[c]):
+                    select_list.append(u'MIN("%s")' % c)
+                    select_list.append(u'MAX("%s")' % c)
+                else:
+                    select_list.append('NULL')
+                    select_list.append('NULL')
+            q = u'SELECT %s FROM "%s"."%s"' % (','.join(select_list),
+                                               schema_name, table_name)
+            log.trace(q)
+            queries.append((group, q))
+
+        (num_rows, _minmax, _nulls) = self._query_column_profile_groups(
+            queries)
 
         # cache the results
         self.column_cache[(schema_name, table_name)] = (num_rows,
@@ -1,12 +1,438 @@
 #!/usr/bin/env python2.7
 # -*- coding: utf-8 -*-
 
+import base64
+import copy
+from datetime import datetime, timedelta
+import json
 import os
 import unittest
+import zlib
 
+import dateutil.parser
 import sqlalchemy as sa
 
 import db
+from utils import DbProfilerJSONEncoder
+
+# A version marker of the table data stored in the compact encoding,
+# which is zlib-compressed minified JSON in base64. The data without
+# any marker is a pretty-printed JSON text.
+DATA_FORMAT_ZLIB = 'z1:'
+
+# A version marker of the table data stored as a delta, which restores
+# the table data from the one of the successor snapshot.
+DATA_FORMAT_DELTA = 'd1:'
+
+# Set False to store the table data as a pretty-printed JSON text.
+compress_data = True
+
+# Table objects of the repository, used to build the statements
+# with the bind parameters. See Repository.create() for the DDLs.
+metadata = sa.MetaData()
+
+repo_table = sa.Table(
+    'repo', metadata,
+    sa.Column('database_name', sa.Text, nullable=False),
+    sa.Column('schema_name', sa.Text, nullable=False),
+    sa.Column('table_name', sa.Text, nullable=False),
+    sa.Column('created_at', sa.Text, nullable=False),
+    sa.Column('data', sa.Text, nullable=False),
+    sa.Column('timestamp', sa.Text))
+
+repo_latest_table = sa.Table(
+    'repo_latest', metadata,
+    sa.Column('database_name', sa.Text, primary_key=True),
+    sa.Column('schema_name', sa.Text, primary_key=True),
+    sa.Column('table_name', sa.Text, primary_key=True),
+    sa.Column('created_at', sa.Text, nullable=False))
+
+repo_changes_table = sa.Table(
+    'repo_changes', metadata,
+    sa.Column('change_count', sa.BigInteger, nullable=False))
+
+repo_columns_table = sa.Table(
+    'repo_columns', metadata,
+    sa.Column('database_name', sa.Text, nullable=False),
+    sa.Column('schema_name', sa.Text, nullable=False),
+    sa.Column('table_name', sa.Text, nullable=False),
+    sa.Column('column_name', sa.Text, nullable=False),
+    sa.Column('created_at', sa.Text, nullable=False),
+    sa.Column('timestamp', sa.Text),
+    sa.Column('data_type', sa.Text),
+    sa.Column('row_count', sa.BigInteger),
+    sa.Column('nulls', sa.BigInteger),
+    sa.Column('min', sa.Text),
+    sa.Column('max', sa.Text),
+    sa.Column('cardinality', sa.BigInteger),
+    sa.Column('validation_count', sa.Integer),
+    sa.Column('invalid_count', sa.BigInteger))
+
+datamapping_table = sa.Table(
+    'datamapping', metadata,
+    sa.Column('lineno', sa.Integer, nullable=False),
+    sa.Column('database_name', sa.Text, nullable=False),
+    sa.Column('schema_name', sa.Text, nullable=False),
+    sa.Column('table_name', sa.Text, nullable=False),
+    sa.Column('column_name', sa.Text),
+    sa.Column('record_id', sa.Text),
+    sa.Column('source_database_name', sa.Text),
+    sa.Column('source_schema_name', sa.Text),
+    sa.Column('source_table_name', sa.Text),
+    sa.Column('source_column_name', sa.Text),
+    sa.Column('created_at', sa.Text, nullable=False),
+    sa.Column('data', sa.Text, nullable=False))
+
+tags_table = sa.Table(
+    'tags', metadata,
+    sa.Column('tag_id', sa.Text, nullable=False),
+    sa.Column('tag_label', sa.Text, nullable=False),
+    sa.Column('database_name', sa.Text),
+    sa.Column('schema_name', sa.Text),
+    sa.Column('table_name', sa.Text))
+
+business_glossary_table = sa.Table(
+    'business_glossary', metadata,
+    sa.Column('id', sa.Text, nullable=False),
+    sa.Column('term', sa.Text, nullable=False),
+    sa.Column('description_short', sa.Text, nullable=False),
+    sa.Column('description_long', sa.Text, nullable=False),
+    sa.Column('created_at', sa.Text, nullable=False),
+    sa.Column('updated_at', sa.Text, nullable=False),
+    sa.Column('owned_by', sa.Text, nullable=False),
+    sa.Column('categories', sa.Text),
+    sa.Column('synonyms', sa.Text),
+    sa.Column('related_terms', sa.Text),
+    sa.Column('assigned_assets', sa.Text))
+
+validation_rule_table = sa.Table(
+    'validation_rule', metadata,
+    sa.Column('id', sa.Integer, primary_key=True, autoincrement=False),
+    sa.Column('database_name', sa.Text, nullable=False),
+    sa.Column('schema_name', sa.Text, nullable=False),
+    sa.Column('table_name', sa.Text, nullable=False),
+    sa.Column('column_name', sa.Text, nullable=False),
+    sa.Column('description', sa.Text, nullable=False),
+    sa.Column('rule', sa.Text, nullable=False),
+    sa.Column('param', sa.Text),
+    sa.Column('param2', sa.Text))
+
+tags2_table = sa.Table(
+    'tags2', metadata,
+    sa.Column('label', sa.Text, primary_key=True),
+    sa.Column('description', sa.Text, nullable=False),
+    sa.Column('comment', sa.Text, nullable=False))
+
+schemas2_table = sa.Table(
+    'schemas2', metadata,
+    sa.Column('database_name', sa.Text, primary_key=True),
+    sa.Column('schema_name', sa.Text, primary_key=True),
+    sa.Column('description', sa.Text, nullable=False),
+    sa.Column('comment', sa.Text, nullable=False))
+
+attachments_table = sa.Table(
+    'attachments', metadata,
+    sa.Column('objid', sa.Text, primary_key=True),
+    sa.Column('objtype', sa.Text, nullable=False),
+    sa.Column('filename', sa.Text, primary_key=True))
+
+search_docs_table = sa.Table(
+    'search_docs', metadata,
+    sa.Column('docid', sa.Integer, primary_key=True),
+    sa.Column('objtype', sa.Text, nullable=False),
+    sa.Column('objid', sa.Text, nullable=False),
+    sa.Column('database_name', sa.Text),
+    sa.Column('schema_name', sa.Text),
+    sa.Column('table_name', sa.Text),
+    sa.Column('name', sa.Text),
+    sa.Column('name_nls', sa.Text),
+    sa.Column('comment', sa.Text),
+    sa.Column('tags', sa.Text))
+
+
+def table_key_clause(table, prefix='b_'):
+    """Build a clause matching the database, schema and table names
+
+    The names are bound to the parameters prefixed, such as b_database_name,
+    so that the clause can be used in UPDATE statements as well.
+    """
+    return sa.and_(
+        table.c.database_name == sa.bindparam(prefix + 'database_name'),
+        table.c.schema_name == sa.bindparam(prefix + 'schema_name'),
+        table.c.table_name == sa.bindparam(prefix + 'table_name'))
+
+
+def table_key_params(database_name, schema_name, table_name, prefix='b_'):
+    return {prefix + 'database_name': database_name,
+            prefix + 'schema_name': schema_name,
+            prefix + 'table_name': table_name}
+
+
+def encode_data(data, compress=None):
+    """Encode the table data to be stored in the repo table
+
+    Args:
+        data (dict): a table data.
+        compress (bool): compress the data or not. Defaults to
+                         the compress_data setting.
+
+    Returns:
+        str: an encoded string.
+    """
+    if compress is None:
+        compress = compress_data
+    if not compress:
+        return json.dumps(data, cls=DbProfilerJSONEncoder, sort_keys=True,
+                          indent=2)
+    s = json.dumps(data, cls=DbProfilerJSONEncoder, sort_keys=True,
+                   separators=(',', ':'))
+    return DATA_FORMAT_ZLIB + base64.b64encode(zlib.compress(s))
+
+
+def _diff(old, new):
+    # Get a patch which restores the old value from the new one.
+    if old == new:
+        return None
+    if isinstance(old, dict) and isinstance(new, dict):
+        changed = {}
+        for k in old:
+            if k not in new:
+                changed[k] = ['V', old[k]]
+                continue
+            p = _diff(old[k], new[k])
+            if p is not None:
+                changed[k] = p
+        return ['D', changed, [k for k in new if k not in old]]
+    if (isinstance(old, list) and isinstance(new, list) and
+            len(old) == len(new)):
+        changed = {}
+        for i in range(len(old)):
+            p = _diff(old[i], new[i])
+            if p is not None:
+                changed[str(i)] = p
+        return ['L', changed]
+    return ['V', old]
+
+
+def _patch(value, patch):
+    # Apply the patch on the value in place.
+    if patch[0] == 'D':
+        for k, p in patch[1].items():
+            value[k] = _patch(value.get(k), p)
+        for k in patch[2]:
+            del value[k]
+        return value
+    if patch[0] == 'L':
+        for i, p in patch[1].items():
+            value[int(i)] = _patch(value[int(i)], p)
+        return value
+    return patch[1]
+
+
+def encode_delta(data, successor):
+    """Encode the table data as a delta against the successor snapshot
+
+    Args:
+        data (dict): a table data.
+        successor (dict): a table data of the successor snapshot.
+
+    Returns:
+        str: an encoded string.
+    """
+    # normalize the values in the same way as they are decoded.
+    data = json.loads(json.dumps(data, cls=DbProfilerJSONEncoder))
+    s = json.dumps(_diff(data, successor), separators=(',', ':'))
+    return DATA_FORMAT_DELTA + base64.b64encode(zlib.compress(s))
+
+
+def is_delta(s):
+    return s.startswith(DATA_FORMAT_DELTA)
+
+
+def decode_data(s, successor=None):
+    """Decode the table data stored in the repo table
+
+    Args:
+        s (str): a string stored in either of the formats.
+        successor (dict): a table data of the successor snapshot,
+                          required to decode a delta.
+
+    Returns:
+        dict: a table data.
+    """
+    if is_delta(s):
+        if successor is None:
+            raise ValueError('The successor snapshot is required '
+                             'to decode a delta.')
+        patch = json.loads(
+            zlib.decompress(base64.b64decode(s[len(DATA_FORMAT_DELTA):])))
+        if patch is None:
+            return copy.deepcopy(successor)
+        return _patch(copy.deepcopy(successor), patch)
+    if s.startswith(DATA_FORMAT_ZLIB):
+        s = zlib.decompress(base64.b64decode(s[len(DATA_FORMAT_ZLIB):]))
+    return json.loads(s)
+
+
+def get_column_stats(data):
+    """Get rows of the column statistics from the table data
+
+    Args:
+        data (dict): a table data stored in the repo table.
+
+    Returns:
+        list: a list of dictionaries, one for each column.
+    """
+    stats = []
+    for c in data.get('columns') or []:
+        data_type = c.get('data_type') or c.get('datatype')
+        # count each validation rule only once, as the formatter does.
+        labels = []
+        invalid_count = 0
+        for v in c.get('validation') or []:
+            if v.get('label') in labels:
+                continue
+            labels.append(v.get('label'))
+            invalid_count += v.get('invalid_count') or 0
+        stats.append({
+            'column_name': c['column_name'],
+            'timestamp': data.get('timestamp'),
+            'data_type': data_type[0] if data_type else None,
+            'row_count': data.get('row_count'),
+            'nulls': c.get('nulls'),
+            'min': (unicode(c['min']) if c.get('min') is not None
+                    else None),
+            'max': (unicode(c['max']) if c.get('max') is not None
+                    else None),
+            'cardinality': c.get('cardinality'),
+            'validation_count': len(labels),
+            'invalid_count': invalid_count})
+    return stats
+
+
+def insert_column_stats(database_name, schema_name, table_name, created_at,
+                        data):
+    """Store the column statistics of the snapshot in repo_columns"""
+    rows = get_column_stats(data)
+    if not rows:
+        return
+    for r in rows:
+        r['database_name'] = database_name
+        r['schema_name'] = schema_name
+        r['table_name'] = table_name
+        r['created_at'] = created_at
+    db.conn.execute(db.statement(('repo_columns.insert',),
+                                 repo_columns_table.insert), rows)
+
+
+def _update_change_count():
+    c = repo_changes_table
+    db.conn.execute(db.statement(
+        ('repo_changes.update',),
+        lambda: c.update().values(change_count=c.c.change_count + 1)))
+
+
+def bump_change_count():
+    """Count up the changes of the repository
+
+    The writes of the table data, the glossary terms and the validation
+    rules call this in their transactions, so that the readers caching
+    them can find the changes. In a session, the count is updated only
+    once just before the commit, so that the single row is not locked
+    through the whole transaction.
+    """
+    db.on_commit('repo_changes', _update_change_count)
+
+
+def get_change_count():
+    """Get the change count of the repository
+
+    Returns:
+        int: the change count, or None when it is not recorded
+             in the repository.
+    """
+    try:
+        rs = db.conn.execute(db.statement(
+            ('repo_changes.select',),
+            lambda: sa.select([repo_changes_table.c.change_count])))
+        r = rs.fetchone()
+    except sa.exc.DBAPIError:
+        return None
+    return r[0] if r else None
+
+
+def get_table_search_docs(database_name, schema_name, table_name, data):
+    """Get the search documents of the table and its columns
+
+    Args:
+        data (dict): a table data stored in the repo table.
+
+    Returns:
+        list: a list of dictionaries, one for the table and each column.
+    """
+    objid = u'%s.%s.%s' % (database_name, schema_name, table_name)
+    docs = [{'objtype': u'table',
+             'objid': objid,
+             'name': table_name,
+             'name_nls': data.get('table_name_nls'),
+             'comment': data.get('comment'),
+             'tags': u' '.join(data.get('tags') or [])}]
+    for c in data.get('columns') or []:
+        docs.append({'objtype': u'column',
+                     'objid': objid + u'.' + c['column_name'],
+                     'name': c['column_name'],
+                     'name_nls': c.get('column_name_nls'),
+                     'comment': c.get('comment'),
+                     'tags': None})
+    for d in docs:
+        d['database_name'] = database_name
+        d['schema_name'] = schema_name
+        d['table_name'] = table_name
+    return docs
+
+
+def update_table_search_docs(database_name, schema_name, table_name,
+                             data=None):
+    """Replace the search documents of the table and its columns
+
+    The documents are only removed when the table data is not given.
+    """
+    s = search_docs_table
+    db.conn.execute(db.statement(('search_docs.delete', 'table'),
+                                 lambda: s.delete().where(
+                                     table_key_clause(s))),
+                    table_key_params(database_name, schema_name, table_name))
+    if data is None:
+        return
+    db.conn.execute(db.statement(('search_docs.insert',), s.insert),
+                    get_table_search_docs(database_name, schema_name,
+                                          table_name, data))
+
+
+def update_glossary_search_docs(term, description=None, synonyms=None,
+                                delete=False):
+    """Replace the search document of the glossary term
+
+    The document is only removed when delete is True.
+    """
+    s = search_docs_table
+    db.conn.execute(db.statement(('search_docs.delete', 'glossary'),
+                                 lambda: s.delete().where(sa.and_(
+                                     s.c.objtype == u'glossary',
+                                     s.c.objid == sa.bindparam('b_objid')))),
+                    b_objid=term)
+    if delete:
+        return
+    db.conn.execute(db.statement(('search_docs.insert',), s.insert),
+                    [{'objtype': u'glossary',
+                      'objid': term,
+                      'database_name': None,
+                      'schema_name': None,
+                      'table_name': None,
+                      'name': term,
+                      'name_nls': u' '.join(synonyms or []),
+                      'comment': description,
+                      'tags': None}])
 
 
 class Repository():
@@ -20,7 +446,8 @@ create table repo (
   schema_name text not null,
   table_name text not null,
   created_at text not null,
-  data text not null
+  data text not null,
+  timestamp text
 );
 """)
 
@@ -34,6 +461,11 @@ create index database_schema_table_created_idx
   ON repo(database_name, schema_name, table_name, created_at);
 """)
 
+        self.create_repo_timestamp_index()
+        self.create_repo_latest()
+        self.create_repo_changes()
+        self.create_repo_columns()
+
         db.conn.execute("""
 create table datamapping (
   lineno integer not null,
@@ -64,7 +496,10 @@ create index dm_dstc_idx
         db.conn.execute("""
 create table tags (
   tag_id text not null,
-  tag_label text not null
+  tag_label text not null,
+  database_name text,
+  schema_name text,
+  table_name text
 );
 """)
 
@@ -149,8 +584,498 @@ create table attachments (
 );
 """)
 
+        self.create_search_index()
+
+    def create_search_index(self):
+        # the documents of the tables, the columns and the glossary terms,
+        # and the full-text index on them maintained by the triggers.
+        if db.creds.get('use_sqlite'):
+            db.conn.execute("""
+create table search_docs (
+  docid integer primary key,
+  objtype text not null,
+  objid text not null,
+  database_name text,
+  schema_name text,
+  table_name text,
+  name text,
+  name_nls text,
+  comment text,
+  tags text
+);
+""")
+            try:
+                db.conn.execute("""
+create virtual table search_index using fts5(
+  name, name_nls, comment, tags,
+  content='search_docs', content_rowid='docid'
+);
+""")
+            except sa.exc.OperationalError:
+                # FTS5 is not available in this SQLite build.
+                # The documents are searched without the index.
+                pass
+            else:
+                db.conn.execute("""
+create trigger search_docs_ai after insert on search_docs begin
+  insert into search_index(rowid, name, name_nls, comment, tags)
+    values (new.docid, new.name, new.name_nls, new.comment, new.tags);
+end;
+""")
+                db.conn.execute("""
+create trigger search_docs_ad after delete on search_docs begin
+  insert into search_index(search_index, rowid, name, name_nls, comment,
+                           tags)
+    values ('delete', old.docid, old.name, old.name_nls, old.comment,
+            old.tags);
+end;
+""")
+        else:
+            db.conn.execute("""
+create table search_docs (
+  docid serial primary key,
+  objtype text not null,
+  objid text not null,
+  database_name text,
+  schema_name text,
+  table_name text,
+  name text,
+  name_nls text,
+  comment text,
+  tags text,
+  tsv tsvector
+);
+""")
+            db.conn.execute("""
+create or replace function search_docs_tsv() returns trigger as $$
+begin
+  new.tsv :=
+    setweight(to_tsvector('simple', coalesce(new.name, '') || ' ' ||
+                                    coalesce(new.name_nls, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(new.tags, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce(new.comment, '')), 'C');
+  return new;
+end
+$$ language plpgsql;
+""")
+            db.conn.execute("""
+create trigger search_docs_tsv_trg before insert or update on search_docs
+  for each row execute procedure search_docs_tsv();
+""")
+            db.conn.execute("""
+create index search_docs_tsv_idx ON search_docs USING gin(tsv);
+""")
+
+        db.conn.execute("""
+create index search_docs_table_idx
+  ON search_docs(database_name, schema_name, table_name);
+""")
+
+        db.conn.execute("""
+create index search_docs_objid_idx ON search_docs(objtype, objid);
+""")
+
+    def create_repo_timestamp_index(self):
+        # to order and bound the table history by the snapshot timestamps.
+        db.conn.execute("""
+create index repo_timestamp_idx
+  ON repo(database_name, schema_name, table_name, timestamp);
+""")
+
+    def create_repo_latest(self):
+        # pointers to the latest snapshots in the repo table.
+        db.conn.execute("""
+create table repo_latest (
+  database_name text not null,
+  schema_name text not null,
+  table_name text not null,
+  created_at text not null,
+  primary key (database_name, schema_name, table_name)
+);
+""")
+
+    def create_repo_changes(self):
+        # the change count bumped by the writes.
+        db.conn.execute("""
+create table repo_changes (
+  change_count bigint not null
+);
+""")
+
+        db.conn.execute("""
+insert into repo_changes values (0);
+""")
+
+    def create_repo_columns(self):
+        # the column statistics of the snapshots in the repo table.
+        db.conn.execute("""
+create table repo_columns (
+  database_name text not null,
+  schema_name text not null,
+  table_name text not null,
+  column_name text not null,
+  created_at text not null,
+  timestamp text,
+  data_type text,
+  row_count bigint,
+  nulls bigint,
+  min text,
+  max text,
+  cardinality bigint,
+  validation_count integer,
+  invalid_count bigint
+);
+""")
+
+        db.conn.execute("""
+create index repo_columns_idx
+  ON repo_columns(database_name, schema_name, table_name, column_name,
+                  timestamp);
+""")
+
+        db.conn.execute("""
+create index repo_columns_created_idx
+  ON repo_columns(database_name, schema_name, table_name, created_at);
+""")
+
+    def is_upgraded(self):
+        """Check if the repository has the tables and columns added
+        by upgrade()
+
+        Returns:
+            bool: False when the repository needs to be upgraded.
+        """
+        for t in ['repo_latest', 'repo_columns', 'repo_changes',
+                  'search_docs']:
+            if not db.engine.has_table(t):
+                return False
+        columns = [c['name'] for c in
+                   sa.inspect(db.engine).get_columns('repo')]
+        if 'timestamp' not in columns:
+            return False
+        columns = [c['name'] for c in
+                   sa.inspect(db.engine).get_columns('tags')]
+        return 'table_name' in columns
+
+    def upgrade(self):
+        """Add the tables and columns missing in an older repository"""
+        if not db.engine.has_table('repo_latest'):
+            with db.session():
+                self.create_repo_latest()
+                db.conn.execute("""
+INSERT INTO repo_latest
+SELECT database_name,
+       schema_name,
+       table_name,
+       MAX(created_at)
+  FROM repo
+ GROUP BY
+       database_name,
+       schema_name,
+       table_name
+""")
+
+        if not db.engine.has_table('repo_columns'):
+            with db.session():
+                self.create_repo_columns()
+                rs = db.conn.execute("""
+SELECT database_name,
+       schema_name,
+       table_name,
+       created_at,
+       data
+  FROM repo
+ ORDER BY
+       database_name,
+       schema_name,
+       table_name,
+       created_at DESC
+""")
+                prev = (None, None)
+                for r in rs.fetchall():
+                    successor = prev[1] if prev[0] == r[0:3] else None
+                    data = decode_data(r[4], successor)
+                    insert_column_stats(r[0], r[1], r[2], r[3], data)
+                    prev = (r[0:3], data)
+
+        columns = [c['name'] for c in
+                   sa.inspect(db.engine).get_columns('repo')]
+        if 'timestamp' not in columns:
+            with db.session():
+                db.conn.execute('ALTER TABLE repo ADD COLUMN timestamp text')
+                self.create_repo_timestamp_index()
+                rs = db.conn.execute("""
+SELECT database_name,
+       schema_name,
+       table_name,
+       created_at,
+       data
+  FROM repo
+ ORDER BY
+       database_name,
+       schema_name,
+       table_name,
+       created_at DESC
+""")
+                update = sa.text("""
+UPDATE repo
+   SET timestamp = :ts
+ WHERE database_name = :d
+   AND schema_name = :s
+   AND table_name = :t
+   AND created_at = :c
+""")
+                prev = (None, None)
+                for r in rs.fetchall():
+                    successor = prev[1] if prev[0] == r[0:3] else None
+                    data = decode_data(r[4], successor)
+                    db.conn.execute(update, ts=data.get('timestamp'),
+                                    d=r[0], s=r[1], t=r[2], c=r[3])
+                    prev = (r[0:3], data)
+
+        columns = [c['name'] for c in
+                   sa.inspect(db.engine).get_columns('tags')]
+        if 'table_name' not in columns:
+            with db.session():
+                for c in ['database_name', 'schema_name', 'table_name']:
+                    db.conn.execute('ALTER TABLE tags ADD COLUMN %s text' % c)
+                # The tags of the tables no longer in the repository are
+                # left without the names, which are not joined anyway.
+                rs = db.conn.execute("""
+SELECT database_name,
+       schema_name,
+       table_name
+  FROM repo_latest
+""")
+                params = [{'d': r[0], 's': r[1], 't': r[2],
+                           'id': '%s.%s.%s' % tuple(r)}
+                          for r in rs.fetchall()]
+                if params:
+                    db.conn.execute(sa.text("""
+UPDATE tags
+   SET database_name = :d,
+       schema_name = :s,
+       table_name = :t
+ WHERE tag_id = :id
+"""), params)
+
+        if not db.engine.has_table('repo_changes'):
+            with db.session():
+                self.create_repo_changes()
+
+        if not db.engine.has_table('search_docs'):
+            with db.session():
+                self.create_search_index()
+                rs = db.conn.execute("""
+SELECT l.database_name,
+       l.schema_name,
+       l.table_name,
+       r.data
+  FROM repo_latest l, repo r
+ WHERE l.database_name = r.database_name
+   AND l.schema_name = r.schema_name
+   AND l.table_name = r.table_name
+   AND l.created_at = r.created_at
+""")
+                for r in rs.fetchall():
+                    update_table_search_docs(r[0], r[1], r[2],
+                                             decode_data(r[3]))
+                rs = db.conn.execute("""
+SELECT DISTINCT
+       term,
+       description_short,
+       synonyms
+  FROM business_glossary
+""")
+                for r in rs.fetchall():
+                    update_glossary_search_docs(r[0], r[1], json.loads(r[2]))
+        return True
+
+    def convert(self, compress=True):
+        """Convert the table data in the repo table in place
+
+        Args:
+            compress (bool): compress the data, or store the data
+                             as a pretty-printed JSON text.
+
+        Returns:
+            int: the number of the converted snapshots.
+        """
+        # Fetch only the keys first, so that the whole table data
+        # is not loaded on the memory at once.
+        rs = db.conn.execute("""
+SELECT database_name,
+       schema_name,
+       table_name,
+       created_at
+  FROM repo
+""")
+        keys = rs.fetchall()
+
+        count = 0
+        select = sa.text("""
+SELECT data
+  FROM repo
+ WHERE database_name = :d
+   AND schema_name = :s
+   AND table_name = :t
+   AND created_at = :c
+""")
+        update = sa.text("""
+UPDATE repo
+   SET data = :data
+ WHERE database_name = :d
+   AND schema_name = :s
+   AND table_name = :t
+   AND created_at = :c
+""")
+        with db.session():
+            for k in keys:
+                params = {'d': k[0], 's': k[1], 't': k[2], 'c': k[3]}
+                s = db.conn.execute(select, params).fetchone()[0]
+                # deltas are left as they are.
+                if is_delta(s) or s.startswith(DATA_FORMAT_ZLIB) == compress:
+                    continue
+                params['data'] = encode_data(decode_data(s), compress)
+                db.conn.execute(update, params)
+                count += 1
+
+        # Give the freed pages back to the file system.
+        if db.creds.get('use_sqlite') and count > 0:
+            db.conn.execute('VACUUM')
+        return count
+
+    def compact(self, keep_daily=30, keep_weekly=52, delta=False,
+                now=None):
+        """Remove the old snapshots in the repo table by the retention policy
+
+        The latest snapshot of each table is always kept. Of the snapshots
+        within keep_daily days, the newest one of each day is kept, and of
+        those within keep_weekly weeks, the newest one of each week.
+
+        Args:
+            keep_daily (int): days to keep the daily snapshots.
+            keep_weekly (int): weeks to keep the weekly snapshots.
+            delta (bool): store the older snapshots as deltas against
+                          their successors.
+            now (datetime): the current time.
+
+        Returns:
+            tuple: the numbers of the removed and the delta snapshots.
+        """
+        if now is None:
+            now = datetime.now()
+
+        rs = db.conn.execute("""
+SELECT database_name,
+       schema_name,
+       table_name,
+       created_at
+  FROM repo
+ ORDER BY
+       database_name,
+       schema_name,
+       table_name,
+       created_at DESC
+""")
+        history = {}
+        for r in rs.fetchall():
+            history.setdefault(tuple(r[0:3]), []).append(r[3])
+
+        removed = 0
+        deltas = 0
+        for key in sorted(history.keys()):
+            keep = self._get_snapshots_to_keep(history[key], keep_daily,
+                                               keep_weekly, now)
+            with db.session():
+                (r, d) = self._compact_table(key, history[key], keep, delta)
+            removed += r
+            deltas += d
+
+        # Give the freed pages back to the file system.
+        if db.creds.get('use_sqlite') and removed > 0:
+            db.conn.execute('VACUUM')
+        return (removed, deltas)
+
+    def _get_snapshots_to_keep(self, created_at, keep_daily, keep_weekly,
+                               now):
+        # created_at is sorted in descending order.
+        keep = set([created_at[0]])
+        days = set()
+        weeks = set()
+        for c in created_at:
+            ts = dateutil.parser.parse(c)
+            if ts >= now - timedelta(days=keep_daily):
+                if ts.date() not in days:
+                    days.add(ts.date())
+                    keep.add(c)
+            elif ts >= now - timedelta(weeks=keep_weekly):
+                if ts.isocalendar()[0:2] not in weeks:
+                    weeks.add(ts.isocalendar()[0:2])
+                    keep.add(c)
+        return keep
+
+    def _compact_table(self, key, created_at, keep, delta):
+        select = sa.text("""
+SELECT data
+  FROM repo
+ WHERE database_name = :d
+   AND schema_name = :s
+   AND table_name = :t
+   AND created_at = :c
+""")
+        update = sa.text("""
+UPDATE repo
+   SET data = :data
+ WHERE database_name = :d
+   AND schema_name = :s
+   AND table_name = :t
+   AND created_at = :c
+""")
+
+        removed = 0
+        deltas = 0
+        # successor snapshots of the original and the compacted history.
+        prev = (None, None)
+        prev_kept = []
+        for c in created_at:
+            params = {'d': key[0], 's': key[1], 't': key[2], 'c': c}
+            s = db.conn.execute(select, params).fetchone()[0]
+            data = decode_data(s, prev[1])
+
+            if c not in keep:
+                for t in ['repo', 'repo_columns']:
+                    db.conn.execute(sa.text("""
+DELETE FROM {0}
+ WHERE database_name = :d
+   AND schema_name = :s
+   AND table_name = :t
+   AND created_at = :c
+""".format(t)), params)
+                removed += 1
+            elif len(prev_kept) >= 2:
+                # The latest snapshot can be updated, so that the deltas
+                # are taken against the immutable ones after that.
+                successor_changed = prev_kept[-1][0] != prev[0]
+                if delta and (not is_delta(s) or successor_changed):
+                    params['data'] = encode_delta(data, prev_kept[-1][1])
+                    db.conn.execute(update, params)
+                elif not delta and is_delta(s) and successor_changed:
+                    params['data'] = encode_data(data)
+                    db.conn.execute(update, params)
+                if delta:
+                    deltas += 1
+
+            if c in keep:
+                prev_kept = (prev_kept + [(c, data)])[-2:]
+            prev = (c, data)
+        return (removed, deltas)
+
     def destroy(self):
         self.drop_table('repo')
+        self.drop_table('repo_latest')
+        self.drop_table('repo_columns')
+        self.drop_table('repo_changes')
         self.drop_table('datamapping')
         self.drop_table('tags')
         self.drop_table('business_glossary')
@@ -159,6 +1084,10 @@ create table attachments (
         self.drop_table('tags2')
         self.drop_table('schemas2')
         self.drop_table('attachments')
+        self.drop_table('search_index')
+        self.drop_table('search_docs')
+        if not db.creds.get('use_sqlite'):
+            db.conn.execute('drop function if exists search_docs_tsv()')
 
     def drop_table(self, table_name):
         query = 'drop table if exists {0}'.format(table_name)
@@ -191,6 +1120,221 @@ class TestRepository(unittest.TestCase):
         err_msg = '(psycopg2.ProgrammingError) relation "repo" already exists'
         self.assertTrue(str(cm.exception).startswith(err_msg))
 
+    def test_upgrade_001(self):
+        self.repo.create()
+        db.conn.execute("INSERT INTO repo VALUES ('d','s','t','2016-04-27',"
+                        "'{}',NULL)")
+        db.conn.execute("INSERT INTO repo VALUES ('d','s','t','2016-05-27',"
+                        "'{}',NULL)")
+        self.repo.drop_table('repo_latest')
+
+        self.assertTrue(self.repo.upgrade())
+        rs = db.conn.execute('SELECT * FROM repo_latest')
+        self.assertEqual([('d', 's', 't', '2016-05-27')],
+                         [tuple(x) for x in rs])
+
+        # already upgraded
+        self.assertTrue(self.repo.upgrade())
+
+    def test_upgrade_002(self):
+        self.repo.create()
+        data = ('{"timestamp": "2016-04-27T10:06:41", "row_count": 2, '
+                '"columns": [{"column_name": "c", "nulls": 1}]}')
+        db.conn.execute("INSERT INTO repo VALUES ('d','s','t','2016-04-27',"
+                        "'%s',NULL)" % data)
+        self.repo.drop_table('repo_columns')
+
+        self.assertTrue(self.repo.upgrade())
+        rs = db.conn.execute('SELECT column_name, created_at, row_count, '
+                             '       nulls FROM repo_columns')
+        self.assertEqual([('c', '2016-04-27', 2, 1)],
+                         [tuple(x) for x in rs])
+
+    def test_change_count_001(self):
+        self.repo.create()
+        self.assertEqual(0, get_change_count())
+        bump_change_count()
+        bump_change_count()
+        self.assertEqual(2, get_change_count())
+
+        # counted once for a session.
+        with db.session():
+            bump_change_count()
+            with db.session():
+                bump_change_count()
+            self.assertEqual(2, get_change_count())
+        self.assertEqual(3, get_change_count())
+
+        self.repo.drop_table('repo_changes')
+        self.assertIsNone(get_change_count())
+
+        self.assertTrue(self.repo.upgrade())
+        self.assertEqual(0, get_change_count())
+
+    def test_upgrade_003(self):
+        self.repo.create()
+        db.conn.execute('DROP INDEX repo_timestamp_idx')
+        db.conn.execute('ALTER TABLE repo DROP COLUMN timestamp')
+        for c in ['2016-04-27', '2016-05-27']:
+            data = {'timestamp': c + 'T10:06:41'}
+            db.conn.execute("INSERT INTO repo VALUES ('d','s','t','%s',"
+                            "'%s')" % (c, encode_data(data)))
+
+        self.assertTrue(self.repo.upgrade())
+        rs = db.conn.execute('SELECT created_at, timestamp FROM repo '
+                             'ORDER BY created_at')
+        self.assertEqual([('2016-04-27', '2016-04-27T10:06:41'),
+                          ('2016-05-27', '2016-05-27T10:06:41')],
+                         [tuple(x) for x in rs])
+
+    def test_upgrade_004(self):
+        self.repo.create()
+        self.repo.drop_table('tags')
+        db.conn.execute('CREATE TABLE tags (tag_id text not null, '
+                        'tag_label text not null)')
+        db.conn.execute("INSERT INTO repo_latest VALUES ('d','s','t.1',"
+                        "'2016-04-27')")
+        db.conn.execute("INSERT INTO tags VALUES ('d.s.t.1','a')")
+        db.conn.execute("INSERT INTO tags VALUES ('d.s.t2','b')")
+        self.assertFalse(self.repo.is_upgraded())
+
+        self.assertTrue(self.repo.upgrade())
+        self.assertTrue(self.repo.is_upgraded())
+        rs = db.conn.execute('SELECT tag_label, database_name, schema_name, '
+                             '       table_name FROM tags ORDER BY tag_label')
+        self.assertEqual([('a', 'd', 's', 't.1'), ('b', None, None, None)],
+                         [tuple(x) for x in rs])
+
+    def test_convert_001(self):
+        self.repo.create()
+        db.conn.execute("INSERT INTO repo VALUES ('d','s','t','2016-04-27',"
+                        "'{\"a\": 1}',NULL)")
+
+        self.assertEqual(1, self.repo.convert())
+        s = db.conn.execute('SELECT data FROM repo').fetchone()[0]
+        self.assertTrue(s.startswith(DATA_FORMAT_ZLIB))
+        self.assertEqual({'a': 1}, decode_data(s))
+
+        # already converted
+        self.assertEqual(0, self.repo.convert())
+
+        self.assertEqual(1, self.repo.convert(compress=False))
+        s = db.conn.execute('SELECT data FROM repo').fetchone()[0]
+        self.assertEqual('{\n  "a": 1\n}', s)
+
+    def test_compact_001(self):
+        self.repo.create()
+        for c in ['2016-01-01T10:00:00', '2016-01-01T11:00:00',
+                  '2016-01-02T10:00:00', '2016-01-03T10:00:00',
+                  '2016-01-13T10:00:00', '2016-01-30T10:00:00',
+                  '2016-01-31T10:00:00']:
+            db.conn.execute("INSERT INTO repo VALUES ('d','s','t','%s',"
+                            "'{\"c\": \"%s\"}',NULL)" % (c, c))
+
+        now = datetime(2016, 2, 1)
+        self.assertEqual((4, 0), self.repo.compact(2, 3, now=now))
+        rs = db.conn.execute('SELECT created_at FROM repo '
+                             'ORDER BY created_at')
+        # weekly: 2016-01-13, daily: 2016-01-30 and 2016-01-31
+        self.assertEqual(['2016-01-13T10:00:00', '2016-01-30T10:00:00',
+                          '2016-01-31T10:00:00'], [x[0] for x in rs])
+
+    def test_compact_002(self):
+        self.repo.create()
+        for i in range(4):
+            c = '2016-01-0%dT10:00:00' % (i + 1)
+            data = {'c': c, 'columns': [{'column_name': 'a', 'nulls': i},
+                                        {'column_name': 'b', 'nulls': 0}]}
+            db.conn.execute("INSERT INTO repo VALUES ('d','s','t','%s',"
+                            "'%s',NULL)" % (c, encode_data(data)))
+
+        now = datetime(2016, 1, 5)
+        self.assertEqual((0, 2), self.repo.compact(30, 52, delta=True,
+                                                   now=now))
+        rs = db.conn.execute('SELECT data FROM repo '
+                             'ORDER BY created_at DESC')
+        rs = [x[0] for x in rs]
+        self.assertFalse(is_delta(rs[0]))
+        self.assertFalse(is_delta(rs[1]))
+        self.assertTrue(is_delta(rs[2]))
+        self.assertTrue(is_delta(rs[3]))
+
+        data = decode_data(rs[1])
+        data = decode_data(rs[2], data)
+        self.assertEqual({'c': '2016-01-02T10:00:00',
+                          'columns': [{'column_name': 'a', 'nulls': 1},
+                                      {'column_name': 'b', 'nulls': 0}]},
+                         data)
+        data = decode_data(rs[3], data)
+        self.assertEqual(0, data['columns'][0]['nulls'])
+
+        # the remaining deltas are still restored.
+        self.assertEqual((1, 0), self.repo.compact(3, 0, now=now))
+        rs = db.conn.execute('SELECT data FROM repo '
+                             'ORDER BY created_at DESC')
+        rs = [x[0] for x in rs]
+        data = decode_data(rs[2], decode_data(rs[1]))
+        self.assertEqual(1, data['columns'][0]['nulls'])
+
+    def test_encode_delta_001(self):
+        old = {'a': 1, 'b': [1, 2], 'c': [{'x': 1}, {'x': 2}], 'd': 'd'}
+        new = {'a': 2, 'b': [1, 2, 3], 'c': [{'x': 1}, {'x': 3}], 'e': 'e'}
+        s = encode_delta(old, new)
+        self.assertTrue(is_delta(s))
+        self.assertEqual(old, decode_data(s, new))
+        self.assertEqual(old, decode_data(encode_delta(old, old), old))
+
+        with self.assertRaises(ValueError) as cm:
+            decode_data(s)
+
+    def test_encode_data_001(self):
+        data = {'b': [1, 2], 'a': u'\u3042'}
+        s = encode_data(data)
+        self.assertTrue(s.startswith(DATA_FORMAT_ZLIB))
+        self.assertEqual(data, decode_data(s))
+
+        s = encode_data(data, compress=False)
+        self.assertEqual('{\n  "a": "\\u3042", \n'
+                         '  "b": [\n    1, \n    2\n  ]\n}', s)
+        self.assertEqual(data, decode_data(s))
+
+    def test_get_column_stats_001(self):
+        data = {'timestamp': '2016-04-27T10:06:41',
+                'row_count': 10,
+                'columns': [{'column_name': u'c1',
+                             'data_type': [u'varchar', u'32'],
+                             'nulls': 1,
+                             'min': u'a',
+                             'max': u'z',
+                             'cardinality': 5,
+                             'validation': [{'label': u'r1',
+                                             'invalid_count': 2},
+                                            {'label': u'r1',
+                                             'invalid_count': 2},
+                                            {'label': u'r2',
+                                             'invalid_count': 1}]},
+                            {'column_name': u'c2',
+                             'nulls': 0,
+                             'min': 1,
+                             'max': None}]}
+
+        stats = get_column_stats(data)
+        self.assertEqual(2, len(stats))
+        self.assertEqual({'column_name': u'c1',
+                          'timestamp': '2016-04-27T10:06:41',
+                          'data_type': u'varchar',
+                          'row_count': 10,
+                          'nulls': 1,
+                          'min': u'a',
+                          'max': u'z',
+                          'cardinality': 5,
+                          'validation_count': 2,
+                          'invalid_count': 3}, stats[0])
+        self.assertEqual(u'1', stats[1]['min'])
+        self.assertIsNone(stats[1]['max'])
+        self.assertIsNone(stats[1]['data_type'])
+        self.assertEqual(0, stats[1]['validation_count'])
+
     def test_destroy_001(self):
         self.repo.create()
         self.repo.destroy()
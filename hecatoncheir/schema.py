@@ -5,7 +5,7 @@ import unittest
 
 import sqlalchemy as sa
 
-from repository import Repository
+from repository import Repository, repo_latest_table, schemas2_table
 from utils import jsonize
 import db
 
@@ -42,47 +42,36 @@ class Schema2:
         if not comment:
             comment = u''
 
-        q = u"""
-INSERT INTO schemas2 (database_name, schema_name, description, comment)
-VALUES ('{0}', '{1}', '{2}', '{3}')
-""".format(database_name, schema_name, description, comment)
-        rs = db.conn.execute(q)
+        db.conn.execute(db.statement(('Schema2.create',),
+                                     schemas2_table.insert),
+                        database_name=database_name, schema_name=schema_name,
+                        description=description, comment=comment)
 
         return Schema2(database_name, schema_name, description, comment)
 
     @staticmethod
     def find(database_name, schema_name):
-        q = u"""
-SELECT database_name,
-       schema_name,
-       COUNT(DISTINCT table_name)
-  FROM repo
- WHERE database_name = '{0}'
-   AND schema_name = '{1}'
-GROUP BY
-       database_name,
-       schema_name
-""".format(database_name, schema_name)
-
-        rs = db.conn.execute(q)
+        l = repo_latest_table
+        q = db.statement(('Schema2.find', 'repo_latest'),
+                         lambda: sa.select([sa.func.count()]).where(
+                             Schema2._key_clause(l)))
+        params = {'b_database_name': database_name,
+                  'b_schema_name': schema_name}
+
+        rs = db.conn.execute(q, params)
         r = rs.fetchone()
-        if r:
-            num_of_tables = r[2]
-        else:
-            num_of_tables = 0
+        num_of_tables = r[0] if r else 0
 
         # Get those schema description and comment.
         description = None
         comment = None
 
-        q = u"""
-SELECT description,
-       comment
-  FROM schemas2
- WHERE database_name = '{0}'
-   AND schema_name = '{1}'
-""".format(database_name, schema_name)
-        rs = db.conn.execute(q)
+        s = schemas2_table
+        q = db.statement(('Schema2.find', 'schemas2'),
+                         lambda: sa.select([s.c.description,
+                                            s.c.comment]).where(
+                             Schema2._key_clause(s)))
+        rs = db.conn.execute(q, params)
         r = rs.fetchone()
         if r:
             description = r[0]
@@ -91,47 +80,57 @@ SELECT description,
         return Schema2(database_name, schema_name, description,
                        comment, num_of_tables)
 
+    @staticmethod
+    def _build_findall():
+        # count the tables in the latest snapshots, and get the
+        # descriptions of the schemas in the same query.
+        l = repo_latest_table
+        s = schemas2_table
+        q = sa.select([l.c.database_name, l.c.schema_name,
+                       sa.func.count(), s.c.description, s.c.comment])
+        q = q.select_from(l.outerjoin(s, sa.and_(
+            s.c.database_name == l.c.database_name,
+            s.c.schema_name == l.c.schema_name)))
+        q = q.group_by(l.c.database_name, l.c.schema_name,
+                       s.c.description, s.c.comment)
+        return q.order_by(l.c.database_name, l.c.schema_name)
+
     @staticmethod
     def findall():
-        q = u"""
-SELECT DISTINCT
-       database_name,
-       schema_name
-  FROM repo
- ORDER BY
-       database_name,
-       schema_name
-"""
+        q = db.statement(('Schema2.findall',), Schema2._build_findall)
         a = []
         rs = db.conn.execute(q)
-        for r in rs:
-            a.append(Schema2.find(r[0], r[1]))
+        for r in rs.fetchall():
+            a.append(Schema2(r[0], r[1], r[3], r[4], r[2]))
         return a
 
+    @staticmethod
+    def _key_clause(table=schemas2_table):
+        return sa.and_(
+            table.c.database_name == sa.bindparam('b_database_name'),
+            table.c.schema_name == sa.bindparam('b_schema_name'))
+
     def update(self):
         assert (isinstance(self.description, unicode) or
                 self.description is None)
         assert isinstance(self.comment, unicode) or self.comment is None
 
-        q = u"""
-UPDATE schemas2
-   SET description = '{2}',
-       comment = '{3}'
- WHERE database_name = '{0}'
-   AND schema_name = '{1}'
-""".format(self.database_name, self.schema_name,
-           self.description, self.comment)
-        rs = db.conn.execute(q)
+        q = db.statement(('Schema2.update',),
+                         lambda: schemas2_table.update().where(
+                             Schema2._key_clause()))
+        db.conn.execute(q, b_database_name=self.database_name,
+                        b_schema_name=self.schema_name,
+                        description=self.description or u'',
+                        comment=self.comment or u'')
 
         return True
 
     def destroy(self):
-        q = u"""
-DELETE FROM schemas2
- WHERE database_name = '{0}'
-   AND schema_name = '{1}'
-""".format(self.database_name, self.schema_name)
-        db.conn.execute(q)
+        q = db.statement(('Schema2.destroy',),
+                         lambda: schemas2_table.delete().where(
+                             Schema2._key_clause()))
+        db.conn.execute(q, b_database_name=self.database_name,
+                        b_schema_name=self.schema_name)
 
         return True
 
@@ -187,6 +186,26 @@ class TestSchema2(unittest.TestCase):
         self.assertEquals('d', a[2].database_name)
         self.assertEquals('s3', a[2].schema_name)
 
+    def test_findall_002(self):
+        from table import Table2
+        Table2.create('d', 's', 't',
+                      {'timestamp': '2016-05-27T10:06:41.653836'})
+        Table2.create('d', 's', 't4',
+                      {'timestamp': '2016-05-27T10:06:41.653836'})
+        Schema2.create('d', 's', u'desc', u'com')
+
+        a = Schema2.findall()
+        self.assertEquals(3, len(a))
+        self.assertEquals('s', a[0].schema_name)
+        self.assertEquals(u'desc', a[0].description)
+        self.assertEquals(u'com', a[0].comment)
+        # counted only in the latest snapshots.
+        self.assertEquals(2, a[0].num_of_tables)
+        self.assertEquals('s2', a[1].schema_name)
+        self.assertIsNone(a[1].description)
+        self.assertIsNone(a[1].comment)
+        self.assertEquals(1, a[1].num_of_tables)
+
     def test_update_001(self):
         Schema2.create('d', 's')
         s = Schema2.find('d', 's')
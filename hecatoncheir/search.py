@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import unittest
+import weakref
+
+import sqlalchemy as sa
+
+from businessglossary import GlossaryTerm
+from exception import QueryError
+from repository import Repository, search_docs_table
+from table import Table2
+import db
+
+# Weights of the name, name_nls, comment and tags fields in bm25().
+fts5_weights = (10.0, 10.0, 1.0, 5.0)
+
+objtypes = ['table', 'column', 'glossary']
+
+# Messages of the errors on a malformed query of fts5 and to_tsquery().
+query_errors = ('fts5: ', 'unterminated string', 'syntax error in tsquery')
+
+
+# The backends of the search resolved for each engine.
+_backends = weakref.WeakKeyDictionary()
+
+
+def _get_backend():
+    backend = _backends.get(db.engine)
+    if backend is None:
+        if not db.creds.get('use_sqlite'):
+            backend = 'tsquery'
+        elif db.engine.dialect.has_table(db.conn, 'search_index'):
+            backend = 'fts5'
+        else:
+            backend = 'like'
+        _backends[db.engine] = backend
+    return backend
+
+
+def _build_search(objtype, backend):
+    s = search_docs_table
+    columns = [s.c.objtype, s.c.objid, s.c.database_name, s.c.schema_name,
+               s.c.table_name, s.c.name, s.c.name_nls, s.c.comment]
+    if backend == 'fts5':
+        score = sa.literal_column('bm25(search_index, %s)' %
+                                  ', '.join([str(w) for w in fts5_weights]))
+        q = sa.select(columns + [score.label('score')]).select_from(
+            s.join(sa.table('search_index'),
+                   s.c.docid == sa.literal_column('search_index.rowid')))
+        q = q.where(sa.literal_column('search_index').match(
+            sa.bindparam('q'))).order_by(score)
+    elif backend == 'tsquery':
+        tsv = sa.literal_column('tsv')
+        tsq = sa.func.to_tsquery('simple', sa.bindparam('q'))
+        score = sa.func.ts_rank(tsv, tsq)
+        q = sa.select(columns + [score.label('score')])
+        q = q.where(tsv.op('@@')(tsq)).order_by(score.desc())
+    else:
+        # Without the index, the names are matched first.
+        p = sa.bindparam('q')
+        score = sa.case([(s.c.name.like(p), 0), (s.c.name_nls.like(p), 1)],
+                        else_=2)
+        q = sa.select(columns + [score.label('score')])
+        q = q.where(sa.or_(s.c.name.like(p), s.c.name_nls.like(p),
+                           s.c.comment.like(p), s.c.tags.like(p)))
+        q = q.order_by(score, s.c.objid)
+    if objtype:
+        q = q.where(s.c.objtype == sa.bindparam('objtype'))
+    return q.limit(sa.bindparam('limit'))
+
+
+def build_query(keywords, backend):
+    """Build a query string of the full-text search from the keywords
+
+    Each word in the keywords is matched as a prefix, and all the words
+    need to be matched.
+
+    Args:
+        keywords (str): keywords separated by the spaces.
+        backend (str): 'fts5', 'tsquery' or 'like'.
+
+    Returns:
+        str: a query string, or None when no word is found.
+    """
+    words = re.findall(r'\w+', keywords, re.UNICODE)
+    if not words:
+        return None
+    if backend == 'fts5':
+        return u' '.join([u'"%s"*' % w for w in words])
+    if backend == 'tsquery':
+        return u' & '.join([u"'%s':*" % w for w in words])
+    return u'%' + u'%'.join(words) + u'%'
+
+
+def search(keywords, objtype=None, limit=20):
+    """Search the tables, the columns and the glossary terms
+
+    Args:
+        keywords (str): keywords to be searched.
+        objtype (str): 'table', 'column' or 'glossary' to narrow the hits.
+        limit (int): max number of the hits.
+
+    Returns:
+        list: a list of dictionaries of the hits, best one coming first.
+
+    Raises:
+        QueryError: the object type, the limit or the query built from
+                    the keywords is not valid.
+    """
+    if objtype is not None and objtype not in objtypes:
+        raise QueryError(u"Invalid object type: %s" % objtype, keywords)
+    if limit < 1:
+        raise QueryError(u"Invalid limit: %d" % limit, keywords)
+
+    backend = _get_backend()
+    q = build_query(keywords, backend)
+    if q is None:
+        return []
+
+    stmt = db.statement(('search', bool(objtype), backend),
+                        lambda: _build_search(objtype, backend))
+    try:
+        rs = db.conn.execute(stmt, q=q, objtype=objtype, limit=limit)
+    except sa.exc.DBAPIError as ex:
+        if not any(m in unicode(ex.orig) for m in query_errors):
+            raise
+        raise QueryError(u"Invalid search query: %s" % q, q, source=ex)
+
+    keys = ['objtype', 'objid', 'database_name', 'schema_name', 'table_name',
+            'name', 'name_nls', 'comment', 'score']
+    return [dict(zip(keys, r)) for r in rs]
+
+
+class TestSearch(unittest.TestCase):
+    def setUp(self):
+        db.creds = {}
+        db.creds['host'] = os.environ.get('PGHOST', 'localhost')
+        db.creds['port'] = os.environ.get('PGPORT', 5432)
+        db.creds['dbname'] = os.environ.get('PGDATABASE', 'datacatalog')
+        db.creds['username'] = os.environ.get('PGUSER', 'postgres')
+        db.creds['password'] = os.environ.get('PGPASSWORD', 'postgres')
+
+        self.repo = Repository()
+        self.repo.destroy()
+        self.repo.create()
+
+        data = {'table_name_nls': u'顧客',
+                'comment': u'customer master',
+                'tags': [u'sales'],
+                'columns': [{'column_name': u'CUSTOMER_ID',
+                             'column_name_nls': u'顧客ID'},
+                            {'column_name': u'NAME',
+                             'comment': u'name of the customer'}]}
+        Table2.create(u'd', u's', u'CUSTOMERS', data)
+        GlossaryTerm.create(u'customer', u'a person who buys', u'', u'',
+                            [], [u'client'], [], [])
+
+    def tearDown(self):
+        db.conn.close()
+
+    def test_build_query_001(self):
+        self.assertEqual(u'"foo"* "bar"*', build_query(u'foo, bar', 'fts5'))
+        self.assertEqual(u"'foo':* & 'bar':*",
+                         build_query(u'foo, bar', 'tsquery'))
+        self.assertEqual(u'%foo%bar%', build_query(u'foo, bar', 'like'))
+        self.assertIsNone(build_query(u' ', 'fts5'))
+
+    def test_search_001(self):
+        hits = search(u'customer')
+        self.assertEqual(4, len(hits))
+        # the names rank higher than the comments.
+        self.assertEqual([u'CUSTOMERS', u'CUSTOMER_ID', u'customer'],
+                         sorted([h['name'] for h in hits[:3]]))
+        self.assertEqual(u'NAME', hits[3]['name'])
+
+        hits = search(u'cust', objtype='column')
+        self.assertEqual([u'd.s.CUSTOMERS.CUSTOMER_ID',
+                          u'd.s.CUSTOMERS.NAME'],
+                         [h['objid'] for h in hits])
+
+        hits = search(u'client')
+        self.assertEqual([u'customer'], [h['objid'] for h in hits])
+
+        hits = search(u'sales')
+        self.assertEqual([u'd.s.CUSTOMERS'], [h['objid'] for h in hits])
+
+        hits = search(u'顧客', objtype='table')
+        self.assertEqual([u'd.s.CUSTOMERS'], [h['objid'] for h in hits])
+
+    def test_search_002(self):
+        # the documents follow the updates of the tables and the terms.
+        t = Table2.find(u'd', u's', u'CUSTOMERS')[0]
+        t.data['columns'] = []
+        t.update()
+        self.assertEqual([u'd.s.CUSTOMERS'],
+                         [h['objid'] for h in search(u'customer',
+                                                     objtype='table')])
+        self.assertEqual([], search(u'customer', objtype='column'))
+
+        GlossaryTerm.find(u'customer')[0].destroy()
+        self.assertEqual([], search(u'client'))
+
+        t.destroy()
+        self.assertEqual([], search(u'customer'))
+
+    def test_get_backend_001(self):
+        self.assertEqual('tsquery', _get_backend())
+        self.assertEqual('tsquery', _backends[db.engine])
+
+    def test_search_003(self):
+        with self.assertRaises(QueryError) as cm:
+            search(u'customer', objtype='foo')
+        self.assertEqual(u'Invalid object type: foo', cm.exception.value)
+
+        with self.assertRaises(QueryError) as cm:
+            search(u'customer', limit=0)
+        self.assertEqual(u'Invalid limit: 0', cm.exception.value)
+
+    def test_upgrade_001(self):
+        self.repo.drop_table('search_index')
+        self.repo.drop_table('search_docs')
+
+        self.assertTrue(self.repo.upgrade())
+        self.assertEqual(4, len(search(u'customer')))
+
+
+if __name__ == '__main__':
+    unittest.main()
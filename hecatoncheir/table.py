@@ -5,8 +5,11 @@ import unittest
 
 import sqlalchemy as sa
 
-from repository import Repository
-from utils import jsonize
+from repository import (Repository, bump_change_count, decode_data,
+                        encode_data, insert_column_stats, repo_columns_table,
+                        repo_latest_table, repo_table, table_key_clause,
+                        table_key_params, tags_table,
+                        update_table_search_docs)
 import db
 
 
@@ -19,101 +22,257 @@ class Table2:
 
     @staticmethod
     def create(database_name, schema_name, table_name, data):
-        q = """
-INSERT INTO repo VALUES ('{0}','{1}','{2}','{3}','{4}')
-""".format(database_name, schema_name, table_name,
-           datetime.now().strftime("%Y-%m-%dT%H:%M:%S.%f"),
-           jsonize(data).replace("'", "''"))
-
-        db.conn.execute(q)
+        created_at = datetime.now().strftime("%Y-%m-%dT%H:%M:%S.%f")
+        params = table_key_params(database_name, schema_name, table_name)
+
+        # Move the pointer to the latest snapshot in the same transaction.
+        with db.session():
+            db.conn.execute(
+                db.statement(('Table2.create', 'repo'), repo_table.insert),
+                database_name=database_name, schema_name=schema_name,
+                table_name=table_name, created_at=created_at,
+                data=encode_data(data), timestamp=data.get('timestamp'))
+            db.conn.execute(
+                db.statement(('Table2.create', 'repo_latest.delete'),
+                             lambda: repo_latest_table.delete().where(
+                                 table_key_clause(repo_latest_table))),
+                params)
+            db.conn.execute(
+                db.statement(('Table2.create', 'repo_latest.insert'),
+                             repo_latest_table.insert),
+                database_name=database_name, schema_name=schema_name,
+                table_name=table_name, created_at=created_at)
+            insert_column_stats(database_name, schema_name, table_name,
+                                created_at, data)
+            update_table_search_docs(database_name, schema_name, table_name,
+                                     data)
+            bump_change_count()
 
         return Table2(database_name, schema_name, table_name, data)
 
     @staticmethod
-    def find(database_name=None, schema_name=None, table_name=None, tag=None):
-        q = """
-SELECT database_name,
-       schema_name,
-       table_name,
-       data
-  FROM repo
-"""
-
-        conds = ['1=1']
+    def _build_find(database_name, schema_name, table_name):
+        # pick only the latest table data.
+        l = repo_latest_table
+        r = repo_table
+        q = sa.select([l.c.database_name, l.c.schema_name, l.c.table_name,
+                       r.c.data])
+        q = q.select_from(l.join(r, sa.and_(
+            r.c.database_name == l.c.database_name,
+            r.c.schema_name == l.c.schema_name,
+            r.c.table_name == l.c.table_name,
+            r.c.created_at == l.c.created_at)))
         if database_name:
-            conds.append("database_name = '%s'" % database_name)
+            q = q.where(l.c.database_name == sa.bindparam('database_name'))
         if schema_name:
-            conds.append("schema_name = '%s'" % schema_name)
+            q = q.where(l.c.schema_name == sa.bindparam('schema_name'))
         if table_name:
-            conds.append("table_name = '%s'" % table_name)
+            q = q.where(l.c.table_name == sa.bindparam('table_name'))
+        return q.order_by(l.c.database_name, l.c.schema_name, l.c.table_name)
 
-        q = q + ' WHERE ' + ' AND '.join(conds)
-        q = q + (' ORDER BY database_name,schema_name,table_name,'
-                 'created_at DESC')
+    @staticmethod
+    def find(database_name=None, schema_name=None, table_name=None, tag=None):
+        key = ('Table2.find', bool(database_name), bool(schema_name),
+               bool(table_name))
+        q = db.statement(key, lambda: Table2._build_find(database_name,
+                                                         schema_name,
+                                                         table_name))
+        params = {}
+        if database_name:
+            params['database_name'] = database_name
+        if schema_name:
+            params['schema_name'] = schema_name
+        if table_name:
+            params['table_name'] = table_name
 
         tables = []
-        rs = db.conn.execute(q)
-        found = []
+        rs = db.conn.execute(q, params)
         for r in rs:
-            # pick only the latest table data.
-            if (r[0], r[1], r[2]) in found:
-                continue
-            data = json.loads(r[3])
+            data = decode_data(r[3])
             if tag:
                 if not data.get('tags') or tag not in data.get('tags'):
                     continue
             tables.append(Table2(r[0], r[1], r[2], data))
-            found.append((r[0], r[1], r[2]))
         return tables
 
+    @staticmethod
+    def find_many(names):
+        """Find the latest table data of the tables at once
+
+        The table names in each schema are looked up by IN clauses,
+        instead of issuing a query for each table.
+
+        Args:
+            names (list): a list of tuples of database, schema and
+                          table names.
+
+        Returns:
+            list: a list of Table2 objects sorted by the names.
+        """
+        return list(Table2.iter_many(names))
+
+    @staticmethod
+    def iter_many(names):
+        """Iterate the latest table data of the tables
+
+        Same as find_many(), but only a chunk of the tables is read
+        from the repository at a time.
+
+        Args:
+            names (list): a list of tuples of database, schema and
+                          table names.
+
+        Yields:
+            Table2: the Table2 objects sorted by the names.
+        """
+        schemas = {}
+        for n in names:
+            schemas.setdefault((n[0], n[1]), set()).add(n[2])
+
+        l = repo_latest_table
+        for (database_name, schema_name) in sorted(schemas):
+            for chunk in db.chunks(sorted(schemas[(database_name,
+                                                   schema_name)])):
+                q = Table2._build_find(database_name, schema_name, None)
+                q = q.where(l.c.table_name.in_(chunk))
+                rs = db.conn.execute(q, database_name=database_name,
+                                     schema_name=schema_name)
+                for r in sorted(rs.fetchall(), key=lambda r: r[2]):
+                    yield Table2(r[0], r[1], r[2], decode_data(r[3]))
+
+    @staticmethod
+    def find_names():
+        """Find the names of all the latest tables
+
+        Returns:
+            list: a list of tuples of database, schema and table names
+                  sorted by the names.
+        """
+        l = repo_latest_table
+        q = db.statement(('Table2.find_names',),
+                         lambda: sa.select([l.c.database_name,
+                                            l.c.schema_name,
+                                            l.c.table_name]).order_by(
+                             l.c.database_name, l.c.schema_name,
+                             l.c.table_name))
+        return [tuple(r) for r in db.conn.execute(q)]
+
     def _update_tags(self):
         # Update the table-tag mappings
         tagid = '%s.%s.%s' % (self.database_name, self.schema_name,
                               self.table_name)
-        q = "DELETE FROM tags WHERE tag_id = '%s'" % tagid
-        db.conn.execute(q)
+        db.conn.execute(
+            db.statement(('Table2._update_tags', 'delete'),
+                         lambda: tags_table.delete().where(
+                             tags_table.c.tag_id == sa.bindparam('b_tag_id'))),
+            b_tag_id=tagid)
 
         if not self.data.get('tags'):
             return
 
-        for tag in self.data.get('tags'):
-            q = ("INSERT INTO tags (tag_id, tag_label) VALUES ('%s', '%s')" %
-                 (tagid, tag))
-            db.conn.execute(q)
+        db.conn.execute(db.statement(('Table2._update_tags', 'insert'),
+                                     tags_table.insert),
+                        [{'tag_id': tagid, 'tag_label': tag,
+                          'database_name': self.database_name,
+                          'schema_name': self.schema_name,
+                          'table_name': self.table_name}
+                         for tag in self.data.get('tags')])
 
     def update(self):
-        q = """
-UPDATE repo
-   SET data = '{4}'
- WHERE database_name = '{0}'
-   AND schema_name = '{1}'
-   AND table_name = '{2}'
-   AND created_at = (SELECT max(created_at)
-                       FROM repo
-                      WHERE database_name = '{0}'
-                        AND schema_name = '{1}'
-                        AND table_name = '{2}')
-""".format(self.database_name, self.schema_name, self.table_name,
-           datetime.now().strftime("%Y-%m-%dT%H:%M:%S.%f"),
-           jsonize(self.data).replace("'", "''"))
-        db.conn.execute(q)
-
-        self._update_tags()
+        params = table_key_params(self.database_name, self.schema_name,
+                                  self.table_name)
+
+        with db.session():
+            r = db.conn.execute(
+                db.statement(('Table2.update', 'repo_latest'),
+                             lambda: sa.select(
+                                 [repo_latest_table.c.created_at]).where(
+                                 table_key_clause(repo_latest_table))),
+                params).fetchone()
+            if r:
+                params['b_created_at'] = r[0]
+                db.conn.execute(
+                    db.statement(('Table2.update', 'repo'),
+                                 lambda: repo_table.update().where(sa.and_(
+                                     table_key_clause(repo_table),
+                                     repo_table.c.created_at ==
+                                     sa.bindparam('b_created_at')))),
+                    dict(params, data=encode_data(self.data),
+                         timestamp=self.data.get('timestamp')))
+
+                # Refresh the column statistics of the latest snapshot.
+                db.conn.execute(
+                    db.statement(('Table2.update', 'repo_columns'),
+                                 lambda: repo_columns_table.delete().where(
+                                     sa.and_(
+                                         table_key_clause(repo_columns_table),
+                                         repo_columns_table.c.created_at ==
+                                         sa.bindparam('b_created_at')))),
+                    params)
+                insert_column_stats(self.database_name, self.schema_name,
+                                    self.table_name, r[0], self.data)
+                update_table_search_docs(self.database_name,
+                                         self.schema_name, self.table_name,
+                                         self.data)
+            self._update_tags()
+            bump_change_count()
 
         return True
 
     def destroy(self):
-        q = """
-DELETE FROM repo
- WHERE database_name = '{0}'
-   AND schema_name = '{1}'
-   AND table_name = '{2}'
-""".format(self.database_name, self.schema_name, self.table_name)
-
-        db.conn.execute(q)
+        params = table_key_params(self.database_name, self.schema_name,
+                                  self.table_name)
+        with db.session():
+            for t in [repo_table, repo_latest_table, repo_columns_table]:
+                db.conn.execute(
+                    db.statement(('Table2.destroy', t.name),
+                                 lambda: t.delete().where(
+                                     table_key_clause(t))),
+                    params)
+            update_table_search_docs(self.database_name, self.schema_name,
+                                     self.table_name)
+            bump_change_count()
         return True
 
 
+class TableNameIndex:
+    """In-memory index of the names of the latest tables
+
+    The tables are looked up by `db.schema.table', `schema.table' and
+    `table' in the dictionary, as Table2.find() does with the names.
+
+    Example:
+        index = TableNameIndex.load()
+        index.find(None, u'SCHEMA', u'TABLE')  # [u'DB.SCHEMA.TABLE', ...]
+    """
+
+    def __init__(self, names):
+        self.names = sorted(names)
+        self.index = {}
+        for n in self.names:
+            full_name = u'%s.%s.%s' % n
+            for key in [n, (None, n[1], n[2]), (None, None, n[2])]:
+                self.index.setdefault(key, []).append(full_name)
+
+    @staticmethod
+    def load():
+        return TableNameIndex(Table2.find_names())
+
+    def find(self, database_name=None, schema_name=None, table_name=None):
+        """Find the tables by the names, ignoring the empty ones
+
+        Returns:
+            list: a list of the full names of the tables found.
+        """
+        key = (database_name or None, schema_name or None, table_name or None)
+        if key[2] and (key[0] is None or key[1] is not None):
+            return self.index.get(key, [])
+
+        # other combinations are not indexed.
+        return [u'%s.%s.%s' % n for n in self.names
+                if all([not k or k == v for k, v in zip(key, n)])]
+
+
 class TestTable2(unittest.TestCase):
     def setUp(self):
         db.creds = {}
@@ -222,6 +381,53 @@ class TestTable2(unittest.TestCase):
         t = Table2.find(tag='tag4')
         self.assertEquals(0, len(t))
 
+    def test_create_002(self):
+        Table2.create('d', 's', 't', {'timestamp':
+                                      '2016-04-27T10:06:41.653836'})
+        Table2.create('d', 's', 't', {'timestamp':
+                                      '2016-05-27T10:06:41.653836'})
+
+        # only the latest snapshot is pointed.
+        rs = db.conn.execute('SELECT l.created_at, r.data '
+                             '  FROM repo_latest l, repo r '
+                             ' WHERE l.created_at = r.created_at')
+        r = rs.fetchall()
+        self.assertEquals(1, len(r))
+        self.assertEquals({'timestamp': '2016-05-27T10:06:41.653836'},
+                          decode_data(r[0][1]))
+
+    def test_find_many_001(self):
+        Table2.create('d', 's', 't', {'timestamp': '1'})
+        Table2.create('d', 's', 't', {'timestamp': '2'})
+        Table2.create('d', 's', 't2', {'timestamp': '1'})
+        Table2.create('d', 's2', 't', {'timestamp': '1'})
+
+        t = Table2.find_many([('d', 's2', 't'), ('d', 's', 't'),
+                              ('d', 's', 't3')])
+        self.assertEquals([('d', 's', 't', {'timestamp': '2'}),
+                           ('d', 's2', 't', {'timestamp': '1'})],
+                          [(x.database_name, x.schema_name, x.table_name,
+                            x.data) for x in t])
+
+        self.assertEquals([], Table2.find_many([]))
+
+    def test_find_names_001(self):
+        Table2.create('d', 's', 't', {'timestamp': '1'})
+        Table2.create('d', 's', 't', {'timestamp': '2'})
+        Table2.create('d', 's2', 't', {'timestamp': '1'})
+        Table2.create('d2', 's', 't2', {'timestamp': '1'})
+
+        self.assertEquals([('d', 's', 't'), ('d', 's2', 't'),
+                           ('d2', 's', 't2')], Table2.find_names())
+
+        index = TableNameIndex.load()
+        self.assertEquals([u'd.s.t'], index.find('d', 's', 't'))
+        self.assertEquals([u'd.s.t', u'd2.s.t2'], index.find(schema_name='s'))
+        self.assertEquals([u'd.s.t', u'd.s2.t'], index.find(None, None, 't'))
+        self.assertEquals([u'd.s2.t'], index.find('', 's2', 't'))
+        self.assertEquals([u'd.s.t', u'd.s2.t'], index.find('d', None, 't'))
+        self.assertEquals([], index.find('d', 's', 't2'))
+
     def test_update_001(self):
         t = Table2.create('d', 's', 't', {'timestamp':
                                           '2016-04-27T10:06:41.653836'})
@@ -5,7 +5,8 @@ import unittest
 
 import sqlalchemy as sa
 
-from repository import Repository
+from repository import (Repository, repo_latest_table, tags2_table,
+                        tags_table)
 import db
 
 
@@ -39,9 +40,9 @@ class Tag2:
         if not comment:
             comment = u''
 
-        q = (u"INSERT INTO tags2 VALUES ('{0}','{1}','{2}')"
-             .format(label, description, comment))
-        db.conn.execute(q)
+        db.conn.execute(db.statement(('Tag2.create',), tags2_table.insert),
+                        label=label, description=description,
+                        comment=comment)
 
         return Tag2(label, description, comment)
 
@@ -54,16 +55,22 @@ class Tag2:
         comment = None
 
         # Getting a number of tables with the tag label
-        q = u"SELECT count(*) FROM tags WHERE tag_label = '{0}'".format(label)
-        rs = db.conn.execute(q)
+        q = db.statement(('Tag2.find', 'tags'),
+                         lambda: sa.select([sa.func.count()])
+                         .select_from(Tag2._join_latest())
+                         .where(
+                             tags_table.c.tag_label == sa.bindparam('label')))
+        rs = db.conn.execute(q, label=label)
         r = rs.fetchone()
         if r:
             num_of_tables = r[0]
 
         # Getting a short description and a comment of the tag.
-        q = (u"SELECT description, comment FROM tags2 WHERE label = '{0}'"
-             .format(label))
-        rs = db.conn.execute(q)
+        q = db.statement(('Tag2.find', 'tags2'),
+                         lambda: sa.select([tags2_table.c.description,
+                                            tags2_table.c.comment]).where(
+                             tags2_table.c.label == sa.bindparam('label')))
+        rs = db.conn.execute(q, label=label)
         r = rs.fetchone()
         if r:
             description = r[0]
@@ -71,13 +78,34 @@ class Tag2:
 
         return Tag2(label, description, comment, num_of_tables)
 
+    @staticmethod
+    def _join_latest():
+        # the tables tagged in the latest snapshots.
+        t = tags_table
+        l = repo_latest_table
+        return t.join(l, sa.and_(t.c.database_name == l.c.database_name,
+                                 t.c.schema_name == l.c.schema_name,
+                                 t.c.table_name == l.c.table_name))
+
+    @staticmethod
+    def _build_findall():
+        t = tags_table
+        t2 = tags2_table
+        q = sa.select([t.c.tag_label, sa.func.count(), t2.c.description,
+                       t2.c.comment])
+        q = q.select_from(Tag2._join_latest().outerjoin(
+            t2, t2.c.label == t.c.tag_label))
+        q = q.group_by(t.c.tag_label, t2.c.description, t2.c.comment)
+        return q.order_by(t.c.tag_label)
+
     @staticmethod
     def findall():
         tags = []
-        rs = db.conn.execute(u"SELECT DISTINCT tag_label FROM tags ORDER BY tag_label")
+        q = db.statement(('Tag2.findall',), Tag2._build_findall)
+        rs = db.conn.execute(q)
         for r in rs.fetchall():
             if r[0]:
-                tags.append(Tag2.find(r[0]))
+                tags.append(Tag2(r[0], r[2], r[3], r[1]))
         return tags
 
     def update(self):
@@ -86,23 +114,22 @@ class Tag2:
                 self.description is None)
         assert isinstance(self.comment, unicode) or self.comment is None
 
-        q = u"""
-UPDATE tags2
-   SET description = '{1}',
-       comment = '{2}'
- WHERE label = '{0}'
-""".format(self.label, self.description, self.comment)
-
-        db.conn.execute(q)
+        q = db.statement(('Tag2.update',),
+                         lambda: tags2_table.update().where(
+                             tags2_table.c.label == sa.bindparam('b_label')))
+        db.conn.execute(q, b_label=self.label,
+                        description=self.description or u'',
+                        comment=self.comment or u'')
 
         return True
 
     def destroy(self):
         assert isinstance(self.label, unicode)
 
-        q = u"DELETE FROM tags2 WHERE label = '{0}'".format(self.label)
-
-        db.conn.execute(q)
+        q = db.statement(('Tag2.destroy',),
+                         lambda: tags2_table.delete().where(
+                             tags2_table.c.label == sa.bindparam('b_label')))
+        db.conn.execute(q, b_label=self.label)
 
         return True
 
@@ -183,6 +210,27 @@ class TestTag2(unittest.TestCase):
         t = Tag2.find(u'l')
         self.assertEquals(1, t.num_of_tables)
 
+    def test_findall_002(self):
+        from table import Table2
+        Tag2.create(u'l', u'd', u'c')
+        for n in ['t', 't2']:
+            t = Table2.create('d', 's', n, {'timestamp':
+                                            '2016-04-27T10:06:41.653836'})
+            t.data['tags'] = ['l', 'l2']
+            t.update()
+        Table2.find('d', 's', 't2')[0].destroy()
+
+        # counted only in the latest snapshots.
+        t = Tag2.findall()
+        self.assertEqual(2, len(t))
+        self.assertEqual('l', t[0].label)
+        self.assertEqual('d', t[0].description)
+        self.assertEqual('c', t[0].comment)
+        self.assertEqual(1, t[0].num_of_tables)
+        self.assertEqual('l2', t[1].label)
+        self.assertIsNone(t[1].description)
+        self.assertEqual(1, t[1].num_of_tables)
+
     def test_findall_001(self):
         Tag2.create(u'l', u'd', u'c')
 
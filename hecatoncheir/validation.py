@@ -5,16 +5,11 @@ import unittest
 
 import sqlalchemy as sa
 
-from repository import Repository
+from repository import (Repository, bump_change_count,
+                        validation_rule_table)
 import db
 
 
-def sql_escape(s):
-    if not s:
-        return ''
-    return s.replace("'", "''")
-
-
 def get_validation_rules(database_name=None, schema_name=None,
                          table_name=None):
     """
@@ -61,52 +56,51 @@ class ValidationRule:
     def create(database_name, schema_name, table_name,
                column_name, description, rule,
                param=None, param2=None):
-        rs = db.engine.execute("SELECT max(id) FROM validation_rule")
-        r = rs.fetchone()
-        id_ = r[0]+1 if r[0] else 1
-
-        query = u"""
-INSERT INTO validation_rule (id,database_name,schema_name,table_name,
-                             column_name,description,rule,param,param2)
-  VALUES ('{0}','{1}','{2}','{3}','{4}','{5}','{6}','{7}', '{8}');
-""".format(id_, database_name, schema_name, table_name, column_name,
-           description, rule, sql_escape(param), sql_escape(param2))
-
-        db.engine.execute(query)
+        v = validation_rule_table
+        with db.session():
+            rs = db.conn.execute(
+                db.statement(('ValidationRule.create', 'max'),
+                             lambda: sa.select([sa.func.max(v.c.id)])))
+            r = rs.fetchone()
+            id_ = r[0]+1 if r[0] else 1
+
+            db.conn.execute(
+                db.statement(('ValidationRule.create', 'insert'), v.insert),
+                id=id_, database_name=database_name,
+                schema_name=schema_name, table_name=table_name,
+                column_name=column_name, description=description,
+                rule=rule, param=param or '', param2=param2 or '')
+            bump_change_count()
 
         return ValidationRule(id_, database_name, schema_name, table_name,
                               column_name, description, rule,
                               param, param2)
 
     @staticmethod
-    def find(id_=None, database_name=None, schema_name=None, table_name=None):
-        cond = ['1=1']
+    def _build_find(id_, database_name, schema_name, table_name):
+        v = validation_rule_table
+        q = sa.select([v.c.id, v.c.database_name, v.c.schema_name,
+                       v.c.table_name, v.c.column_name, v.c.description,
+                       v.c.rule, v.c.param, v.c.param2])
         if id_:
-            cond.append('id = %s' % id_)
+            q = q.where(v.c.id == sa.bindparam('id'))
         if database_name:
-            cond.append("database_name = '%s'" % database_name)
+            q = q.where(v.c.database_name == sa.bindparam('database_name'))
         if schema_name:
-            cond.append("schema_name = '%s'" % schema_name)
+            q = q.where(v.c.schema_name == sa.bindparam('schema_name'))
         if table_name:
-            cond.append("table_name = '%s'" % table_name)
-
-        query = u"""
-SELECT
-  id,
-  database_name,
-  schema_name,
-  table_name,
-  column_name,
-  description,
-  rule,
-  param,
-  param2
-FROM
-  validation_rule
-"""
-
-        rs = db.engine.execute(query + "WHERE " +
-                               " AND ".join(cond) + " ORDER BY id")
+            q = q.where(v.c.table_name == sa.bindparam('table_name'))
+        return q.order_by(v.c.id)
+
+    @staticmethod
+    def find(id_=None, database_name=None, schema_name=None, table_name=None):
+        key = ('ValidationRule.find', bool(id_), bool(database_name),
+               bool(schema_name), bool(table_name))
+        q = db.statement(key, lambda: ValidationRule._build_find(
+            id_, database_name, schema_name, table_name))
+
+        rs = db.conn.execute(q, id=id_, database_name=database_name,
+                             schema_name=schema_name, table_name=table_name)
         rules = []
         for r in rs:
             v = ValidationRule(r[0], r[1], r[2], r[3], r[4],
@@ -115,33 +109,32 @@ FROM
         return rules
 
     def update(self):
-        query = u"""
-UPDATE
-  validation_rule
-SET
-  database_name = '{1}',
-  schema_name = '{2}',
-  table_name = '{3}',
-  column_name = '{4}',
-  description = '{5}',
-  rule = '{6}',
-  param = '{7}',
-  param2 = '{8}'
-WHERE
-  id = '{0}'
-""".format(self.id, self.database_name, self.schema_name,
-           self.table_name, self.column_name,
-           self.description, self.rule,
-           sql_escape(self.param), sql_escape(self.param2))
-
-        db.engine.execute(query)
+        v = validation_rule_table
+        q = db.statement(('ValidationRule.update',),
+                         lambda: v.update().where(
+                             v.c.id == sa.bindparam('b_id')))
+        with db.session():
+            db.conn.execute(q, b_id=self.id,
+                            database_name=self.database_name,
+                            schema_name=self.schema_name,
+                            table_name=self.table_name,
+                            column_name=self.column_name,
+                            description=self.description,
+                            rule=self.rule,
+                            param=self.param or '',
+                            param2=self.param2 or '')
+            bump_change_count()
 
         return True
 
     def destroy(self):
-        query = u"DELETE FROM validation_rule WHERE id = '%s'" % self.id
-
-        db.engine.execute(query)
+        v = validation_rule_table
+        q = db.statement(('ValidationRule.destroy',),
+                         lambda: v.delete().where(
+                             v.c.id == sa.bindparam('b_id')))
+        with db.session():
+            db.conn.execute(q, b_id=self.id)
+            bump_change_count()
 
         return True
 
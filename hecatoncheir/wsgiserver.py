@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+import os
+import Queue
+import signal
+import socket
+from SocketServer import ThreadingMixIn
+import sys
+import threading
+import time
+import unittest
+import urllib2
+
+from werkzeug.serving import BaseWSGIServer, LISTEN_QUEUE
+
+import logger as log
+from msgutil import gettext as _
+
+
+class PooledWSGIServer(ThreadingMixIn, BaseWSGIServer):
+    """A WSGI server handling the requests in a fixed number of threads
+
+    The accepted requests wait in a queue while all the threads are
+    busy, and no more request is accepted while the queue is full.
+    """
+    multithread = True
+    daemon_threads = True
+
+    def __init__(self, host, port, app, threads=1, fd=None):
+        BaseWSGIServer.__init__(self, host, port, app, fd=fd)
+        self.requests = Queue.Queue(threads)
+        for i in range(threads):
+            t = threading.Thread(target=self.process_requests)
+            t.daemon = True
+            t.start()
+
+    def process_requests(self):
+        while True:
+            request, client_address = self.requests.get()
+            self.process_request_thread(request, client_address)
+
+    def process_request(self, request, client_address):
+        self.requests.put((request, client_address))
+
+
+def _serve_worker(create_app, host, sock, threads):
+    app = create_app()
+    server = PooledWSGIServer(host, 0, app, threads, fd=sock.fileno())
+    server.serve_forever()
+
+
+def _terminate(signum, frame):
+    sys.exit(0)
+
+
+def serve(create_app, host, port, workers=1, threads=1):
+    """Serve an application in the worker processes sharing a socket
+
+    Each worker process creates its own application with create_app()
+    after the fork, so that the connections to the repository are not
+    shared with the other processes.
+
+    Args:
+        create_app (function): a function to create a WSGI application.
+        host (str): an address to listen on.
+        port (int): a port number to listen on.
+        workers (int): number of the worker processes.
+        threads (int): number of the threads in each worker process.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(LISTEN_QUEUE)
+    log.info(_("Listening on %s:%d with %d processes and %d threads.") %
+             (host, port, workers, threads))
+
+    if workers <= 1:
+        _serve_worker(create_app, host, sock, threads)
+        return
+
+    signal.signal(signal.SIGTERM, _terminate)
+    pids = []
+    for i in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _serve_worker(create_app, host, sock, threads)
+            finally:
+                os._exit(0)
+        pids.append(pid)
+
+    try:
+        while pids:
+            pid, status = os.wait()
+            pids.remove(pid)
+            log.error(_("Worker process %d exited.") % pid)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+
+class TestPooledWSGIServer(unittest.TestCase):
+    def test_process_request_001(self):
+        active = [0, 0]
+        lock = threading.Lock()
+
+        def app(environ, start_response):
+            with lock:
+                active[0] += 1
+                active[1] = max(active[0], active[1])
+            time.sleep(0.2)
+            with lock:
+                active[0] -= 1
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [environ['PATH_INFO']]
+
+        server = PooledWSGIServer('127.0.0.1', 0, app, threads=3)
+        t = threading.Thread(target=server.serve_forever)
+        t.daemon = True
+        t.start()
+
+        url = 'http://127.0.0.1:%d/' % server.port
+        bodies = []
+
+        def get(i):
+            bodies.append(urllib2.urlopen(url + str(i)).read())
+
+        clients = [threading.Thread(target=get, args=(i,)) for i in range(6)]
+        for c in clients:
+            c.start()
+        for c in clients:
+            c.join()
+        server.shutdown()
+
+        self.assertEqual(['/%d' % i for i in range(6)], sorted(bodies))
+        # handled concurrently, but not more than the threads.
+        self.assertEqual(3, active[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python2.7
+# -*- coding: utf-8 -*-
+#
+# Harness to measure the time to export the table history to the csv
+# files from a SQLite repository with daily snapshots.
+#
+# Usage: bench_export_csv.py [tables] [days] [columns]
+#
+
+import os
+import shutil
+import sys
+import time
+from datetime import datetime, timedelta
+sys.path.append('..')
+
+from hecatoncheir import db
+from hecatoncheir.DbProfilerExp import export_csv
+from hecatoncheir.DbProfilerRepository import DbProfilerRepository
+from hecatoncheir.table import Table2
+
+
+def make_table_data(table_name, day, num_columns):
+    columns = []
+    for i in range(num_columns):
+        columns.append({'column_name': u'COLUMN_%d' % i,
+                        'data_type': [u'VARCHAR2', u'32'],
+                        'nulls': day % 7,
+                        'min': u'AAA',
+                        'max': u'ZZZ %d' % day,
+                        'cardinality': 100 + day,
+                        'validation': [{'description': u'rule %d' % i,
+                                        'invalid_count': day % 3}]})
+    ts = datetime(2017, 1, 1) + timedelta(days=day)
+    return {'table_name': table_name,
+            'timestamp': ts.strftime('%Y-%m-%dT%H:%M:%S.%f'),
+            'row_count': 1000 + day,
+            'columns': columns}
+
+
+def build(filename, num_tables, num_days, num_columns):
+    if os.path.exists(filename):
+        os.unlink(filename)
+    repo = DbProfilerRepository(filename)
+    repo.init()
+    with db.session():
+        for day in range(num_days):
+            for t in range(num_tables):
+                name = u'TABLE_%d' % t
+                Table2.create(u'DB', u'SCHEMA', name,
+                              make_table_data(name, day, num_columns))
+    return repo
+
+
+def main():
+    num_tables = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    num_days = int(sys.argv[2]) if len(sys.argv) > 2 else 730
+    num_columns = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    filename = 'bench_export_csv.db'
+    output_path = 'bench_export_csv'
+    t0 = time.time()
+    repo = build(filename, num_tables, num_days, num_columns)
+    print 'built %d snapshots in %.1f sec' % (num_tables * num_days,
+                                              time.time() - t0)
+
+    if not os.path.exists(output_path):
+        os.makedirs(output_path)
+    t0 = time.time()
+    export_csv(repo, tables=Table2.find_names(), output_path=output_path)
+    print 'exported in %.1f sec' % (time.time() - t0)
+
+    db.conn.close()
+    db.engine.dispose()
+    shutil.rmtree(output_path)
+    for f in [filename, filename + '-wal', filename + '-shm']:
+        if os.path.exists(f):
+            os.unlink(f)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python2.7
+# -*- coding: utf-8 -*-
+#
+# Harness to measure the time to link the glossary terms in the texts
+# of a table page with many glossary terms.
+#
+# Usage: bench_glossary_link.py [terms] [columns]
+#
+
+import sys
+import time
+sys.path.append('..')
+
+from hecatoncheir import DbProfilerFormatter
+
+
+def make_terms(num_terms):
+    terms = []
+    for i in range(num_terms):
+        terms.append({'term': u'TERM%d' % i,
+                      'description_short': u'description of term %d' % i,
+                      'synonyms': [u'用語%d' % i, u'synonym %d' % i]})
+    return terms
+
+
+def make_texts(num_columns):
+    texts = []
+    for i in range(num_columns):
+        texts.append(u'項目%d' % i)
+        texts.append(u'<p>Column %d holds TERM%d, which is also called '
+                     u'用語%d. See the description of the table for '
+                     u'the details of synonym %d.</p>' % (i, i, i * 7, i))
+    return texts
+
+
+def main():
+    num_terms = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    num_columns = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    terms = make_terms(num_terms)
+    texts = make_texts(num_columns)
+
+    t0 = time.time()
+    DbProfilerFormatter.get_term_matcher(terms)
+    print 'built the matcher of %d terms in %.1f msec' % (
+        num_terms, (time.time() - t0) * 1000)
+
+    t0 = time.time()
+    for text in texts:
+        DbProfilerFormatter.filter_glossaryterms(text, terms)
+    print 'linked %d texts in %.1f msec' % (len(texts),
+                                            (time.time() - t0) * 1000)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python2.7
+# -*- coding: utf-8 -*-
+#
+# Timing harness to compare rows/sec of Oracle array fetch sizes.
+#
+# Usage: bench_oracle_fetch.py <tnsname> <user> <pass> <query> [size...]
+#
+
+import sys
+import time
+sys.path.append('..')
+
+from hecatoncheir.oracle import OraDriver
+
+
+def fetch_all(ora, query, arraysize):
+    ora.fetch_sizes = {'bench': (arraysize, arraysize)}
+    cur = ora.cursor('bench')
+    t0 = time.time()
+    cur.execute(query)
+    rows = 0
+    while True:
+        rs = cur.fetchmany(arraysize)
+        if not rs:
+            break
+        rows += len(rs)
+    elapsed = time.time() - t0
+    cur.close()
+    return (rows, elapsed)
+
+
+def main():
+    if len(sys.argv) < 5:
+        print 'Usage: %s <tnsname> <user> <pass> <query> [size...]' % sys.argv[0]
+        sys.exit(1)
+
+    sizes = [int(x) for x in sys.argv[5:]] or [1, 10, 100, 1000, 10000]
+
+    ora = OraDriver.OraDriver(None, None, sys.argv[1], sys.argv[2],
+                              sys.argv[3])
+    ora.connect()
+
+    # warm up the buffer cache.
+    fetch_all(ora, sys.argv[4], max(sizes))
+
+    print '%10s %12s %10s %14s' % ('arraysize', 'rows', 'sec', 'rows/sec')
+    for size in sizes:
+        (rows, elapsed) = fetch_all(ora, sys.argv[4], size)
+        print '%10d %12d %10.3f %14.1f' % (size, rows, elapsed,
+                                          rows / elapsed if elapsed else 0)
+
+    ora.disconnect()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python2.7
+# -*- coding: utf-8 -*-
+#
+# Harness to compare the ingest throughput of a SQLite repository
+# with and without the PRAGMAs, the WAL mode and the write sessions.
+#
+# Usage: bench_repo_ingest.py [tables] [columns]
+#
+
+import os
+import sys
+import time
+sys.path.append('..')
+
+from hecatoncheir import db
+from hecatoncheir.repository import Repository
+from hecatoncheir.table import Table2
+
+
+def make_table_data(table_name, num_columns):
+    columns = []
+    for i in range(num_columns):
+        columns.append({'column_name': u'COLUMN_%d' % i,
+                        'data_type': [u'VARCHAR2', u'32'],
+                        'nulls': 0L,
+                        'min': u'AAA',
+                        'max': u'ZZZ',
+                        'cardinality': 100L,
+                        'validation': []})
+    return {'table_name': table_name,
+            'timestamp': u'2017-01-01T00:00:00',
+            'row_count': 1000L,
+            'tags': [u'tag1', u'tag2', u'tag3'],
+            'columns': columns}
+
+
+def create_tables(num_tables, num_columns):
+    for i in range(num_tables):
+        name = u'TABLE_%d' % i
+        t = Table2.create(u'DB', u'SCHEMA', name,
+                          make_table_data(name, num_columns))
+        t.update()
+
+
+def ingest(filename, pragmas, wal, batch, num_tables, num_columns):
+    if os.path.exists(filename):
+        os.unlink(filename)
+    db.sqlite_pragmas = pragmas
+    db.sqlite_wal = wal
+    db.creds = {'dbname': filename, 'use_sqlite': True}
+    db.connect()
+    Repository().create()
+
+    t0 = time.time()
+    if batch:
+        with db.session():
+            create_tables(num_tables, num_columns)
+    else:
+        create_tables(num_tables, num_columns)
+    elapsed = time.time() - t0
+
+    db.conn.close()
+    db.engine.dispose()
+    for f in [filename, filename + '-wal', filename + '-shm']:
+        if os.path.exists(f):
+            os.unlink(f)
+    return elapsed
+
+
+def main():
+    num_tables = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    num_columns = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+
+    default = db.sqlite_pragmas
+    print '%-24s %10s %12s' % ('mode', 'sec', 'tables/sec')
+    for mode, pragmas, wal, batch in [
+            ('no pragmas', [], False, False),
+            ('pragmas', default, False, False),
+            ('pragmas + session', default, False, True),
+            ('pragmas + WAL + session', default, True, True)]:
+        elapsed = ingest('bench_repo_ingest.db', pragmas, wal, batch,
+                         num_tables, num_columns)
+        print '%-24s %10.3f %12.1f' % (mode, elapsed, num_tables / elapsed)
+
+
+if __name__ == '__main__':
+    main()
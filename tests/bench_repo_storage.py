@@ -0,0 +1,104 @@
+#!/usr/bin/env python2.7
+# -*- coding: utf-8 -*-
+#
+# Harness to compare the file size and the load time of the repository
+# storing the table data in the plain JSON text and the compressed form.
+#
+# Usage: bench_repo_storage.py [tables] [snapshots] [columns]
+#
+
+import os
+import sys
+import time
+sys.path.append('..')
+
+from hecatoncheir import db
+from hecatoncheir import repository
+from hecatoncheir.repository import Repository
+from hecatoncheir.table import Table2
+
+
+def make_table_data(table_name, num_columns, n):
+    columns = []
+    for i in range(num_columns):
+        columns.append({'column_name': u'COLUMN_%d' % i,
+                        'column_name_nls': None,
+                        'comment': None,
+                        'data_type': [u'VARCHAR2', u'32'],
+                        'nulls': long(n),
+                        'min': u'AAA%d' % i,
+                        'max': u'ZZZ%d' % i,
+                        'cardinality': long(n * i),
+                        'most_freq_values': [{'value': u'V%d' % j,
+                                              'freq': long(j)}
+                                             for j in range(10)],
+                        'least_freq_values': [{'value': u'W%d' % j,
+                                               'freq': long(j)}
+                                              for j in range(10)],
+                        'validation': []})
+    return {'database_name': u'DB',
+            'schema_name': u'SCHEMA',
+            'table_name': table_name,
+            'table_name_nls': None,
+            'timestamp': u'2017-01-01T00:00:%02d' % n,
+            'row_count': long(n * 1000),
+            'comment': None,
+            'columns': columns,
+            'sample_rows': [[u'value %d-%d' % (r, c)
+                             for c in range(num_columns)]
+                            for r in range(10)]}
+
+
+def build(filename, compress, num_tables, num_snapshots, num_columns):
+    if os.path.exists(filename):
+        os.unlink(filename)
+    db.creds = {'dbname': filename, 'use_sqlite': True}
+    db.connect()
+    repository.compress_data = compress
+    Repository().create()
+    for n in range(num_snapshots):
+        for t in range(num_tables):
+            name = u'TABLE_%d' % t
+            Table2.create(u'DB', u'SCHEMA', name,
+                          make_table_data(name, num_columns, n))
+    db.conn.close()
+    db.conn = None
+    db.engine.dispose()
+
+
+def load(filename):
+    db.creds = {'dbname': filename, 'use_sqlite': True}
+    db.connect()
+    t0 = time.time()
+    tables = Table2.find()
+    elapsed = time.time() - t0
+    rows = 0
+    for r in db.conn.execute('SELECT data FROM repo'):
+        repository.decode_data(r[0])
+        rows += 1
+    elapsed_all = time.time() - t0 - elapsed
+    db.conn.close()
+    db.conn = None
+    db.engine.dispose()
+    return (len(tables), elapsed, rows, elapsed_all)
+
+
+def main():
+    num_tables = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    num_snapshots = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    num_columns = int(sys.argv[3]) if len(sys.argv) > 3 else 30
+
+    print '%6s %12s %10s %10s %10s' % ('format', 'bytes', 'find(s)',
+                                       'rows', 'decode(s)')
+    for fmt, compress in [('json', False), ('zlib', True)]:
+        filename = 'bench_repo_%s.db' % fmt
+        build(filename, compress, num_tables, num_snapshots, num_columns)
+        (tables, elapsed, rows, elapsed_all) = load(filename)
+        print '%6s %12d %10.3f %10d %10.3f' % (fmt,
+                                               os.path.getsize(filename),
+                                               elapsed, rows, elapsed_all)
+        os.unlink(filename)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python2.7
+# -*- coding: utf-8 -*-
+#
+# Harness to measure the response time of the catalog search
+# on a SQLite repository with many columns.
+#
+# Usage: bench_search.py [tables] [columns] [keyword...]
+#
+
+import os
+import sys
+import time
+sys.path.append('..')
+
+from hecatoncheir import db
+from hecatoncheir.repository import Repository
+from hecatoncheir.search import search
+from hecatoncheir.table import Table2
+
+
+def make_table_data(t, num_columns):
+    columns = []
+    for i in range(num_columns):
+        columns.append({'column_name': u'COLUMN_%d_%d' % (t, i),
+                        'column_name_nls': u'項目%d' % i,
+                        'comment': u'comment of column %d of %d' % (i, t),
+                        'data_type': [u'VARCHAR2', u'32'],
+                        'validation': []})
+    return {'table_name': u'TABLE_%d' % t,
+            'table_name_nls': u'テーブル%d' % t,
+            'comment': u'comment of table %d' % t,
+            'timestamp': u'2017-01-01T00:00:00',
+            'tags': [u'tag%d' % (t % 10)],
+            'columns': columns}
+
+
+def build(filename, num_tables, num_columns):
+    if os.path.exists(filename):
+        os.unlink(filename)
+    db.creds = {'dbname': filename, 'use_sqlite': True}
+    db.connect()
+    Repository().create()
+    with db.session():
+        for t in range(num_tables):
+            Table2.create(u'DB', u'SCHEMA', u'TABLE_%d' % t,
+                          make_table_data(t, num_columns))
+
+
+def main():
+    num_tables = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    num_columns = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    keywords = ([unicode(x, 'utf-8') for x in sys.argv[3:]] or
+                [u'COLUMN_1234_5', u'TABLE_42', u'tag3', u'comment table 99',
+                 u'項目7', u'nonexistent'])
+
+    filename = 'bench_search.db'
+    t0 = time.time()
+    build(filename, num_tables, num_columns)
+    print 'built %d columns in %.1f sec' % (num_tables * num_columns,
+                                            time.time() - t0)
+
+    print '%-24s %6s %10s' % ('keywords', 'hits', 'msec')
+    for k in keywords:
+        search(k)
+        t0 = time.time()
+        hits = search(k)
+        elapsed = time.time() - t0
+        print '%-24s %6d %10.2f' % (k.encode('utf-8'), len(hits),
+                                    elapsed * 1000)
+
+    db.conn.close()
+    db.engine.dispose()
+    for f in [filename, filename + '-wal', filename + '-shm']:
+        if os.path.exists(f):
+            os.unlink(f)
+
+
+if __name__ == '__main__':
+    main()
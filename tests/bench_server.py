@@ -0,0 +1,156 @@
+#!/usr/bin/env python2.7
+# -*- coding: utf-8 -*-
+#
+# Load test of dm-run-server on a SQLite repository, reporting
+# the p50 and p99 latencies of the main routes with the concurrent
+# clients, for the development server and the pooled server.
+#
+# Usage: bench_server.py [tables] [clients] [requests] [workers] [threads]
+#
+
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib2
+sys.path.append('..')
+
+from hecatoncheir import db
+from hecatoncheir.repository import Repository
+from hecatoncheir.table import Table2
+
+port = 18080
+
+routes = [('index', '/index.html'),
+          ('index page 2', '/index.html?page=2'),
+          ('table', '/DB.SCHEMA.TABLE_%d.html'),
+          ('tag', '/tag-tag3.html'),
+          ('glossary', '/glossary.html'),
+          ('search', '/api/search?q=TABLE_42'),
+          ('search index', '/search-index.json')]
+
+
+def make_table_data(t, num_columns):
+    columns = []
+    for i in range(num_columns):
+        columns.append({'column_name': u'COLUMN_%d' % i,
+                        'data_type': [u'VARCHAR2', u'32'],
+                        'nulls': 0L,
+                        'cardinality': 100L,
+                        'validation': []})
+    return {'database_name': u'DB',
+            'schema_name': u'SCHEMA',
+            'table_name': u'TABLE_%d' % t,
+            'table_name_nls': u'テーブル%d' % t,
+            'comment': u'comment of *table* %d' % t,
+            'timestamp': u'2017-01-01T00:00:00',
+            'row_count': 1000L,
+            'tags': [u'tag%d' % (t % 10)],
+            'columns': columns}
+
+
+def build(filename, num_tables):
+    for f in [filename, filename + '-wal', filename + '-shm']:
+        if os.path.exists(f):
+            os.unlink(f)
+    db.creds = {'dbname': filename, 'use_sqlite': True}
+    db.connect()
+    Repository().create()
+    with db.session():
+        for t in range(num_tables):
+            Table2.create(u'DB', u'SCHEMA', u'TABLE_%d' % t,
+                          make_table_data(t, 20))
+    db.conn.close()
+    db.engine.dispose()
+
+
+def start_server(filename, options):
+    env = dict(os.environ, PYTHONPATH='..')
+    devnull = open(os.devnull, 'w')
+    p = subprocess.Popen([sys.executable, '../dm-run-server'] + options +
+                         [filename, str(port)],
+                         stdout=devnull, stderr=devnull, env=env)
+    for i in range(300):
+        try:
+            urllib2.urlopen('http://127.0.0.1:%d/api/cache' % port).read()
+            return p
+        except IOError:
+            time.sleep(0.1)
+    p.terminate()
+    raise RuntimeError('the server did not start.')
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[int(round(p / 100.0 * (len(values) - 1)))]
+
+
+def run_clients(num_tables, num_clients, num_requests):
+    results = []
+    lock = threading.Lock()
+
+    def client(c):
+        for i in range(c, num_requests, num_clients):
+            label, path = routes[i % len(routes)]
+            if '%d' in path:
+                path = path % (i % num_tables)
+            t0 = time.time()
+            urllib2.urlopen('http://127.0.0.1:%d%s' % (port, path)).read()
+            with lock:
+                results.append((label, time.time() - t0))
+
+    # warm up the caches of all the workers.
+    for i in range(len(routes) * 4):
+        path = routes[i % len(routes)][1]
+        urllib2.urlopen('http://127.0.0.1:%d%s' %
+                        (port, path.replace('%d', '0'))).read()
+
+    clients = [threading.Thread(target=client, args=(c,))
+               for c in range(num_clients)]
+    t0 = time.time()
+    for c in clients:
+        c.start()
+    for c in clients:
+        c.join()
+    return results, time.time() - t0
+
+
+def main():
+    num_tables = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    num_clients = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    num_requests = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+    workers = sys.argv[4] if len(sys.argv) > 4 else '2'
+    threads = sys.argv[5] if len(sys.argv) > 5 else '10'
+
+    filename = os.path.abspath('bench_server.db')
+    build(filename, num_tables)
+
+    modes = [('development', ['--debug']),
+             ('%s workers x %s threads' % (workers, threads),
+              ['--workers', workers, '--threads', threads])]
+    for mode, options in modes:
+        p = start_server(filename, options)
+        try:
+            results, elapsed = run_clients(num_tables, num_clients,
+                                           num_requests)
+        finally:
+            p.terminate()
+            p.wait()
+
+        print '%s: %d requests by %d clients in %.1f sec (%.1f req/sec)' % (
+            mode, len(results), num_clients, elapsed, len(results) / elapsed)
+        print '  %-16s %10s %10s' % ('route', 'p50 msec', 'p99 msec')
+        for label, path in routes + [('all', None)]:
+            lat = [x[1] for x in results if label in ('all', x[0])]
+            print '  %-16s %10.1f %10.1f' % (label,
+                                             percentile(lat, 50) * 1000,
+                                             percentile(lat, 99) * 1000)
+
+    for f in [filename, filename + '-wal', filename + '-shm']:
+        if os.path.exists(f):
+            os.unlink(f)
+
+
+if __name__ == '__main__':
+    main()
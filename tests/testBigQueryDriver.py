@@ -3,12 +3,140 @@
 
 import os
 import sys
+import time
 import unittest
 sys.path.append('..')
 
+from hecatoncheir import DbProfilerBase
 from hecatoncheir.QueryResult import QueryResult
 from hecatoncheir.exception import DriverError, InternalError, QueryError, QueryTimeout
-from hecatoncheir.bigquery import BigQueryDriver
+from hecatoncheir.bigquery import BigQueryDriver, BigQueryProfiler
+
+
+class MockField:
+    def __init__(self, name, field_type='INTEGER'):
+        self.name = name
+        self.field_type = field_type
+
+
+class MockTable:
+    def __init__(self, columns, rows):
+        self.schema = [MockField(c) for c in columns]
+        self.rows = rows
+        self.num_rows = len(rows)
+
+
+class MockQueryJob:
+    """A query job which is finished after the latency (in seconds)"""
+    def __init__(self, query, columns, rows, latency, total_bytes):
+        self.query = query
+        self.columns = columns
+        self.rows = rows
+        self.finish_at = time.time() + latency
+        self.state = 'RUNNING'
+        self.total_bytes_processed = total_bytes
+
+    def done(self):
+        return time.time() >= self.finish_at
+
+    def result(self, timeout=None):
+        wait = self.finish_at - time.time()
+        if timeout and wait > timeout:
+            time.sleep(timeout)
+            raise Exception('Operation did not complete within '
+                            'the designated timeout.')
+        if wait > 0:
+            time.sleep(wait)
+        self.state = 'DONE'
+        return iter(self.rows)
+
+    def query_results(self):
+        return MockTable(self.columns, self.rows)
+
+
+class MockClient:
+    """A client of BigQuery without network access
+
+    Every query job returns a single row, [[1]], after the latency
+    unless the handler gives the columns and the rows for the query.
+    A query processes query_bytes, or 1/10 of that with TABLESAMPLE.
+    """
+    def __init__(self, latency=0, tables=None, handler=None,
+                 query_bytes=1000):
+        self.latency = latency
+        self.tables = tables if tables is not None else {}
+        self.handler = handler
+        self.query_bytes = query_bytes
+        self.jobs = []
+        self.dry_runs = []
+        self.get_table_count = 0
+
+    def query(self, query, job_config=None):
+        if 'nosuchtable' in query:
+            raise Exception('404 Not found: Table nosuchtable')
+        if job_config and job_config.dry_run:
+            self.dry_runs.append(query)
+            return MockQueryJob(query, [], [], 0, self.query_bytes)
+        self.job_config = job_config
+
+        columns, rows = ['c'], [[1]]
+        if self.handler:
+            columns, rows = self.handler(query)
+        total_bytes = self.query_bytes
+        if 'TABLESAMPLE' in query:
+            total_bytes /= 10
+        job = MockQueryJob(query, columns, rows, self.latency, total_bytes)
+        self.jobs.append(job)
+        return job
+
+    def dataset(self, dataset_id):
+        return dataset_id
+
+    def get_table(self, tab_ref):
+        self.get_table_count += 1
+        return self.tables[tab_ref]
+
+    def list_rows(self, tab, max_results=None):
+        return tab.rows[:max_results]
+
+
+class MockTableModule:
+    @staticmethod
+    def TableReference(ds, table_name):
+        return (ds, table_name)
+
+
+class MockQueryJobConfig:
+    dry_run = False
+    use_query_cache = True
+    query_parameters = []
+
+
+class MockDriverModule:
+    table = MockTableModule
+    QueryJobConfig = MockQueryJobConfig
+
+    @staticmethod
+    def ScalarQueryParameter(name, type_, value):
+        return (name, type_, value)
+
+
+class MockBigQueryDriver(BigQueryDriver.BigQueryDriver):
+    def __init__(self, project, client):
+        self.project = project
+        self.conn = client
+        self.driver = MockDriverModule
+
+    def connect(self):
+        return True
+
+
+class MockBigQueryProfiler(BigQueryProfiler.BigQueryProfiler):
+    def __init__(self, client):
+        DbProfilerBase.DbProfilerBase.__init__(self, None, None, u'proj',
+                                               None, None)
+        self.dbdriver = MockBigQueryDriver('proj', client)
+        self.dbconn = client
 
 class TestBigQueryDriver(unittest.TestCase):
     dbname = None
@@ -87,6 +215,149 @@ class TestBigQueryDriver(unittest.TestCase):
         self.assertEqual('c', rs.column_names[0])
         self.assertEqual(1, rs.resultset[0][0])
 
+    def test_query_to_resultset_002(self):
+        # named query parameters
+        bq = MockBigQueryDriver('proj', MockClient())
+        rs = bq.query_to_resultset(u'select %(a)s as c, %(b)s as d',
+                                   params={'a': u'x', 'b': 1})
+        self.assertEqual([[1]], rs.resultset)
+        self.assertEqual(u'select @a as c, @b as d', bq.conn.jobs[0].query)
+        self.assertEqual([('a', 'STRING', u'x'), ('b', 'INT64', 1)],
+                         bq.conn.job_config.query_parameters)
+
+        # no parameter
+        bq.query_to_resultset(u'select 1 as c')
+        self.assertEqual(u'select 1 as c', bq.conn.jobs[1].query)
+        self.assertIsNone(bq.conn.job_config)
+
+    def test_queries_to_resultsets_001(self):
+        bq = MockBigQueryDriver('proj', MockClient(latency=0.2))
+        queries = {}
+        for i in range(10):
+            queries['c%d' % i] = u'select %d as c' % i
+
+        rs = bq.queries_to_resultsets(queries)
+        self.assertEqual(sorted(queries.keys()), sorted(rs.keys()))
+        self.assertEqual(u'select 3 as c', rs['c3'].query)
+        self.assertEqual(('c',), rs['c3'].column_names)
+        self.assertEqual([[1]], rs['c3'].resultset)
+        self.assertEqual(10, len(bq.conn.jobs))
+
+        # empty
+        self.assertEqual({}, bq.queries_to_resultsets({}))
+
+        # exception
+        with self.assertRaises(QueryError) as cm:
+            bq.queries_to_resultsets({'a': u'select * from nosuchtable'})
+        self.assertEqual('Could not execute a query: 404 Not found: Table nosuchtable', cm.exception.value)
+
+        # query timeout
+        bq = MockBigQueryDriver('proj', MockClient(latency=5))
+        with self.assertRaises(QueryTimeout) as cm:
+            bq.queries_to_resultsets({'a': u'select 1 as c'}, timeout=0.3)
+        self.assertEqual('Query timeout: select 1 as c', cm.exception.value)
+
+    def test_queries_to_resultsets_002(self):
+        # concurrent jobs vs. the jobs one by one
+        queries = {}
+        for i in range(10):
+            queries['c%d' % i] = u'select %d as c' % i
+
+        bq = MockBigQueryDriver('proj', MockClient(latency=0.1))
+        bq.max_concurrent_jobs = 1
+        t0 = time.time()
+        bq.queries_to_resultsets(queries)
+        serial = time.time() - t0
+
+        bq = MockBigQueryDriver('proj', MockClient(latency=0.1))
+        t0 = time.time()
+        bq.queries_to_resultsets(queries)
+        concurrent = time.time() - t0
+
+        self.assertTrue(serial >= 1.0)
+        self.assertTrue(concurrent < serial / 2)
+
+    def test_get_table_001(self):
+        # table resource is fetched only once
+        tab = MockTable(['a', 'b'], [[1, 2], [3, 4]])
+        client = MockClient(tables={('ds', 't'): tab})
+        p = MockBigQueryProfiler(client)
+
+        self.assertEqual(['a', 'b'], p.get_column_names('ds', 't'))
+        self.assertEqual([['a', 'b'], [1, 2]],
+                         p.get_sample_rows('ds', 't', rows_limit=1))
+        self.assertEqual({'a': ['INTEGER', 0], 'b': ['INTEGER', 0]},
+                         p.get_column_datatypes('ds', 't'))
+        self.assertEqual(2, p.get_row_count('ds', 't'))
+        self.assertEqual(1, client.get_table_count)
+
+        self.assertEqual({'a': 1, 'b': 1},
+                         p.get_column_cardinalities('ds', 't'))
+        self.assertEqual({'a': [[1]], 'b': [[1]]},
+                         p.get_column_most_freq_values('ds', 't'))
+        self.assertEqual(4, len(client.jobs))
+
+    def test_dry_run_001(self):
+        bq = MockBigQueryDriver('proj', MockClient(query_bytes=1234))
+        self.assertEqual(1234, bq.dry_run(u'select 1 as c'))
+        self.assertEqual([u'select 1 as c'], bq.conn.dry_runs)
+        self.assertEqual([], bq.conn.jobs)
+        self.assertEqual(0, bq.bytes_processed)
+
+        bq.q2rs(u'select 1 as c')
+        self.assertEqual(1234, bq.bytes_processed)
+
+        # exception
+        with self.assertRaises(QueryError) as cm:
+            bq.dry_run(u'select * from nosuchtable')
+        self.assertEqual('Could not execute a query: 404 Not found: Table nosuchtable', cm.exception.value)
+
+    def test_max_bytes_001(self):
+        def handler(query):
+            if 'COUNT(CASE' in query:
+                return (['a_nulls', 'a_min', 'a_max',
+                         'b_nulls', 'b_min', 'b_max'],
+                        [[0, 1, 9, 2, 3, 4]])
+            if 'GROUP BY' in query:
+                return (['v', 'count'], [[1, 3]])
+            return (['c'], [[5]])
+
+        tab = MockTable(['a', 'b'], [[1, 2], [3, 4]])
+        client = MockClient(tables={('ds', 't'): tab}, handler=handler)
+        p = MockBigQueryProfiler(client)
+        p.max_table_bytes = 2300
+
+        data = p.run(u'ds', u't')
+        self.assertEqual({'projected': 2300,
+                          'processed': 2300,
+                          'sample_percent': 10,
+                          'sampled': [u'cardinality(b)',
+                                      u'most_freq(a)', u'most_freq(b)'],
+                          'skipped': [u'least_freq(a)', u'least_freq(b)']},
+                         data['scan_bytes'])
+        self.assertEqual(7, len(client.dry_runs))
+        self.assertEqual(5, len(client.jobs))
+
+        self.assertEqual(2, data['columns'][1]['nulls'])
+        self.assertEqual(5, data['columns'][1]['cardinality'])
+        self.assertTrue(data['columns'][1]['cardinality_approx'])
+        self.assertFalse('cardinality_approx' in data['columns'][0])
+        # the most freq values are kept without the least freq ones,
+        # and scaled from the sample.
+        self.assertEqual([{'freq': 30, 'value': 1}],
+                         data['columns'][1]['most_freq_vals'])
+        self.assertEqual([], data['columns'][1]['least_freq_vals'])
+
+        # the budget for the run is exhausted.
+        p.max_table_bytes = None
+        p.max_bytes = 2300
+        p.column_cache = None
+        data = p.run(u'ds', u't')
+        self.assertEqual(0, data['scan_bytes']['projected'])
+        self.assertEqual(0, data['scan_bytes']['processed'])
+        self.assertEqual(7, len(data['scan_bytes']['skipped']))
+        self.assertEqual(None, data['columns'][1]['nulls'])
+
     def test_disconnect_001(self):
         bq = BigQueryDriver.BigQueryDriver(self.dbname, self.dbuser, self.dbpass)
         conn = bq.connect()
@@ -60,6 +60,43 @@ class TestDbProfilerBase(unittest.TestCase):
         self.assertEqual(10, len(cm.least_freq_values))
         self.assertEqual(28, cm.cardinality)
 
+    def test_run_column_profiling_002(self):
+        # column groups profiled concurrently
+        p = PgProfiler.PgProfiler(self.host, self.port, self.dbname, self.user, self.passwd)
+        self.assertTrue(p.connect())
+        p.max_select_expressions = 7
+        p.column_group_workers = 2
+
+        tablemeta = TableMeta(self.dbname, u'public', u'customer')
+        tablemeta.column_names = ['c_custkey','c_name','c_address','c_nationkey','c_phone','c_acctbal','c_mktsegment','c_comment']
+        for col in tablemeta.column_names:
+            tablemeta.columns.append(TableColumnMeta(unicode(col)))
+
+        count = p.dbdriver.get_statement_stats()['execute']
+        self.assertTrue(p.run_column_profiling(tablemeta))
+        # 4 column groups queried on the other connections are counted.
+        self.assertTrue(p.dbdriver.get_statement_stats()['execute'] >= count + 4)
+        cm = tablemeta.get_column_meta('c_custkey')
+        self.assertEqual(0, cm.nulls)
+        self.assertEqual('3373', cm.min)
+        self.assertEqual('147004', cm.max)
+
+    def test__get_column_groups_001(self):
+        p = PgProfiler.PgProfiler(self.host, self.port, self.dbname, self.user, self.passwd)
+        cols = ['c%d' % i for i in range(1500)]
+
+        # 1663 / 3 = 554 columns per group
+        groups = p._get_column_groups(cols)
+        self.assertEqual([554, 554, 392], [len(g) for g in groups])
+        self.assertEqual(cols, sum(groups, []))
+
+        p.max_select_expressions = 1000
+        self.assertEqual([333, 333, 333, 333, 168],
+                         [len(g) for g in p._get_column_groups(cols)])
+
+        p.max_select_expressions = None
+        self.assertEqual([cols], p._get_column_groups(cols))
+
     def test__run_record_validation_001(self):
         p = PgProfiler.PgProfiler(self.host, self.port, self.dbname, self.user, self.passwd)
         self.assertTrue(p.connect())
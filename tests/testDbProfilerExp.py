@@ -1,6 +1,7 @@
 #!/usr/bin/env python2.7
 # -*- coding: utf-8 -*-
 
+import gzip
 import json
 import os
 import sys
@@ -13,7 +14,8 @@ from hecatoncheir.repository import Repository
 from hecatoncheir.table import Table2
 from hecatoncheir.tag import Tag2
 from hecatoncheir.schema import Schema2
-from hecatoncheir.DbProfilerExp import export_html
+from hecatoncheir.CSVUtils import list2csv
+from hecatoncheir.DbProfilerExp import export_csv, export_html, export_json
 
 class TestDbProfilerExp(unittest.TestCase):
     repo = None
@@ -233,5 +235,190 @@ class TestDbProfilerExp(unittest.TestCase):
                                     template_path='../hecatoncheir/templates/en',
                                     output_title=self.repo.filename, output_path='./out/export_html_005'))
 
+    def testExport_html_006(self):
+        for name in [u't1', u't2']:
+            t = {}
+            t['database_name'] = u'test_database'
+            t['schema_name'] = u'test_schema'
+            t['table_name'] = name
+            t['timestamp'] = '2016-04-27T10:06:41.653836'
+            t['row_count'] = 0
+            t['columns'] = []
+            t['tags'] = [name]
+            Table2.create(u'test_database', u'test_schema', name, t)
+
+        table_list = [(x.database_name, x.schema_name, x.table_name)
+                      for x in Table2.find()]
+        output_path = './out/export_html_006'
+        if not os.path.exists(output_path):
+            os.makedirs(output_path)
+
+        def export(force=False):
+            # mark the pages to see which ones are generated again.
+            for f in os.listdir(output_path):
+                if f.endswith('.html'):
+                    open(output_path + '/' + f, 'a').write('<!-- old -->')
+            self.assertTrue(export_html(self.repo, tables=table_list,
+                                        template_path='../hecatoncheir/templates/en',
+                                        output_title=self.repo.filename,
+                                        output_path=output_path, force=force))
+            return sorted([f for f in os.listdir(output_path)
+                           if f.endswith('.html') and
+                           not open(output_path + '/' + f).read().endswith('<!-- old -->')])
+
+        export(force=True)
+        manifest = json.load(open(output_path + '/.manifest.json'))
+        self.assertEqual(11, len([x for x in manifest
+                                  if x.endswith('.html')]))
+        self.assertTrue(u'test_database.test_schema.t1.html' in manifest)
+        self.assertTrue(u'search-index.json' in manifest)
+
+        # nothing changed.
+        self.assertEqual([], export())
+
+        # the table page and the index pages showing the table.
+        t = Table2.find(u'test_database', u'test_schema', u't2')[0]
+        t.data['row_count'] = 10
+        t.update()
+        self.assertEqual(['index-schemas.html', 'index-tags.html',
+                          'index.html', 'tag-t2.html',
+                          'test_database.test_schema.html',
+                          'test_database.test_schema.t2.html'],
+                         export())
+
+        self.assertEqual(11, len(export(force=True)))
+
+    def testExport_html_007(self):
+        # the table pages rendered in the worker processes.
+        for name in [u't1', u't2', u't3']:
+            t = {}
+            t['database_name'] = u'test_database'
+            t['schema_name'] = u'test_schema'
+            t['table_name'] = name
+            t['timestamp'] = '2016-04-27T10:06:41.653836'
+            t['row_count'] = 0
+            t['columns'] = []
+            t['comment'] = u'comment of %s' % name
+            Table2.create(u'test_database', u'test_schema', name, t)
+
+        table_list = Table2.find_names()
+        output_path = './out/export_html_007'
+        if not os.path.exists(output_path):
+            os.makedirs(output_path)
+
+        self.assertTrue(export_html(self.repo, tables=table_list,
+                                    template_path='../hecatoncheir/templates/en',
+                                    output_title=self.repo.filename,
+                                    output_path=output_path, jobs=2,
+                                    force=True))
+        manifest = json.load(open(output_path + '/.manifest.json'))
+        for name in [u't1', u't2', u't3']:
+            filename = u'test_database.test_schema.%s.html' % name
+            self.assertTrue(filename in manifest)
+            html = open(output_path + '/' + filename).read()
+            self.assertTrue(html.find('comment of %s' % name) > 0)
+
+    def testExport_json_001(self):
+        for name in [u't2', u't1']:
+            Table2.create(u'test_database', u'test_schema', name,
+                          {'table_name': name, 'columns': []})
+
+        table_list = Table2.find_names()
+        output_path = './out/export_json_001'
+        if not os.path.exists(output_path):
+            os.makedirs(output_path)
+
+        self.assertTrue(export_json(self.repo, tables=table_list,
+                                    output_path=output_path))
+        data = json.load(open(output_path + '/EXPORT.JSON'))
+        self.assertEqual([u't1', u't2'], [x['table_name'] for x in data])
+
+        # a table in each line, compressed.
+        self.assertTrue(export_json(self.repo, tables=table_list,
+                                    output_path=output_path,
+                                    ndjson=True, compress=True))
+        lines = gzip.open(output_path + '/EXPORT.NDJSON.gz').readlines()
+        self.assertEqual([u't1', u't2'],
+                         [json.loads(x)['table_name'] for x in lines])
+
+        self.assertTrue(export_json(self.repo, tables=[],
+                                    output_path=output_path))
+        self.assertEqual([], json.load(open(output_path + '/EXPORT.JSON')))
+
+    def testExport_csv_001(self):
+        for ts in ['2016-04-27', '2016-04-28']:
+            t = {}
+            t['database_name'] = u'test_database'
+            t['schema_name'] = u'test_schema'
+            t['table_name'] = u't1'
+            t['timestamp'] = ts + 'T10:06:41.653836'
+            t['row_count'] = int(ts[-2:])
+            t['columns'] = [{'column_name': u'c1',
+                             'data_type': [u'varchar', 32],
+                             'min': u'a,"b"', 'max': u'c\r\nd\ne',
+                             'nulls': 1, 'cardinality': None,
+                             'validation': [{'description': u'x, y',
+                                             'invalid_count': 2}]}]
+            Table2.create(u'test_database', u'test_schema', u't1', t)
+
+        table_list = Table2.find_names()
+        output_path = './out/export_csv_001'
+        if not os.path.exists(output_path):
+            os.makedirs(output_path)
+
+        def export(**kwargs):
+            self.assertTrue(export_csv(self.repo, tables=table_list,
+                                       output_path=output_path, **kwargs))
+            return [open(output_path + '/' + x, 'rb').read()
+                    for x in ['TABLE_META.CSV', 'TABLE_COLUMN_META.CSV',
+                              'TABLE_COLUMN_VALIDATION.CSV']]
+
+        def lines(rows):
+            return ''.join([list2csv(x).encode('utf-8') + '\n'
+                            for x in rows])
+
+        key = [u'test_database', u'test_schema', u't1']
+        (f_tab, f, f2) = export()
+        # same as the lines written by list2csv, ending with LF.
+        self.assertEqual(lines([[u'TIMESTAMP', u'DATABASE_NAME',
+                                 u'SCHEMA_NAME', u'TABLE_NAME',
+                                 u'ROW_COUNT'],
+                                [u'2016-04-28 10:06:41'] + key + [28],
+                                [u'2016-04-27 10:06:41'] + key + [27]]),
+                         f_tab)
+        self.assertEqual(lines([[u'TIMESTAMP', u'DATABASE_NAME',
+                                 u'SCHEMA_NAME', u'TABLE_NAME',
+                                 u'COLUMN_NAME', u'DATA_TYPE', u'DATA_LEN',
+                                 u'MIN', u'MAX', u'NULLS', u'NON_NULLS',
+                                 u'CARDINARLITY'],
+                                [u'2016-04-28 10:06:41'] + key +
+                                [u'c1', u'varchar', 32, u'a,"b"',
+                                 u'c\r\nd\ne', 1, 27, None],
+                                [u'2016-04-27 10:06:41'] + key +
+                                [u'c1', u'varchar', 32, u'a,"b"',
+                                 u'c\r\nd\ne', 1, 26, None]]),
+                         f)
+        self.assertTrue('"c\r\nd\ne"' in f)
+        self.assertEqual(lines([[u'TIMESTAMP', u'DATABASE_NAME',
+                                 u'SCHEMA_NAME', u'TABLE_NAME',
+                                 u'COLUMN_NAME', u'VALIDATION_RULE',
+                                 u'INVALID_RECORDS'],
+                                [u'2016-04-28 10:06:41'] + key +
+                                [u'c1', u'x, y', 2],
+                                [u'2016-04-27 10:06:41'] + key +
+                                [u'c1', u'x, y', 2]]),
+                         f2)
+
+        (f_tab, f, f2) = export(since='2016-04-28')
+        self.assertEqual(['28'], [x.split(',')[-1]
+                                  for x in f_tab.splitlines()[1:]])
+
+        (f_tab, f, f2) = export(until='2016-04-28')
+        self.assertEqual(['27'], [x.split(',')[-1]
+                                  for x in f_tab.splitlines()[1:]])
+
+        (f_tab, f, f2) = export(since='2016-04-29')
+        self.assertEqual(1, len(f_tab.splitlines()))
+
 if __name__ == '__main__':
     unittest.main()
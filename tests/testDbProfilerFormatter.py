@@ -4,7 +4,9 @@
 import json
 import os
 import re
+import shutil
 import sys
+import tempfile
 import unittest
 sys.path.append('..')
 
@@ -33,6 +35,22 @@ class TestDbProfilerFormatter(unittest.TestCase):
         self.assertEqual('N/A', DbProfilerFormatter.format_cardinality(100,None,50))
         self.assertEqual('N/A', DbProfilerFormatter.format_cardinality(100,25,None))
 
+    def test_format_column_metadata_001(self):
+        colmeta = {'column_name': u'c1',
+                   'data_type': [u'INTEGER', 0],
+                   'nulls': 0L,
+                   'cardinality': 25L}
+        tabmeta = {'database_name': u'd'}
+        col = DbProfilerFormatter.format_column_metadata(colmeta, tabmeta,
+                                                         100, [], [])
+        self.assertEqual('25.00 %', col['cardinality'])
+
+        # approximation from the sample
+        colmeta['cardinality_approx'] = True
+        col = DbProfilerFormatter.format_column_metadata(colmeta, tabmeta,
+                                                         100, [], [])
+        self.assertEqual(u'\u2248 25.00 %', col['cardinality'])
+
     def test_format_value_freq_ratio_001(self):
         self.assertEqual('0.00 %', DbProfilerFormatter.format_value_freq_ratio(100,0,0))
         self.assertEqual('50.00 %', DbProfilerFormatter.format_value_freq_ratio(100,0,50))
@@ -59,6 +77,18 @@ class TestDbProfilerFormatter(unittest.TestCase):
         a = '<h1>title 1</h1>'
         self.assertEqual(a, DbProfilerFormatter.filter_markdown2html(md))
 
+    def test_render_markdown_001(self):
+        DbProfilerFormatter.markdown_cache.clear()
+        a = (u'<p><em>foo</em> bar</p>', u'  foo  bar ')
+        b = DbProfilerFormatter.render_markdown(u'*foo* bar')
+        self.assertEqual(a, b)
+        # rendered only once.
+        self.assertTrue(b is DbProfilerFormatter.render_markdown(u'*foo* bar'))
+        self.assertEqual(1, len(DbProfilerFormatter.markdown_cache))
+
+        self.assertEqual(u'  foo  bar...',
+                         DbProfilerFormatter.format_comment_tooltip(u'*foo* bar', 10))
+
     def test_filter_term2popover_001(self):
         a = ('aaa <a tabindex="0" data-toggle="popover" data-trigger="focus" data-html="true" title="abc" data-content="xyz" class="glossary-term">abc</a> bbb', 140)
         b = DbProfilerFormatter.filter_term2popover('aaa abc bbb', 4, 'abc', 'xyz')
@@ -98,6 +128,28 @@ class TestDbProfilerFormatter(unittest.TestCase):
         a = u'foo <a tabindex="0" data-toggle="popover" data-trigger="focus" data-html="true" title="PV" data-content="Page Views<br/><div align=right><a href=\'glossary.html#PV\' target=\'_glossary\'>Details...</a></div>" class="glossary-term">PV</a> bar'
         self.assertEqual(a, DbProfilerFormatter.filter_glossaryterms(html, terms))
 
+    def test_filter_glossaryterms_002(self):
+        terms = [{'term': u'PV', 'description_short': u'Page Views',
+                  'synonyms': [u'Page View', u'']},
+                 {'term': u'Page', 'description_short': u'Web Page'},
+                 {'term': u'PVS', 'description_short': u'Sessions'}]
+
+        def popover(word, title, desc):
+            return (u'<a tabindex="0" data-toggle="popover" data-trigger="focus" data-html="true" title="%s" '
+                    u'data-content="%s<br/>%s<div align=right><a href=\'glossary.html#%s\' target=\'_glossary\'>Details...</a></div>" '
+                    u'class="glossary-term">%s</a>' %
+                    (title, desc, (u'<br/>Synonym: Page View, ' if title == u'PV' else u''), title, word))
+
+        # the leftmost, and then the longest one is replaced.
+        html = u'PVS, Page Views and Page'
+        a = (popover(u'PVS', u'PVS', u'Sessions') + u', ' +
+             popover(u'Page View', u'PV', u'Page Views') + u's and ' +
+             popover(u'Page', u'Page', u'Web Page'))
+        self.assertEqual(a, DbProfilerFormatter.filter_glossaryterms(html, terms))
+
+        self.assertEqual(u'', DbProfilerFormatter.filter_glossaryterms(None, terms))
+        self.assertEqual(u'foo', DbProfilerFormatter.filter_glossaryterms(u'foo', []))
+
     def test_format_number_001(self):
         self.assertEqual('1', DbProfilerFormatter.format_number('001'))
         self.assertEqual('100', DbProfilerFormatter.format_number('100'))
@@ -566,6 +618,85 @@ class TestDbProfilerFormatter(unittest.TestCase):
         self.assertTrue(re.search(u'Attached files:', html))
         self.assertTrue(re.search(u'<li><a href="attachments/bbb.txt">bbb.txt</a></li>', html))
 
+    def test_to_index_html_006(self):
+        invalid = [{'label': 'r1', 'column_names': ['c1'],
+                    'rule': ['c1', 'regexp', '^\d+$'], 'invalid_count': 1,
+                    'description': None}]
+        data = [{'database_name': 'd', 'schema_name': 's',
+                 'table_name': 't%d' % i,
+                 'timestamp': '2016-05-01T16:15:18.028309',
+                 'columns': [{'column_name': 'c1',
+                              'validation': invalid if i == 4 else []}]}
+                for i in range(5)]
+        urls = ['index.html', 'index-2.html', 'index-3.html']
+
+        # only the tables in the page are listed.
+        html = DbProfilerFormatter.to_index_html(data, reponame='testrepo',
+                                                 show_validation='both',
+                                                 page=2, page_size=2,
+                                                 page_urls=urls,
+                                                 search_index='search-index.json',
+                                                 search_scope={'tag': 'x'})
+#        print(html)
+        self.assertEqual(['t2', 't3'],
+                         re.findall('<td><a href="d.s.(t\d).html"', html))
+        self.assertTrue(html.find('<li class="active"><a href="index-2.html">2</a></li>') > 0)
+        self.assertTrue(html.find(u'<li><a href="index-3.html">»</a></li>') > 0)
+        self.assertTrue(html.find('data-index="search-index.json"') > 0)
+        self.assertTrue(html.find('var catalog_scope = {"tag": "x"};') > 0)
+        # the validation results are counted in all the tables.
+        self.assertTrue(html.find('validation-invalid.html') > 0)
+
+        # counted once for all the pages by the caller.
+        html = DbProfilerFormatter.to_index_html(data, reponame='testrepo',
+                                                 show_validation='both',
+                                                 page=2, page_size=2,
+                                                 page_urls=urls,
+                                                 validation_counts=(0, 0))
+        self.assertTrue(html.find('validation-invalid.html') < 0)
+
+        # the last page.
+        html = DbProfilerFormatter.to_index_html(data, reponame='testrepo',
+                                                 page=3, page_size=2,
+                                                 page_urls=urls)
+        self.assertEqual(['t4'],
+                         re.findall('<td><a href="d.s.(t\d).html"', html))
+        self.assertTrue(html.find(u'<li class="disabled"><span>»</span></li>') > 0)
+
+        # not paginated within a page.
+        html = DbProfilerFormatter.to_index_html(data, reponame='testrepo',
+                                                 page_size=5,
+                                                 search_index='search-index.json')
+        self.assertEqual(5, len(re.findall('<td><a href="d.s.(t\d).html"', html)))
+        self.assertTrue(html.find('pagination') < 0)
+        self.assertTrue(html.find('catalog-search') < 0)
+
+    def test_format_pagination_001(self):
+        urls = ['p%d' % i for i in range(1, 11)]
+        links = DbProfilerFormatter.format_pagination(5, urls, window=1)
+        self.assertEqual([u'«', 1, u'…', 4, 5, 6, u'…', 10,
+                          u'»'], [x['label'] for x in links])
+        self.assertEqual(['p4', 'p1', None, 'p4', 'p5', 'p6', None, 'p10',
+                          'p6'], [x['url'] for x in links])
+        self.assertEqual([5], [x['label'] for x in links if x.get('active')])
+
+    def test_to_search_index_001(self):
+        data = [{'database_name': 'd', 'schema_name': 's',
+                 'table_name': 't1', 'table_name_nls': u'テーブル',
+                 'timestamp': '2016-05-01T16:15:18.028309',
+                 'row_count': 1000, 'tags': ['a', ''],
+                 'comment': 'this is *table* comment.',
+                 'columns': [{'column_name': 'c1',
+                              'validation': [{'invalid_count': 0}]}]}]
+        index = json.loads(DbProfilerFormatter.to_search_index(data))
+        self.assertEqual(['database_name', 'schema_name', 'table_name',
+                          'table_name_nls', 'tags', 'row_count',
+                          'num_columns', 'timestamp', 'validation',
+                          'comment'], index['fields'])
+        self.assertEqual([['d', 's', 't1', u'テーブル',
+                           ['a'], '1,000', 1, '2016-05-01 16:15', 'valid',
+                           'this is  table  comment.']], index['tables'])
+
     def test_to_glossary_html_001(self):
         data = None
         self.assertIsNotNone(DbProfilerFormatter.to_glossary_html(data))
@@ -602,5 +733,25 @@ class TestDbProfilerFormatter(unittest.TestCase):
         a = u'<td class="wrap"><a name="Term2"></a>Term2</td>'
         self.assertIsNotNone(re.search(a, html))
 
+    def test_get_template_from_file_001(self):
+        d = tempfile.mkdtemp()
+        try:
+            f = d + '/templ_test.html'
+            open(f, 'w').write('{{ a }}')
+            t = DbProfilerFormatter.get_template_from_file(f)
+            self.assertEqual(u'1', t.render(a=1))
+            # compiled only once.
+            self.assertTrue(t is DbProfilerFormatter.get_template_from_file(f))
+
+            # compiled again when the file is modified.
+            open(f, 'w').write('[{{ a }}]')
+            os.utime(f, (0, 0))
+            self.assertEqual(u'[1]', DbProfilerFormatter.get_template_from_file(f).render(a=1))
+
+            with self.assertRaises(DbProfilerException) as cm:
+                DbProfilerFormatter.get_template_from_file(d + '/nosuchfile')
+        finally:
+            shutil.rmtree(d)
+
 if __name__ == '__main__':
     unittest.main()
@@ -11,6 +11,7 @@ import sqlalchemy as sa
 
 from hecatoncheir import DbProfilerRepository
 from hecatoncheir.exception import InternalError
+from hecatoncheir.repository import decode_data, encode_delta
 from hecatoncheir import db
 from hecatoncheir.table import Table2
 from hecatoncheir.validation import ValidationRule
@@ -123,11 +124,130 @@ class TestDbProfilerRepository(unittest.TestCase):
         self.assertEqual('2016-04-27T10:06:41.653836', thist[1]['timestamp'])
         self.assertEqual('2016-04-26T10:06:41.653836', thist[2]['timestamp']) # oldest
 
+        # the names are bound, not embedded in the query.
+        self.assertEqual([], self.repo.get_table_history('test\'_database', 'test_schema', 'test_table'))
+
         # fail
+        db.conn.execute('DROP TABLE repo_columns')
+        db.conn.execute('DROP TABLE repo')
         with self.assertRaises(InternalError) as cm:
-            self.repo.get_table_history('test\'_database', 'test_schema', 'test_table')
+            self.repo.get_table_history('test_database', 'test_schema', 'test_table')
         self.assertTrue(cm.exception.value.startswith("Could not get table data with its history: "))
 
+    def testGet_table_history_002(self):
+        for ts in ['2016-04-26', '2016-04-27', '2016-04-28', '2016-04-29']:
+            t = {}
+            t['database_name'] = u'test_database'
+            t['schema_name'] = u'test_schema'
+            t['table_name'] = u'test_table'
+            t['timestamp'] = ts + 'T10:06:41.653836'
+            Table2.create(t['database_name'], t['schema_name'], t['table_name'], t)
+
+        thist = self.repo.get_table_history('test_database', 'test_schema', 'test_table',
+                                            since='2016-04-27', until='2016-04-29')
+        self.assertEqual(['2016-04-28T10:06:41.653836', '2016-04-27T10:06:41.653836'],
+                         [x['timestamp'] for x in thist])
+
+        thist = self.repo.get_table_history('test_database', 'test_schema', 'test_table',
+                                            limit=2, offset=1)
+        self.assertEqual(['2016-04-28T10:06:41.653836', '2016-04-27T10:06:41.653836'],
+                         [x['timestamp'] for x in thist])
+
+        # lazy
+        thist = self.repo.iter_table_history('test_database', 'test_schema', 'test_table')
+        self.assertEqual('2016-04-29T10:06:41.653836', next(thist)['timestamp'])
+
+    def testGet_table_history_003(self):
+        # deltas are decoded with the snapshots created next.
+        for ts in ['2016-04-28', '2016-04-26', '2016-04-27', '2016-04-29', '2016-04-30']:
+            t = {}
+            t['database_name'] = u'test_database'
+            t['schema_name'] = u'test_schema'
+            t['table_name'] = u'test_table'
+            t['timestamp'] = ts + 'T10:06:41.653836'
+            t['row_count'] = int(ts[-2:])
+            Table2.create(t['database_name'], t['schema_name'], t['table_name'], t)
+
+        rs = db.conn.execute('SELECT created_at, data FROM repo ORDER BY created_at DESC').fetchall()
+        for i in range(2, len(rs)):
+            db.conn.execute(sa.text('UPDATE repo SET data = :d WHERE created_at = :c'),
+                            d=encode_delta(decode_data(rs[i][1]), decode_data(rs[i - 1][1])),
+                            c=rs[i][0])
+
+        thist = self.repo.get_table_history('test_database', 'test_schema', 'test_table',
+                                            offset=1)
+        self.assertEqual([29, 28, 27, 26], [x['row_count'] for x in thist])
+
+    def testIter_tables_history_001(self):
+        # created out of the order of the timestamps.
+        for tn in [u't1', u't2']:
+            for ts in ['2016-04-26', '2016-04-28', '2016-04-27', '2016-04-29']:
+                t = {}
+                t['database_name'] = u'test_database'
+                t['schema_name'] = u'test_schema'
+                t['table_name'] = tn
+                t['timestamp'] = ts + 'T10:06:41.653836'
+                t['row_count'] = int(ts[-2:])
+                Table2.create(t['database_name'], t['schema_name'], t['table_name'], t)
+
+        # deltas of t2 are decoded with their successors.
+        rs = db.conn.execute("SELECT created_at, data FROM repo WHERE table_name = 't2' ORDER BY created_at DESC").fetchall()
+        for i in range(1, len(rs)):
+            db.conn.execute(sa.text('UPDATE repo SET data = :d WHERE created_at = :c'),
+                            d=encode_delta(decode_data(rs[i][1]), decode_data(rs[i - 1][1])),
+                            c=rs[i][0])
+
+        thist = self.repo.iter_tables_history()
+        self.assertEqual([(u't1', 29), (u't1', 28), (u't1', 27), (u't1', 26),
+                          (u't2', 29), (u't2', 28), (u't2', 27), (u't2', 26)],
+                         [(x[0][2], x[1]['row_count']) for x in thist])
+
+        thist = self.repo.iter_tables_history([(u'test_database', u'test_schema', u't2')],
+                                              since='2016-04-26T12', until='2016-04-29')
+        self.assertEqual([(u't2', 28), (u't2', 27)],
+                         [(x[0][2], x[1]['row_count']) for x in thist])
+
+        thist = self.repo.iter_tables_history(since='2016-05-01')
+        self.assertEqual([], list(thist))
+
+        # the deltas are decoded with the records after the range.
+        thist = self.repo.iter_tables_history(until='2016-04-28')
+        self.assertEqual([(u't1', 27), (u't1', 26), (u't2', 27), (u't2', 26)],
+                         [(x[0][2], x[1]['row_count']) for x in thist])
+
+        thist = self.repo.iter_tables_history([(u'test_database', u'test_schema', u't2'),
+                                               (u'test_database', u'test_schema', u't1'),
+                                               (u'test_database', u'test_schema', u't3')],
+                                              since='2016-04-29')
+        self.assertEqual([(u't1', 29), (u't2', 29)],
+                         [(x[0][2], x[1]['row_count']) for x in thist])
+
+    def testIter_column_history_001(self):
+        for ts in ['2016-04-27', '2016-04-28']:
+            t = {}
+            t['database_name'] = u'test_database'
+            t['schema_name'] = u'test_schema'
+            t['table_name'] = u'test_table'
+            t['timestamp'] = ts + 'T10:06:41.653836'
+            t['row_count'] = int(ts[-2:])
+            t['columns'] = [{'column_name': 'c1', 'nulls': 1},
+                            {'column_name': 'c2', 'nulls': 2}]
+            Table2.create(t['database_name'], t['schema_name'], t['table_name'], t)
+
+        chist = list(self.repo.iter_column_history('test_database', 'test_schema', 'test_table',
+                                                   column_names=['c2']))
+        self.assertEqual(2, len(chist))
+        self.assertEqual('2016-04-28T10:06:41.653836', chist[0]['timestamp'])
+        self.assertEqual(28, chist[0]['row_count'])
+        self.assertEqual(['c2'], chist[0]['columns'].keys())
+        self.assertEqual(2, chist[0]['columns']['c2']['nulls'])
+
+        chist = list(self.repo.iter_column_history('test_database', 'test_schema', 'test_table',
+                                                   limit=1, offset=1))
+        self.assertEqual(1, len(chist))
+        self.assertEqual(27, chist[0]['row_count'])
+        self.assertEqual(['c1', 'c2'], sorted(chist[0]['columns'].keys()))
+
     def testPut_fk_001(self):
         # append table records with tags
         t1 = {}
@@ -79,6 +79,55 @@ class TestOraDriver(unittest.TestCase):
         self.assertEqual('C', rs.column_names[0])
         self.assertEqual(1, rs.resultset[0][0])
 
+    def test_prepare_001(self):
+        ora = OraDriver.OraDriver('a','b','c','d','e')
+        self.assertEqual(u'select 1 from t where a = :a and b = :b',
+                         ora.prepare(u'select 1 from t where a = %(a)s and b = %(b)s'))
+        self.assertEqual({'execute': 1, 'rewrite': 1, 'cached': 1},
+                         ora.get_statement_stats())
+
+        # rewritten once
+        ora.prepare(u'select 1 from t where a = %(a)s and b = %(b)s')
+        self.assertEqual({'execute': 2, 'rewrite': 1, 'cached': 1},
+                         ora.get_statement_stats())
+
+        # lru
+        ora.stmt_cache_size = 2
+        ora.prepare(u'select 2 from dual')
+        ora.prepare(u'select 3 from dual')
+        self.assertEqual([u'select 2 from dual', u'select 3 from dual'],
+                         ora.stmt_cache.keys())
+        self.assertEqual({'execute': 4, 'rewrite': 3, 'cached': 2},
+                         ora.get_statement_stats())
+
+    def test_cursor_001(self):
+        ora = OraDriver.OraDriver(None, None, 'orcl', self.dbuser, self.dbpass)
+        ora.connect()
+
+        cur = ora.cursor()
+        self.assertEqual(100, cur.arraysize)
+        cur = ora.cursor('validation')
+        self.assertEqual(10000, cur.arraysize)
+
+        cur = ora.cursor('sample')
+        self.assertEqual(10, cur.arraysize)
+        self.assertEqual(11, cur.prefetchrows)
+
+        ora.set_fetch_rows('sample', 50)
+        cur = ora.cursor('sample')
+        self.assertEqual(50, cur.arraysize)
+        self.assertEqual(51, cur.prefetchrows)
+        # the class defaults are kept.
+        self.assertEqual((10, 11), OraDriver.OraDriver.fetch_sizes['sample'])
+
+    def test_force_parallel_001(self):
+        ora = OraDriver.OraDriver(None, None, 'orcl', self.dbuser, self.dbpass)
+        ora.force_parallel = 4
+        ora.connect()
+
+        rs = ora.q2rs(u"SELECT PQ_STATUS FROM V$SESSION WHERE SID = SYS_CONTEXT('USERENV', 'SID')")
+        self.assertEqual('FORCED', rs.resultset[0][0])
+
     def test_disconnect_001(self):
         ora = OraDriver.OraDriver(None, None, 'orcl', self.dbuser, self.dbpass)
         conn = ora.connect()
@@ -85,6 +85,29 @@ class TestPgDriver(unittest.TestCase):
         self.assertEqual('c', rs.column_names[0])
         self.assertEqual(1, rs.resultset[0][0])
 
+    def test_query_to_resultset_002(self):
+        pg = PgDriver.PgDriver('host=/tmp dbname=%s' % self.dbname, self.dbuser, self.dbpass)
+        pg.connect()
+
+        # bind variables
+        q = u'select %(a)s::int as c'
+        rs = pg.query_to_resultset(q, params={'a': 1})
+        self.assertEqual(1, rs.resultset[0][0])
+        rs = pg.q2rs(q, params={'a': 2})
+        self.assertEqual(2, rs.resultset[0][0])
+
+        self.assertEqual({'execute': 2}, pg.get_statement_stats())
+
+    def test_prepare_001(self):
+        pg = PgDriver.PgDriver('a', 'b', 'c')
+        self.assertEqual({'execute': 0}, pg.get_statement_stats())
+
+        # psycopg2 accepts the pyformat bind variables as they are.
+        q = u'select 1 from t where a = %(a)s'
+        self.assertEqual(q, pg.prepare(q))
+        self.assertEqual(q, pg.prepare(q))
+        self.assertEqual({'execute': 2}, pg.get_statement_stats())
+
     def test_disconnect_001(self):
         pg = PgDriver.PgDriver('host=/tmp dbname=%s' % self.dbname, self.dbuser, self.dbpass)
         conn = pg.connect()